@@ -0,0 +1,71 @@
+"""
+Scaling benchmark of the parallel TSV distance matrix parser.
+
+Writes a random symmetric integer distance matrix (or uses --matrix), then times
+``matrix_reader.read_data`` with an increasing number of worker processes and
+prints the wall time and speed-up over one thread.
+
+    python benchmarks/parse_scaling.py -n 5000 --threads 1,2,4,8,16,32
+"""
+
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+import numpy as np
+from genomic_address_service.classes.matrix_reader import matrix_reader
+
+def write_random_matrix(file_path, n, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = [f'sample_{i}' for i in range(n)]
+    upper = np.triu(rng.integers(0, 1000, size=(n, n)), 1)
+    matrix = upper + upper.T
+    with open(file_path, 'w') as fh:
+        fh.write("dists\t" + "\t".join(labels) + "\n")
+        for label, row in zip(labels, matrix):
+            fh.write(label + "\t" + "\t".join(map(str, row.tolist())) + "\n")
+
+def time_read(file_path, threads, dtype, validate, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        matrix_reader(file_path, validate=validate, dtype=dtype, threads=threads).read_data()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = ArgumentParser(description='Time the TSV distance matrix parser with 1..N worker processes')
+    parser.add_argument('-n', type=int, default=3000, help='Number of samples of the generated matrix')
+    parser.add_argument('--matrix', type=str, default=None, help='Existing TSV matrix to read instead')
+    parser.add_argument('--threads', type=str, default=None,
+                        help='Comma separated worker counts (default: powers of two up to the number of CPUs)')
+    parser.add_argument('--dtype', type=str, default='float64')
+    parser.add_argument('--skip-validation', dest='skip_validation', action='store_true')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per worker count; the fastest is reported')
+    args = parser.parse_args()
+
+    if args.threads is None:
+        cpus = os.cpu_count() or 1
+        counts = [2 ** k for k in range(cpus.bit_length()) if 2 ** k <= cpus]
+    else:
+        counts = [int(t) for t in args.threads.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        matrix = args.matrix
+        if matrix is None:
+            matrix = os.path.join(tmpdir, 'matrix.tsv')
+            write_random_matrix(matrix, args.n)
+        size = os.path.getsize(matrix) / 2 ** 20
+        print(f'{matrix}: {size:.1f} MiB')
+        print("threads\tseconds\tspeedup\tMiB/s")
+        baseline = None
+        for threads in counts:
+            seconds = time_read(matrix, threads, args.dtype, not args.skip_validation, args.repeats)
+            if baseline is None:
+                baseline = seconds
+            print(f'{threads}\t{seconds:.3f}\t{baseline / seconds:.2f}\t{size / seconds:.1f}')
+            sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
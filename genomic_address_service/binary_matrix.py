@@ -0,0 +1,178 @@
+"""
+Binary condensed distance matrix format (produced by `gas convert`).
+
+    bytes [0, 8)            magic string b'GASDMAT\\x00'
+    bytes [8, 512)          UTF-8 JSON header, padded with spaces and terminated by a newline
+    bytes [512, labels)     condensed distance vector, n*(n-1)/2 values of `dtype`
+    bytes [labels, EOF)     UTF-8 sample labels separated by newlines
+
+The JSON header holds: version, n, dtype (NumPy type string, e.g. '<f8'), data_offset,
+data_length (bytes), labels_offset, labels_length (bytes), sorted (labels are in sorted
+order) and checksum ('crc32:<hex>' of the data bytes). The condensed vector uses the
+row-major upper triangle layout expected by scipy.cluster.hierarchy.linkage, so it can
+be memory-mapped and handed to SciPy without any copy.
+"""
+
+import json
+import zlib
+import numpy as np
+from genomic_address_service.constants import BINARY_MATRIX_MAGIC, BINARY_MATRIX_VERSION, BINARY_MATRIX_HEADER_SIZE
+from genomic_address_service.utils import condensed_size, permute_condensed
+
+CHECKSUM_CHUNK_BYTES = 1 << 26
+
+def is_binary_matrix(file_path):
+    """
+    Check whether a file starts with the binary distance matrix magic string.
+    """
+    try:
+        with open(file_path, 'rb') as fh:
+            return fh.read(len(BINARY_MATRIX_MAGIC)) == BINARY_MATRIX_MAGIC
+    except OSError:
+        return False
+
+def format_binary_header(header):
+    content = json.dumps(header).encode('utf-8')
+    size = BINARY_MATRIX_HEADER_SIZE - len(BINARY_MATRIX_MAGIC) - 1
+    if len(content) > size:
+        raise ValueError(f'binary matrix header exceeds {BINARY_MATRIX_HEADER_SIZE} bytes')
+    return BINARY_MATRIX_MAGIC + content.ljust(size) + b'\n'
+
+def read_binary_header(file_path):
+    """
+    Read the JSON header of a binary distance matrix.
+
+    Returns
+    -------
+    dict
+        Header fields (see module description).
+    """
+    with open(file_path, 'rb') as fh:
+        block = fh.read(BINARY_MATRIX_HEADER_SIZE)
+    if not block.startswith(BINARY_MATRIX_MAGIC) or len(block) != BINARY_MATRIX_HEADER_SIZE:
+        raise ValueError(f'{file_path} is not a binary distance matrix')
+    header = json.loads(block[len(BINARY_MATRIX_MAGIC):].decode('utf-8'))
+    if header.get('version') != BINARY_MATRIX_VERSION:
+        raise ValueError(f'{file_path} has unsupported binary matrix version {header.get("version")}')
+    return header
+
+def compute_checksum(values):
+    """
+    CRC32 of the raw bytes of a contiguous array, computed in bounded chunks.
+    """
+    flat = values.reshape(-1).view(np.uint8)
+    checksum = 0
+    for start in range(0, len(flat), CHECKSUM_CHUNK_BYTES):
+        checksum = zlib.crc32(flat[start:start + CHECKSUM_CHUNK_BYTES], checksum)
+    return f'crc32:{checksum:08x}'
+
+def create_binary_matrix(file_path, labels, dtype=np.float64, is_sorted=False):
+    """
+    Create a binary distance matrix file and map its (empty) data region for writing.
+
+    Parameters
+    ----------
+    file_path : str
+        Output file.
+    labels : list of str
+        Sample labels in matrix order.
+    dtype : np.dtype, optional (default=float64)
+        Type of the stored distances.
+    is_sorted : bool, optional (default=False)
+        Whether the labels are in sorted order.
+
+    Returns
+    -------
+    np.ndarray
+        Writable array (memory map) of length n*(n-1)/2. Call ``finalize_binary_matrix``
+        once it has been filled.
+    """
+    dtype = np.dtype(dtype)
+    n = len(labels)
+    labels_bytes = "\n".join(labels).encode('utf-8')
+    data_length = condensed_size(n) * dtype.itemsize
+    header = {
+        'version': BINARY_MATRIX_VERSION,
+        'n': n,
+        'dtype': dtype.str,
+        'data_offset': BINARY_MATRIX_HEADER_SIZE,
+        'data_length': data_length,
+        'labels_offset': BINARY_MATRIX_HEADER_SIZE + data_length,
+        'labels_length': len(labels_bytes),
+        'sorted': bool(is_sorted),
+        'checksum': ''
+    }
+    with open(file_path, 'wb') as fh:
+        fh.write(format_binary_header(header))
+        fh.truncate(header['labels_offset'])
+        fh.seek(header['labels_offset'])
+        fh.write(labels_bytes)
+
+    if data_length == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode='r+', offset=BINARY_MATRIX_HEADER_SIZE, shape=(condensed_size(n),))
+
+def finalize_binary_matrix(file_path, condensed):
+    """
+    Flush the data region of a binary distance matrix and record its checksum.
+    """
+    if isinstance(condensed, np.memmap):
+        condensed.flush()
+    header = read_binary_header(file_path)
+    header['checksum'] = compute_checksum(condensed)
+    with open(file_path, 'r+b') as fh:
+        fh.write(format_binary_header(header))
+
+def write_binary_matrix(file_path, labels, condensed, is_sorted=False):
+    """
+    Write an in-memory condensed distance vector as a binary distance matrix.
+    """
+    data = create_binary_matrix(file_path, labels, dtype=condensed.dtype, is_sorted=is_sorted)
+    data[:] = condensed
+    finalize_binary_matrix(file_path, data)
+
+def read_binary_matrix(file_path, verify=True, sort_matrix=False):
+    """
+    Memory-map a binary distance matrix.
+
+    Parameters
+    ----------
+    file_path : str
+        Binary distance matrix produced by ``gas convert``.
+    verify : bool, optional (default=True)
+        Recompute the checksum of the data region and compare it with the header.
+    sort_matrix : bool, optional (default=False)
+        Return the samples sorted by label. When the file was not written in sorted
+        order this produces an in-memory copy.
+
+    Returns
+    -------
+    labels : list of str
+        Sample labels in the order used by the condensed vector.
+    np.ndarray
+        Read-only memory map of the condensed distance vector (or a sorted copy).
+    """
+    header = read_binary_header(file_path)
+    n = header['n']
+    dtype = np.dtype(header['dtype'])
+
+    with open(file_path, 'rb') as fh:
+        fh.seek(header['labels_offset'])
+        labels = fh.read(header['labels_length']).decode('utf-8').split("\n")
+    if len(labels) != n or header['data_length'] != condensed_size(n) * dtype.itemsize:
+        raise ValueError(f'{file_path} is truncated or has an inconsistent header')
+
+    if header['data_length'] == 0:
+        condensed = np.empty(0, dtype=dtype)
+    else:
+        condensed = np.memmap(file_path, dtype=dtype, mode='r', offset=header['data_offset'], shape=(condensed_size(n),))
+
+    if verify and compute_checksum(condensed) != header['checksum']:
+        raise ValueError(f'{file_path} failed checksum verification')
+
+    if sort_matrix and not header['sorted']:
+        order = sorted(range(n), key=labels.__getitem__)
+        condensed = permute_condensed(condensed, n, order)
+        labels = [labels[i] for i in order]
+
+    return labels, condensed
@@ -8,6 +8,7 @@ from genomic_address_service.constants import EXTENSIONS, CLUSTER_METHODS, build
 from genomic_address_service.utils import is_file_ok, write_threshold_map, write_cluster_assignments, \
 init_threshold_map, process_thresholds, has_valid_header_pairwise_distances, has_valid_header_cluster
 from genomic_address_service.classes.assign import assign
+from genomic_address_service.compression import input_extension
 
 def parse_args():
     class CustomFormatter(ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter):
@@ -64,12 +65,12 @@ def call(config):
 
     valid_extensions = list(EXTENSIONS.keys())
 
-    extension = os.path.splitext(dist_file)[1]
+    extension = input_extension(dist_file)
     if not extension in valid_extensions:
         message = f'{dist_file} does not have a valid extension {valid_extensions}'
         raise Exception(message)
 
-    extension = os.path.splitext(membership_file)[1]
+    extension = input_extension(membership_file)
     if not extension in valid_extensions:
         message = f'{membership_file} does not have a valid extension {valid_extensions}'
         raise Exception(message)
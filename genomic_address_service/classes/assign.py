@@ -1,11 +1,84 @@
 import copy
+import csv
+import io
+import re
 import sys
 import os
-from statistics import mean
+import numpy as np
 import pandas as pd
+from numba import njit
 from genomic_address_service.constants import EXTENSIONS, TEXT
 from genomic_address_service.utils import is_file_ok
+from genomic_address_service.compression import input_extension, open_input
 from genomic_address_service.classes.reader import dist_reader
+from genomic_address_service.classes.membership_index import membership_index
+
+METHOD_AVERAGE = 0
+METHOD_COMPLETE = 1
+METHOD_SINGLE = 2
+
+@njit(cache=True)
+def _summarise_members(dists, members, start, codes, level, code, method, threshold, summary):
+    """
+    Add the distances to the members[start:] that are not in cluster ``code`` at
+    ``level`` (none skipped when level < 0) to a summary of the distances of a
+    cluster: count, compensated sum, compensation, min and max. nan distances (not
+    listed for the query) are skipped.
+
+    Single linkage stops after the first distance and complete linkage after the
+    first distance above the threshold, as the criterion is then decided.
+
+    Returns the position after the last member read.
+    """
+    for p in range(start, len(members)):
+        m = members[p]
+        if level >= 0 and codes[m, level] == code:
+            continue
+        d = dists[m]
+        if np.isnan(d):
+            continue
+        # Neumaier summation, so the mean is not biased by the order of the members
+        total = summary[1] + d
+        if abs(summary[1]) >= abs(d):
+            summary[2] += (summary[1] - total) + d
+        else:
+            summary[2] += (d - total) + summary[1]
+        summary[1] = total
+        summary[0] += 1
+        summary[3] = min(summary[3], d)
+        summary[4] = max(summary[4], d)
+        if method == METHOD_SINGLE or (method == METHOD_COMPLETE and d > threshold):
+            return p + 1
+    return len(members)
+
+@njit(cache=True)
+def _nearest_references(q, r, dist, label_rows, num_queries):
+    """
+    Nearest clustered reference of each query of a chunk of coded rows, in one pass
+    over the rows in file order (ties keep the first row).
+
+    A reference is clustered if it has a row in the addresses (``label_rows`` >= 0)
+    or is a query of the chunk that comes before (queries are coded in order and
+    assigned in that order). A query is never its own reference.
+
+    Returns
+    -------
+    nearest : np.ndarray
+        Code of the nearest reference of each query (-1: none).
+    nearest_dist : np.ndarray
+        Its distance.
+    """
+    nearest = np.full(num_queries, -1, dtype=np.int64)
+    nearest_dist = np.full(num_queries, np.inf)
+    for i in range(len(q)):
+        qc = q[i]
+        rc = r[i]
+        if rc == qc or (label_rows[rc] < 0 and rc >= qc):
+            continue
+        if nearest[qc] < 0 or dist[i] < nearest_dist[qc]:
+            nearest[qc] = rc
+            nearest_dist[qc] = dist[i]
+    return nearest, nearest_dist
 
 class assign:
     ERROR_MISSING_DELIMITER = "delimiter was not found"
@@ -13,6 +86,10 @@ class assign:
     ERROR_NON_INTEGER = "address could not be converted to an integer"
 
     AVAILABLE_METHODS = ["average", "complete", "single"]
+    LINKAGE_METHODS = {'average': METHOD_AVERAGE, 'complete': METHOD_COMPLETE, 'single': METHOD_SINGLE}
+
+    # what int() accepts for one level of an address
+    INTEGER_PATTERN = r'\s*[+-]?\d+(?:_\d+)*\s*'
 
     def __init__(self,dist_file,membership_file,threshold_map,linkage_method,address_col, sample_col, batch_size, delimiter):
         self.dist_file = dist_file
@@ -24,8 +101,11 @@ class assign:
         self.sample_labels = []
         self.query_labels = set()
         self.memberships_df = None
-        self.memberships_dict = {}
-        self.memberships_lookup = {}
+        self.membership_index = None
+        self.sample_ids = []
+        self.sample_index = {}
+        self.addresses = np.empty((0, 0), dtype=np.int64)
+        self.num_samples = 0
         self.ref_labels = set()
         self.dist_type = 'matrix'
         self.error_msgs = []
@@ -67,6 +147,10 @@ class assign:
         #Important sort distances smallest to largest
         self.threshold_map = threshold_map
         self.thresholds = list(self.threshold_map.values())
+        # negated thresholds, for a binary search when they decrease
+        self.negated_thresholds = None
+        if all(self.thresholds[i] >= self.thresholds[i+1] for i in range(len(self.thresholds)-1)):
+            self.negated_thresholds = -np.array(self.thresholds, dtype=np.float64)
 
         columns = self.memberships_df.columns.values.tolist()
         if sample_col not in columns:
@@ -79,8 +163,9 @@ class assign:
         if not self.status:
             return
 
-        self.memberships_df = self.memberships_df[[sample_col,address_col]]
-        self.memberships_df = self.format_df(self.memberships_df.set_index(sample_col).to_dict()[address_col], self.delimiter)
+        sample_ids, addresses = self.parse_addresses(self.memberships_df[sample_col], self.memberships_df[address_col], self.delimiter)
+        self.memberships_df = pd.DataFrame(addresses, index=sample_ids,
+                                           columns=[f'level_{idx}' for idx in range(len(self.thresholds))])
 
         if len(self.error_samples[self.ERROR_MISSING_DELIMITER]) > 0:
             self.status = False
@@ -97,41 +182,88 @@ class assign:
         if not self.status:
             return
 
-        self.process_memberships()
-        self.ref_labels = set(self.memberships_dict.keys())
+        self.process_memberships(sample_ids, addresses)
+        self.ref_labels = set(self.sample_ids)
         self.init_nomenclature_tracker()
         self.assign(n_records=batch_size)
 
-    def format_df(self,data, delim='.'):
+    def parse_addresses(self, samples, addresses, delim='.'):
+        """
+        Split the addresses of the reference samples into integer levels.
+
+        Samples listed more than once keep their last address. Samples whose address
+        does not have one level per threshold, or has a level that is not an integer,
+        are added to ``error_samples`` and left out.
+
+        Parameters
+        ----------
+        samples : pd.Series
+            Sample ids.
+        addresses : pd.Series
+            Addresses, in the order of ``samples``.
+        delim : str, optional (default='.')
+            Delimiter between the levels of an address.
+
+        Returns
+        -------
+        sample_ids : list of str
+            Ids of the valid samples, in order of first appearance.
+        np.ndarray
+            Addresses of the valid samples, of shape (len(sample_ids), number of thresholds).
+        """
         num_thresholds = len(self.thresholds)
-        membership = {}
-
-        for sample_id in data:
-            address = str(data[sample_id]).split(delim)
-
-            # Did we get the wrong number of address components?
-            if len(address) != num_thresholds:
-
-                # No delimiter:
-                if (not delim in data[sample_id]) and num_thresholds > 1:
-                    self.error_samples[self.ERROR_MISSING_DELIMITER].append(sample_id)
-                # Length problem:
-                else:
-                    self.error_samples[self.ERROR_LENGTH].append(sample_id)
-
-                continue
-            membership[sample_id] = {}
-            for idx,value in enumerate(address):
-                l = f'level_{idx}'
-                try:
-                    value = int(value)
-                except Exception:
-                    self.error_samples[self.ERROR_NON_INTEGER].append(sample_id)
-                    del membership[sample_id]
-                    break
-                membership[sample_id][l] = int(value)
-        return pd.DataFrame.from_dict(membership,orient='index')
-
+        codes, uniques = pd.factorize(samples.to_numpy(), use_na_sentinel=False)
+        last = np.flatnonzero(~samples.duplicated(keep='last').to_numpy())
+        last = last[np.argsort(codes[last])]
+        ids = uniques[codes[last]]
+        addresses = addresses.iloc[last].astype(str).reset_index(drop=True)
+
+        levels = self.split_integer_addresses(addresses.tolist(), delim, num_thresholds)
+        if levels is not None:
+            return [str(x) for x in ids.tolist()], levels
+
+        num_levels = addresses.str.count(re.escape(delim)).to_numpy() + 1
+        wrong_length = num_levels != num_thresholds
+        missing_delimiter = wrong_length & ~addresses.str.contains(delim, regex=False).to_numpy() & (num_thresholds > 1)
+        self.error_samples[self.ERROR_MISSING_DELIMITER].extend(ids[missing_delimiter].tolist())
+        self.error_samples[self.ERROR_LENGTH].extend(ids[wrong_length & ~missing_delimiter].tolist())
+
+        rows = np.flatnonzero(~wrong_length)
+        levels = addresses.iloc[rows].str.split(delim, regex=False, expand=True)
+        levels = levels.to_numpy(dtype=object).reshape(len(rows), num_thresholds)
+        is_integer = pd.DataFrame(levels).apply(lambda column: column.str.fullmatch(self.INTEGER_PATTERN)).to_numpy(dtype=bool)
+        is_integer = is_integer.reshape(len(rows), num_thresholds).all(axis=1)
+        self.error_samples[self.ERROR_NON_INTEGER].extend(ids[rows[~is_integer]].tolist())
+
+        sample_ids = [str(x) for x in ids[rows[is_integer]].tolist()]
+        return sample_ids, levels[is_integer].astype(np.int64)
+
+    @staticmethod
+    def split_integer_addresses(addresses, delim, num_levels):
+        """
+        Parse addresses made only of integers and delimiters with the pandas C parser.
+
+        Returns
+        -------
+        np.ndarray or None
+            Addresses of shape (len(addresses), num_levels), or None when an address
+            holds other characters, has the wrong number of levels or a level that is
+            not an integer (or the delimiter cannot be used as a separator), so that
+            the errors can be reported for each sample.
+        """
+        if len(addresses) == 0 or len(delim) != 1 or delim in '0123456789+-"\r\n':
+            return None
+        text = "\n".join(addresses)
+        if re.search(f'[^0-9+\\-\\n{re.escape(delim)}]', text) is not None:
+            return None
+        try:
+            levels = pd.read_csv(io.StringIO(text), sep=delim, header=None, dtype=np.int64, engine='c',
+                                 quoting=csv.QUOTE_NONE, na_filter=False).to_numpy()
+        except (ValueError, OverflowError):
+            return None
+        if levels.shape != (len(addresses), num_levels):
+            return None
+        return levels
 
     def check_membership_columns(self,cols):
         is_ok = True
@@ -143,48 +275,165 @@ class assign:
 
 
     def init_nomenclature_tracker(self):
-        self.nomenclature_cluster_tracker = self.memberships_df.max().to_frame().T.to_dict()
-        for col in self.nomenclature_cluster_tracker:
-            self.nomenclature_cluster_tracker[col] = self.nomenclature_cluster_tracker[col][0] + 1
-
-    def process_memberships(self):
+        next_ids = self.addresses[:self.num_samples].max(axis=0, initial=0) + 1
+        self.nomenclature_cluster_tracker = {f'level_{idx}': int(value) for idx, value in enumerate(next_ids)}
+
+    def process_memberships(self, sample_ids, addresses):
+        self.sample_ids = list(sample_ids)
+        self.sample_index = {id: row for row, id in enumerate(self.sample_ids)}
+        self.addresses = np.array(addresses, dtype=np.int64).reshape(len(self.sample_ids), len(self.thresholds))
+        self.num_samples = len(self.sample_ids)
+        self.membership_index = membership_index(self.addresses)
+
+    def format_addresses(self, addresses, prefixes=False):
+        """
+        Join rows of integer levels into address strings.
+
+        Parameters
+        ----------
+        addresses : np.ndarray
+            Addresses, one row per sample.
+        prefixes : bool, optional (default=False)
+            Return every prefix of each address (its code at each level) instead of
+            the full address.
+
+        Returns
+        -------
+        list
+            One address string, or list of prefix strings, per row.
+        """
+        formatted = []
+        for address in addresses.tolist():
+            values = [str(x) for x in address]
+            if prefixes:
+                formatted.append([self.delimiter.join(values[0:idx+1]) for idx in range(len(values))])
+            else:
+                formatted.append(self.delimiter.join(values))
+        return formatted
+
+    @property
+    def memberships_dict(self):
+        """
+        Address strings of the references and assigned queries, by sample id.
+
+        The addresses are held as integers in ``addresses``; the strings are formed
+        on each access.
+        """
+        return dict(zip(self.sample_ids, self.format_addresses(self.addresses[:self.num_samples])))
+
+    @property
+    def memberships_lookup(self):
+        """
+        Sample ids of the members of each cluster, by address prefix string.
+
+        Clusters are looked up in ``membership_index``; this view is formed on each
+        access.
+        """
         lookup = {}
-        for row in self.memberships_df.itertuples():
-            values = [str(x) for x in list(row)]
-            id = values[0]
-            values = values[1:]
-            self.memberships_dict[id] = self.delimiter.join([str(x) for x in values])
-            for idx,value in enumerate(values):
-                code = self.delimiter.join(values[0:idx+1])
+        for id, address in zip(self.sample_ids, self.format_addresses(self.addresses[:self.num_samples], prefixes=True)):
+            for code in address:
                 if not code in lookup:
                     lookup[code] = list()
                 lookup[code].append(id)
-        self.memberships_lookup = lookup
+        return lookup
+
+    def add_address(self, sample_id, address):
+        """
+        Add a row to ``addresses`` for a sample, growing the array when it is full.
+
+        Returns
+        -------
+        int
+            Row of the sample.
+        """
+        row = self.num_samples
+        if row == len(self.addresses):
+            grown = np.zeros((max(2 * row, 16), self.addresses.shape[1]), dtype=np.int64)
+            grown[:row] = self.addresses
+            self.addresses = grown
+        self.sample_ids.append(sample_id)
+        self.sample_index[sample_id] = row
+        self.num_samples += 1
+        self.addresses[row] = address
+        return row
 
     def add_memberships_lookup(self,sample_id, address):
-        self.memberships_dict[sample_id] = self.delimiter.join([str(x) for x in address])
-        for idx in range(0,len(address)):
-            code = self.delimiter.join([str(x) for x in address[0:idx+1]])
-            if not code in self.memberships_lookup:
-                self.memberships_lookup[code] = list()
-            self.memberships_lookup[code].append(sample_id)
+        row = self.add_address(sample_id, address)
+        self.membership_index.append(address)
+        return row
 
 
     def get_dist_summary(self,dists):
-        min_dist = min(dists)
-        ave_dist = mean(dists)
-        max_dist = max(dists)
-        return {'min':min_dist,'mean':ave_dist,'max':max_dist}
+        dists = np.asarray(dists, dtype=np.float64)
+        return {'min':float(dists.min()),'mean':float(np.mean(dists)),'max':float(dists.max())}
 
     def get_threshold_idx(self,dist):
-
+        """
+        Last level whose threshold is >= dist (0 if there is none).
+        """
+        if self.negated_thresholds is not None:
+            return max(int(np.searchsorted(self.negated_thresholds, -dist, side='right')) - 1, 0)
         for i in reversed(range(0,len(self.thresholds))):
             if dist <= self.thresholds[i]:
                 return i
         return 0
 
+    def get_cluster_level(self, row_dists, row, thresh_idx):
+        """
+        Deepest level, up to ``thresh_idx``, at which a query can join the cluster of
+        the reference in row ``row`` under the linkage method.
+
+        The clusters of the reference are visited from ``thresh_idx`` to the first
+        level. Each cluster holds the finer one, so only its other members are read
+        and the summary of the distances carries over to the next level; complete
+        linkage stops reading a level at its first distance above the threshold and
+        resumes there for the next level.
+
+        Parameters
+        ----------
+        row_dists : np.ndarray
+            Distances of the query, by row of ``addresses`` (nan: not listed).
+        row : int
+            Row of the reference.
+        thresh_idx : int
+            Deepest level allowed by the distance to the reference.
+
+        Returns
+        -------
+        int
+            The level, or -1 if the query joins no cluster of the reference.
+        """
+        index = self.membership_index
+        codes = index.codes
+        ref_codes = codes[row].tolist()
+        method = self.LINKAGE_METHODS[self.linkage_method]
+        summary = np.array([0.0, 0.0, 0.0, np.inf, -np.inf])
+        # members of each visited level not yet read: [members, position, level to skip]
+        pending = []
+        for level in range(thresh_idx, -1, -1):
+            threshold = self.thresholds[level]
+            skip = level + 1 if level < thresh_idx else -1
+            pending.append([index.get_members(level, ref_codes[level]), 0, skip])
+            for item in pending:
+                members, position, skip = item
+                if method == METHOD_COMPLETE and summary[4] > threshold:
+                    break
+                if method == METHOD_SINGLE and summary[0] > 0:
+                    break
+                if position < len(members):
+                    code = ref_codes[skip] if skip >= 0 else -1
+                    item[1] = _summarise_members(row_dists, members, position, codes, skip, code, method, threshold, summary)
+            if summary[0] == 0:
+                continue
+            if method == METHOD_COMPLETE and summary[4] > threshold:
+                continue
+            if method == METHOD_AVERAGE and (summary[1] + summary[2]) / summary[0] > threshold:
+                continue
+            return level
+        return -1
+
     def check_file_type(self,f):
-        extension = os.path.splitext(f)[1]
+        extension = input_extension(f)
         valid_extensions = list(EXTENSIONS.keys())
 
         if not extension in valid_extensions:
@@ -193,61 +442,105 @@ class assign:
 
     def read_data(self, f):
         self.check_file_type(f)
-        df = pd.read_csv(f, header=0, sep="\t", low_memory=False)
+        with open_input(f) as fh:
+            df = pd.read_csv(fh, header=0, sep="\t", low_memory=False)
 
         return df
 
-    def assign(self, n_records=1000,delim="\t"):
+    def new_address(self, address):
+        """
+        Complete an address with new clusters at the levels left as None.
+        """
+        rank_ids = list(self.nomenclature_cluster_tracker.keys())
+        for idx,value in enumerate(address):
+            if value is None:
+                address[idx] = self.nomenclature_cluster_tracker[rank_ids[idx]]
+                self.nomenclature_cluster_tracker[rank_ids[idx]]+=1
+        return address
+
+    def assign_nearest(self, n_records=1000, delim="\t"):
+        """
+        Assign the queries with single linkage, from their nearest clustered reference.
+
+        A query joins the clusters of its nearest reference up to the deepest level
+        whose threshold is >= their distance: the reference is a member of them, and
+        single linkage needs no other distance. The nearest reference is found in one
+        pass over each chunk of coded rows, without sorting the distances of each
+        query or reading the members of the clusters.
+        """
         reader_obj = dist_reader(f=self.dist_file, n_records=n_records, delim=delim)
         self.query_ids = set()
-        rank_ids = list(self.nomenclature_cluster_tracker.keys())
         num_ranks = len(self.thresholds)
-        for dists in reader_obj.read_data():
-            self.query_ids = self.query_ids | set(dists.keys())
-            for qid in dists:
-                is_eligible = False
+        for labels, q, r, dist in reader_obj.read_coded():
+            num_queries = int(q.max()) + 1
+            query_labels = labels[:num_queries].tolist()
+            self.query_ids = self.query_ids | set(query_labels)
+            # row of each label in addresses (-1: not clustered)
+            label_rows = np.array([self.sample_index.get(label, -1) for label in labels], dtype=np.int64)
+            nearest, nearest_dist = _nearest_references(q, r, dist, label_rows, num_queries)
+            nearest = nearest.tolist()
+            nearest_dist = nearest_dist.tolist()
+            for qc, qid in enumerate(query_labels):
                 self.query_labels.add(qid)
-                query_addr = [None] * num_ranks
-                if qid in self.memberships_dict:
+                if label_rows[qc] >= 0:
                     continue
-                for rid in dists[qid]:
-                    if rid == qid or rid not in self.memberships_dict:
-                        continue
-                    pairwise_dist = dists[qid][rid]
+                query_addr = [None] * num_ranks
+                if nearest[qc] >= 0:
+                    pairwise_dist = nearest_dist[qc]
                     thresh_idx = self.get_threshold_idx(pairwise_dist)
-                    thresh_value = self.thresholds[thresh_idx]
-                    #save unnecessary work
-                    if thresh_value >= pairwise_dist:
-                        ref_address = self.memberships_dict[rid].split(self.delimiter)[0:thresh_idx+1]
-                        alen = len(ref_address)
-                        for i in range(0,len(ref_address)):
-                            addr = self.delimiter.join(ref_address[0:alen-i])
-                            
-                            if addr not in self.memberships_lookup:
-                                continue
-                            addr_members = self.memberships_lookup[addr]
-                            addr_dists = []
-                            for id in addr_members:
-                                if id in dists[qid]:
-                                    addr_dists.append(dists[qid][id])
-                            if len(addr_dists) == 0:
-                                continue
-                            summary = self.get_dist_summary(addr_dists)
-                            is_eligible = True
-                            if self.linkage_method == 'complete' and summary['max'] > thresh_value:
-                                is_eligible = False
-                            elif self.linkage_method == 'average' and summary['mean'] > thresh_value:
-                                is_eligible = False
-                            if is_eligible:
-                                for idx,value in enumerate(addr.split(self.delimiter)):
-                                    query_addr[idx] = value
-                                break
-                            thresh_value = self.thresholds[thresh_idx-(i+1)]
-                            
-                    for idx,value in enumerate(query_addr):
-                        if value is None:
-                            query_addr[idx] = self.nomenclature_cluster_tracker[rank_ids[idx]]
-                            self.nomenclature_cluster_tracker[rank_ids[idx]]+=1
-                    break
+                    if self.thresholds[thresh_idx] >= pairwise_dist:
+                        query_addr[0:thresh_idx+1] = self.addresses[label_rows[nearest[qc]], 0:thresh_idx+1].tolist()
+                label_rows[qc] = self.add_memberships_lookup(qid, self.new_address(query_addr))
 
-                self.add_memberships_lookup(qid, query_addr)
+    def assign(self, n_records=1000,delim="\t"):
+        if self.linkage_method == 'single':
+            self.assign_nearest(n_records, delim)
+        else:
+            self.assign_batches(n_records, delim)
+
+    def assign_batches(self, n_records=1000,delim="\t"):
+        """
+        Assign the queries from their distances to the members of the clusters of
+        their nearest clustered reference (see ``get_cluster_level``).
+        """
+        reader_obj = dist_reader(f=self.dist_file, n_records=n_records, delim=delim)
+        self.query_ids = set()
+        num_ranks = len(self.thresholds)
+        # distances of the current query, indexed by row in addresses (nan: not listed)
+        row_dists = np.full(len(self.addresses), np.nan)
+        for labels, chunk_q, chunk_r, chunk_dist in reader_obj.read_coded():
+            # row of each label of the chunk in addresses (-1: not clustered), shared by its batches
+            label_rows = np.array([self.sample_index.get(label, -1) for label in labels], dtype=np.int64)
+            for batch in reader_obj.make_batches(labels, chunk_q, chunk_r, chunk_dist):
+                self.query_ids = self.query_ids | set(labels[batch.queries])
+                for q, qc in enumerate(batch.queries.tolist()):
+                    qid = labels[qc]
+                    self.query_labels.add(qid)
+                    query_addr = [None] * num_ranks
+                    if label_rows[qc] >= 0:
+                        continue
+                    start, end = batch.offsets[q], batch.offsets[q + 1]
+                    refs = batch.refs[start:end]
+                    dists = batch.dists[start:end]
+                    ref_rows = label_rows[refs]
+                    for k, rc in enumerate(refs.tolist()):
+                        row = int(ref_rows[k])
+                        if rc == qc or row < 0:
+                            continue
+                        if len(row_dists) < len(self.addresses):
+                            row_dists = np.append(row_dists, np.full(len(self.addresses) - len(row_dists), np.nan))
+                        listed = ref_rows >= 0
+                        row_dists[ref_rows[listed]] = dists[listed]
+                        pairwise_dist = float(dists[k])
+                        thresh_idx = self.get_threshold_idx(pairwise_dist)
+                        thresh_value = self.thresholds[thresh_idx]
+                        #save unnecessary work
+                        if thresh_value >= pairwise_dist:
+                            level = self.get_cluster_level(row_dists, row, thresh_idx)
+                            if level >= 0:
+                                query_addr[0:level+1] = self.addresses[row, 0:level+1].tolist()
+                        row_dists[ref_rows[listed]] = np.nan
+                        break
+
+                    # new clusters from the levels where the query joins no reference
+                    label_rows[qc] = self.add_memberships_lookup(qid, self.new_address(query_addr))
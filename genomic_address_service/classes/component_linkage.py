@@ -0,0 +1,280 @@
+import multiprocessing
+import numpy as np
+import scipy
+from numba import njit
+from genomic_address_service.classes.nn_chain import nn_chain
+from genomic_address_service.utils import find_root, gather_condensed, label_linkage
+
+METHOD_AVERAGE = 0
+METHOD_COMPLETE = 1
+METHOD_SINGLE = 2
+
+@njit(cache=True)
+def _components(D, n, threshold):
+    """
+    Connected components of the graph of the pairs at distance <= threshold.
+    Returns the root of each sample, which is the smallest sample of its component.
+    """
+    parent = np.arange(n)
+    position = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            if D[position] <= threshold:
+                ri = find_root(parent, i)
+                rj = find_root(parent, j)
+                if ri < rj:
+                    parent[rj] = ri
+                elif rj < ri:
+                    parent[ri] = rj
+            position += 1
+    for i in range(n):
+        parent[i] = find_root(parent, i)
+    return parent
+
+@njit(cache=True)
+def _low_merges(Z, members, threshold):
+    """
+    Merges of a component's linkage matrix at heights <= threshold as rows
+    (sample of x, sample of y, height) in global sample indices.
+    """
+    m = len(members)
+    rep = np.empty(2 * m - 1, dtype=np.int64)
+    rep[:m] = members
+    low = 0
+    for r in range(m - 1):
+        rep[m + r] = min(rep[int(Z[r, 0])], rep[int(Z[r, 1])])
+        if Z[r, 2] <= threshold:
+            low = r + 1
+    merges = np.empty((low, 3), dtype=np.float64)
+    for r in range(low):
+        merges[r, 0] = rep[int(Z[r, 0])]
+        merges[r, 1] = rep[int(Z[r, 1])]
+        merges[r, 2] = Z[r, 2]
+    return merges
+
+@njit(cache=True)
+def _aggregate(D, n, cluster, k, method):
+    """
+    Linkage distances between k clusters of samples: the sum (average linkage,
+    divided by the sizes afterwards), maximum or minimum of the distances between
+    their samples, as a condensed vector.
+    """
+    if method == METHOD_SINGLE:
+        A = np.full(k * (k - 1) // 2, np.inf)
+    else:
+        A = np.zeros(k * (k - 1) // 2)
+    position = 0
+    for i in range(n):
+        ci = cluster[i]
+        for j in range(i + 1, n):
+            cj = cluster[j]
+            d = np.float64(D[position])
+            position += 1
+            if ci == cj:
+                continue
+            a = min(ci, cj)
+            b = max(ci, cj)
+            index = k * a - (a * (a + 1)) // 2 + (b - a - 1)
+            if method == METHOD_AVERAGE:
+                A[index] += d
+            elif method == METHOD_COMPLETE:
+                A[index] = max(A[index], d)
+            else:
+                A[index] = min(A[index], d)
+    return A
+
+def cluster_linkage(condensed, n, method, engine):
+    """
+    Linkage matrix of a condensed vector with the given engine ('scipy' or 'nnchain').
+    """
+    if engine == 'nnchain':
+        return nn_chain(method).get_linkage(condensed, n)
+    return scipy.cluster.hierarchy.linkage(np.asarray(condensed, dtype=np.float64), method=method, metric='precomputed')
+
+def _link_components(task):
+    method, engine, components = task
+    return [cluster_linkage(sub, m, method, engine) for sub, m in components]
+
+class component_linkage:
+    """
+    Hierarchical clustering split on the single linkage connected components at the
+    largest threshold.
+
+    With single, average and complete linkage, two clusters can only merge at a
+    height <= T if some pair of their samples is at distance <= T, so every cluster
+    at or below T lies inside one connected component of the graph of the pairs at
+    distance <= T. The components are clustered independently (in a pool of worker
+    processes), and the merges above T are obtained by clustering the clusters left
+    at T, with the distances between them aggregated in one pass over the matrix
+    (minimum, maximum or average, weighted by the cluster sizes). The pieces are
+    assembled into one linkage matrix, so the clusters at every threshold <= T, their
+    numbering and the tree are those of a global run.
+
+    Attributes
+    ----------
+    method : str
+        Linkage method, 'single', 'average' or 'complete'.
+    threshold : float
+        Largest threshold at which clusters are needed.
+    engine : str
+        Linkage implementation of each component, 'scipy' or 'nnchain'.
+    processes : int
+        Number of worker processes clustering the components.
+
+    Notes
+    -----
+    - Identical to the global run when no two merges happen at the same height.
+      With tied distances, the order of tied merges (and so the cluster numbering)
+      and, for average linkage, the choice between tied merges can differ, as it
+      depends on the order in which the components are visited.
+    - Average linkage heights above T are computed as mean distances rather than by
+      successive updates, so they can differ from a global run in the last bits.
+    """
+    VALID_METHODS = {'average': METHOD_AVERAGE, 'complete': METHOD_COMPLETE, 'single': METHOD_SINGLE}
+    VALID_ENGINES = ['scipy', 'nnchain']
+    # components are sent to the workers in batches of about this many pairs
+    TASK_PAIRS = 1 << 20
+
+    def __init__(self, method, threshold, engine='scipy', processes=1) -> None:
+        if method not in self.VALID_METHODS:
+            raise ValueError(f'Clustering by components supports {list(self.VALID_METHODS)} linkage, not [{method}]')
+        if engine not in self.VALID_ENGINES:
+            raise ValueError(f'Clustering by components supports the {self.VALID_ENGINES} engines, not [{engine}]')
+        if engine == 'nnchain':
+            # validates the method against the engine
+            nn_chain(method)
+        self.method = method
+        self.threshold = threshold
+        self.engine = engine
+        self.processes = max(1, processes)
+
+    def get_components(self, condensed, n):
+        """
+        Samples of each connected component at the threshold.
+
+        Returns
+        -------
+        list of np.ndarray
+            Sample indices of each component in increasing order; the components are
+            ordered by their smallest sample.
+        """
+        return self.split_components(_components(np.asarray(condensed), n, self.threshold))
+
+    @staticmethod
+    def split_components(roots):
+        """
+        Samples of each component from the root of each sample (see ``get_components``).
+        """
+        order = np.argsort(roots, kind='stable')
+        bounds = np.flatnonzero(np.diff(roots[order])) + 1
+        return np.split(order, bounds)
+
+    def get_linkage(self, condensed, n):
+        """
+        Cluster a condensed distance vector.
+
+        Parameters
+        ----------
+        condensed : np.ndarray
+            Condensed (upper triangle, row-major) distance vector. It is not modified.
+        n : int
+            Number of samples.
+
+        Returns
+        -------
+        np.ndarray
+            Linkage matrix of shape (n-1, 4).
+        """
+        if len(condensed) != n * (n - 1) // 2:
+            raise ValueError(f'condensed distance vector has {len(condensed)} values, expected {n * (n - 1) // 2}')
+        if n < 2:
+            raise ValueError('at least two samples are required for clustering')
+        D = condensed
+        components = self.get_components(D, n)
+        if len(components) == 1:
+            return self.link_all(D, n)
+
+        # merges at heights <= T, component by component
+        merges = [np.empty((0, 3))]
+        linked = [members for members in components if len(members) > 1]
+        for members, Z in zip(linked, self.link_components(D, n, linked)):
+            merges.append(_low_merges(Z, members, self.threshold))
+        low = np.concatenate(merges)
+        low = low[np.argsort(low[:, 2], kind='mergesort')]
+
+        # clusters left at T, numbered by their smallest sample
+        parent = np.arange(n)
+        for x, y, _ in low:
+            x = find_root(parent, int(x))
+            y = find_root(parent, int(y))
+            parent[max(x, y)] = min(x, y)
+        roots = np.array([find_root(parent, i) for i in range(n)], dtype=np.int64)
+        cluster_roots, cluster = np.unique(roots, return_inverse=True)
+        k = len(cluster_roots)
+
+        # merges above T: cluster the clusters
+        high = np.empty((0, 3))
+        if k > 1:
+            sizes = np.bincount(cluster, minlength=k)
+            A = self.aggregate(D, n, cluster.astype(np.int64), k)
+            if self.method == 'average':
+                a, b = np.triu_indices(k, 1)
+                A /= sizes[a] * sizes[b]
+                Z = nn_chain(self.method).get_linkage(A, k, sizes=sizes)
+            elif self.method == 'complete':
+                Z = nn_chain(self.method).get_linkage(A, k)
+            else:
+                Z = scipy.cluster.hierarchy.linkage(A, method='single')
+            high = _low_merges(Z, cluster_roots, np.inf)
+
+        Z = np.zeros((n - 1, 4), dtype=np.float64)
+        Z[:, :3] = np.concatenate([low, high])
+        label_linkage(Z, n)
+        return Z
+
+    def link_all(self, D, n):
+        """
+        Linkage matrix of all the samples, when they form a single component.
+        """
+        return cluster_linkage(np.asarray(D), n, self.method, self.engine)
+
+    def aggregate(self, D, n, cluster, k):
+        """
+        Linkage distances between the k clusters of samples numbered by ``cluster``, as
+        a condensed vector (sums of the distances for average linkage).
+        """
+        return _aggregate(np.asarray(D), n, cluster, k, self.VALID_METHODS[self.method])
+
+    def gather_components(self, D, n, components):
+        """
+        Condensed distance vector and size of each component, in order.
+        """
+        D = np.asarray(D)
+        for members in components:
+            yield gather_condensed(D, n, members), len(members)
+
+    def link_components(self, D, n, components):
+        """
+        Linkage matrix of each component (with more than one sample), in order.
+        """
+        tasks = []
+        batch = []
+        pairs = 0
+        for sub, m in self.gather_components(D, n, components):
+            batch.append((sub, m))
+            pairs += len(sub)
+            if pairs >= self.TASK_PAIRS:
+                tasks.append((self.method, self.engine, batch))
+                batch = []
+                pairs = 0
+        if len(batch) > 0:
+            tasks.append((self.method, self.engine, batch))
+
+        if self.processes == 1 or len(tasks) == 1:
+            results = map(_link_components, tasks)
+        else:
+            # spawned, not forked: forking while numba's thread pool runs can deadlock
+            with multiprocessing.get_context('spawn').Pool(min(self.processes, len(tasks))) as pool:
+                results = pool.map(_link_components, tasks)
+        for result in results:
+            yield from result
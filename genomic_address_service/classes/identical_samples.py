@@ -0,0 +1,175 @@
+import numpy as np
+from numba import njit
+from genomic_address_service.utils import gather_condensed, label_linkage
+
+@njit(cache=True)
+def _row_hashes(D, n, weights):
+    """
+    Hash of each row of the square matrix of a condensed vector: the sum of the row's
+    distances weighted by random column weights, added in column order, so identical
+    rows have bit-identical hashes (the diagonal and a 0 distance add nothing).
+    """
+    hashes = np.zeros(n, dtype=np.float64)
+    position = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            d = np.float64(D[position])
+            hashes[i] += weights[j] * d
+            hashes[j] += weights[i] * d
+            position += 1
+    return hashes
+
+@njit(cache=True)
+def _same_row(D, n, i, j):
+    """
+    Whether samples i < j are at distance 0 with the same distances to every other sample.
+    """
+    if D[n * i - (i * (i + 1)) // 2 + j - i - 1] != 0:
+        return False
+    for k in range(n):
+        if k == i or k == j:
+            continue
+        a = min(i, k)
+        b = max(i, k)
+        c = min(j, k)
+        e = max(j, k)
+        if D[n * a - (a * (a + 1)) // 2 + b - a - 1] != D[n * c - (c * (c + 1)) // 2 + e - c - 1]:
+            return False
+    return True
+
+@njit(cache=True)
+def _expand(Z, unique, group, n):
+    """
+    Linkage matrix of all the samples from the linkage matrix of the unique samples:
+    the other samples of each group join their group at height 0 first, then the
+    merges of the unique samples follow, with a sample of each cluster in Z[:, :2]
+    (relabelled by ``label_linkage``).
+    """
+    k = len(unique)
+    full = np.zeros((n - 1, 4), dtype=np.float64)
+    row = 0
+    for i in range(n):
+        if group[i] != i:
+            full[row, 0] = group[i]
+            full[row, 1] = i
+            row += 1
+    rep = np.empty(2 * k - 1, dtype=np.int64)
+    rep[:k] = unique
+    for r in range(k - 1):
+        rep[k + r] = rep[int(Z[r, 0])]
+        full[row, 0] = rep[int(Z[r, 0])]
+        full[row, 1] = rep[int(Z[r, 1])]
+        full[row, 2] = Z[r, 2]
+        row += 1
+    return full
+
+class identical_samples:
+    """
+    Groups of identical samples of a condensed distance vector.
+
+    Samples are identical when they are at distance 0 from each other and at the same
+    distance from every other sample, i.e. their rows of the square matrix are equal.
+    The rows are hashed in one pass over the vector and samples with equal hashes are
+    compared exactly. Each group is represented by its last sample, and the linkage of
+    the representatives, expanded by ``expand_linkage``, gives the clusters of the
+    linkage of all the samples at every threshold when ``preserves_clusters`` holds.
+
+    Attributes
+    ----------
+    n : int
+        Number of samples.
+    group : np.ndarray
+        int64 array of length n: the last sample of the group of each sample.
+    unique : np.ndarray
+        int64 array of the last sample of each group, in increasing order.
+    sizes : np.ndarray
+        int64 array of the number of samples in each group, in the order of ``unique``.
+
+    Notes
+    -----
+    - Single linkage clusters are the connected components of the pairs within the
+      threshold, so they never depend on the order of the merges.
+    - Complete linkage (SciPy's nearest-neighbour chain) merges a group at height 0 as
+      soon as it reaches one of its samples, and the merged group takes the place of
+      its last sample. When the only distances of 0 are within the groups, the other
+      merges are those of the representatives, in the same order and with the same
+      ties, so the clusters are the same.
+    - Average linkage rounds the distances of a group differently when it is merged
+      in several steps, which can decide ties differently, so it is not reduced.
+    - A linkage matrix only holds binary merges, so the samples of a group join it
+      one after the other by zero-length branches rather than as a polytomy, as in a
+      run on all the samples (which can join them in another order, so the cluster
+      IDs and the tree below the groups can differ).
+    """
+
+    def __init__(self, condensed, n, seed=0) -> None:
+        if len(condensed) != n * (n - 1) // 2:
+            raise ValueError(f'condensed distance vector has {len(condensed)} values, expected {n * (n - 1) // 2}')
+        self.n = n
+        D = np.asarray(condensed)
+        weights = np.random.default_rng(seed).uniform(1.0, 2.0, size=n)
+        hashes = _row_hashes(D, n, weights)
+
+        self.group = np.arange(n, dtype=np.int64)
+        order = np.argsort(hashes, kind='stable')
+        start = 0
+        while start < n:
+            end = start + 1
+            while end < n and hashes[order[end]] == hashes[order[start]]:
+                end += 1
+            # samples with the same hash, in decreasing order; each joins the last identical one
+            candidates = order[start:end][::-1]
+            lasts = []
+            for i in candidates:
+                for last in lasts:
+                    if _same_row(D, n, i, last):
+                        self.group[i] = last
+                        break
+                else:
+                    lasts.append(i)
+            start = end
+
+        self.unique = np.flatnonzero(self.group == np.arange(n))
+        self.sizes = np.bincount(np.searchsorted(self.unique, self.group), minlength=len(self.unique)).astype(np.int64)
+
+    def get_condensed(self, condensed):
+        """
+        Condensed distance vector of the unique samples (the last of each group).
+        """
+        return gather_condensed(np.asarray(condensed), self.n, self.unique)
+
+    def preserves_clusters(self, method, reduced):
+        """
+        Whether the linkage of the unique samples gives the clusters of the linkage of
+        all the samples at every threshold (see the notes of the class).
+
+        Parameters
+        ----------
+        method : str
+            Linkage method, 'single', 'average' or 'complete'.
+        reduced : np.ndarray
+            Condensed distance vector of the unique samples (``get_condensed``).
+        """
+        if len(self.unique) == self.n or method == 'single':
+            return True
+        if method == 'complete':
+            return len(reduced) == 0 or np.min(reduced) > 0
+        return False
+
+    def expand_linkage(self, Z):
+        """
+        Linkage matrix of all the samples from the linkage matrix of the unique samples.
+
+        Parameters
+        ----------
+        Z : np.ndarray
+            Linkage matrix of shape (len(unique)-1, 4) of ``get_condensed``.
+
+        Returns
+        -------
+        np.ndarray
+            Linkage matrix of shape (n-1, 4).
+        """
+        full = _expand(np.asarray(Z, dtype=np.float64), self.unique, self.group, self.n)
+        label_linkage(full, self.n)
+        return full
@@ -0,0 +1,124 @@
+import numpy as np
+from numba import njit
+
+@njit(cache=True)
+def _sweep(Z, n):
+    """
+    Apply the merges of a linkage matrix in order of height and summarise the
+    partition after the last merge at each distinct height.
+
+    Returns the heights and, for each of them, the number of clusters, of singletons,
+    the size of the largest cluster, the number of pairs of samples in the same
+    cluster, and the adjusted Rand and Fowlkes-Mallows indices against the partition
+    at the previous height (all singletons before the first one).
+    """
+    m = len(Z)
+    order = np.argsort(Z[:, 2], kind='mergesort')
+    size = np.ones(2 * n - 1, dtype=np.int64)
+    for r in range(m):
+        size[n + r] = int(Z[r, 3])
+    num_heights = 0
+    for r in range(m):
+        if r == 0 or Z[order[r], 2] != Z[order[r - 1], 2]:
+            num_heights += 1
+
+    heights = np.empty(num_heights, dtype=np.float64)
+    clusters = np.empty(num_heights, dtype=np.int64)
+    singletons = np.empty(num_heights, dtype=np.int64)
+    largest = np.empty(num_heights, dtype=np.int64)
+    pairs = np.empty(num_heights, dtype=np.float64)
+    ari = np.empty(num_heights, dtype=np.float64)
+    fowlkes_mallows = np.empty(num_heights, dtype=np.float64)
+
+    total = n * (n - 1) / 2.0
+    k = n
+    num_singletons = n
+    max_size = 1
+    same = 0.0
+    h = 0
+    r = 0
+    while r < m:
+        height = Z[order[r], 2]
+        previous = same
+        while r < m and Z[order[r], 2] == height:
+            a = int(Z[order[r], 0])
+            b = int(Z[order[r], 1])
+            same += size[a] * size[b]
+            k -= 1
+            num_singletons -= (a < n) + (b < n)
+            max_size = max(max_size, size[a] + size[b])
+            r += 1
+        # the partition at a height refines the next one, so every previous cluster
+        # lies in one cluster and the pairs they share are the previous pairs
+        expected = previous * same / total
+        maximum = (previous + same) / 2.0
+        ari[h] = 1.0 if maximum == expected else (previous - expected) / (maximum - expected)
+        fowlkes_mallows[h] = previous / np.sqrt(previous * same) if previous > 0 else 0.0
+        heights[h] = height
+        clusters[h] = k
+        singletons[h] = num_singletons
+        largest[h] = max_size
+        pairs[h] = same
+        h += 1
+    return heights, clusters, singletons, largest, pairs, ari, fowlkes_mallows
+
+class linkage_sweep:
+    """
+    Cluster statistics at every distinct merge height of a linkage matrix.
+
+    The merges are applied once, in order of height, and the statistics of the
+    partition are updated with each merge from the sizes of the two merged clusters,
+    so the sweep costs O(n log n) instead of one ``fcluster`` call (O(n)) per height.
+    The partition at a height is the one ``fcluster`` (or mcluster) gives with that
+    height as the distance threshold.
+
+    Attributes
+    ----------
+    n : int
+        Number of samples.
+    heights : np.ndarray
+        Distinct merge heights, in increasing order.
+    clusters, singletons, largest : np.ndarray
+        Number of clusters, number of clusters of one sample and size of the largest
+        cluster at each height.
+    mean_size : np.ndarray
+        Mean cluster size at each height.
+    pairs : np.ndarray
+        Number of pairs of samples in the same cluster at each height.
+    ari, fowlkes_mallows : np.ndarray
+        Adjusted Rand and Fowlkes-Mallows indices between the partition at each height
+        and the partition at the previous height (all singletons before the first).
+        Values near 1 mean the cut barely changes the clusters.
+    persistence : np.ndarray
+        Distance to the next height (inf for the last): the range of thresholds that
+        give the same partition.
+
+    Notes
+    -----
+    - Partitions at increasing heights are nested, so the contingency table of two
+      neighbouring cuts holds one cell per cluster of the lower cut and both indices
+      follow from the numbers of pairs of samples in the same cluster. Measures that
+      need the distances between samples (e.g. silhouette widths) cannot be computed
+      from the linkage matrix.
+    """
+    COLUMNS = ['height', 'clusters', 'singletons', 'largest', 'mean_size', 'ari', 'fowlkes_mallows', 'persistence']
+
+    def __init__(self, linkage, n) -> None:
+        self.n = n
+        (self.heights, self.clusters, self.singletons, self.largest, self.pairs, self.ari,
+         self.fowlkes_mallows) = _sweep(np.asarray(linkage, dtype=np.float64).reshape(max(n - 1, 0), 4), n)
+        self.mean_size = n / self.clusters
+        self.persistence = np.append(np.diff(self.heights), np.inf)
+
+    def get_table(self):
+        """
+        Get the statistics of every height.
+
+        Returns
+        -------
+        list of tuple
+            One tuple per height with the values of ``COLUMNS``.
+        """
+        return list(zip(self.heights.tolist(), self.clusters.tolist(), self.singletons.tolist(),
+                        self.largest.tolist(), self.mean_size.tolist(), self.ari.tolist(),
+                        self.fowlkes_mallows.tolist(), self.persistence.tolist()))
@@ -0,0 +1,163 @@
+import itertools
+import numpy as np
+from genomic_address_service.classes.matrix_reader import matrix_reader
+from genomic_address_service.compression import open_input
+from genomic_address_service.utils import condensed_size, condensed_index, fits_dtype, permute_condensed
+
+class lower_triangle_reader(matrix_reader):
+    """
+    Read a lower triangle distance matrix directly into a condensed distance vector.
+
+    Row i holds the sample label followed by its distances to samples 0..i-1,
+    optionally followed by the diagonal 0 (so the first row may hold only the label).
+    Three layouts are recognised from the first line:
+
+    - PHYLIP: the number of samples on a line of its own, then the rows with the
+      label and values separated by whitespace.
+    - TSV with a header: ``dists`` followed by the labels, as in the square format.
+    - TSV without a header (as read by ``neigbours``), where the first line is
+      already the first row.
+
+    Attributes
+    ----------
+    labels : list of str
+        Sample labels in the order of the returned condensed vector.
+    n : int
+        Number of samples in the matrix.
+
+    Notes
+    -----
+    - Every value is read once, so there is no symmetry to check; with
+      ``validate`` the labels are checked against the header and the diagonal
+      (when present) must be 0.
+    - Empty trailing fields are ignored.
+    - Without a header the number of samples is found by counting the lines
+      first (a second pass over the file), and ``sort_matrix`` is applied to the
+      condensed vector at the end, which needs a second vector for the permutation.
+    - ``dtype`` works as in ``matrix_reader``.
+    """
+    ERROR_FORMAT = ("Incorrect Lower Triangle Matrix Format: row i must hold its label followed by the i distances to "
+                    "the previous rows (and optionally the diagonal 0)")
+
+    def __init__(self, f, delim="\t", sort_matrix=False, validate=True, dtype='float64') -> None:
+        super().__init__(f, delim=delim, sort_matrix=sort_matrix, validate=validate, dtype=dtype)
+        self.phylip = False
+        self.header = False
+
+    def split(self, line):
+        """
+        Tokens of a line, without the empty trailing fields.
+        """
+        tokens = line.split() if self.phylip else line.rstrip("\r\n").split(self.delim)
+        while len(tokens) > 0 and tokens[-1] == '':
+            tokens.pop()
+        return tokens
+
+    def read_header(self, fh):
+        """
+        Recognise the layout from the first line and set the number of samples.
+
+        Returns
+        -------
+        iterator of str
+            The data lines, starting with the first line when it is a row.
+        """
+        first = fh.readline()
+        tokens = first.split()
+        self.phylip = len(tokens) == 1 and tokens[0].isdigit()
+        if self.phylip:
+            self.n = int(tokens[0])
+            return fh
+
+        tokens = self.split(first)
+        self.header = len(tokens) > 2 or (len(tokens) == 2 and not self.is_number(tokens[1]))
+        if self.header:
+            columns = tokens[1:]
+            if len(set(columns)) != len(columns):
+                raise ValueError(self.ERROR_FORMAT)
+            self.n = len(columns)
+            self.columns = columns
+            if self.sort_matrix:
+                order = sorted(range(self.n), key=columns.__getitem__)
+                self.rank = np.empty(self.n, dtype=np.int64)
+                self.rank[order] = np.arange(self.n, dtype=np.int64)
+            return fh
+
+        with open_input(self.fpath) as count:
+            self.n = sum(1 for line in count if line.strip() != '')
+        return itertools.chain([first], fh)
+
+    @staticmethod
+    def is_number(token):
+        try:
+            float(token)
+        except ValueError:
+            return False
+        return True
+
+    def read_data(self, allocate=None):
+        """
+        Read the matrix into a condensed distance vector.
+
+        Parameters
+        ----------
+        allocate : callable, optional
+            See ``matrix_reader.read_data``; called with the labels known so far
+            (the header labels, or an empty list).
+
+        Returns
+        -------
+        labels : list of str
+            Sample labels in the order used by the condensed vector.
+        np.ndarray
+            Condensed (upper triangle, row-major) distance vector of length n*(n-1)/2,
+            of type ``self.dtype``.
+        """
+        self.row_number = 0
+        self.rank = None
+        with open_input(self.fpath) as fh:
+            lines = self.read_header(fh)
+            n = self.n
+            self.row_starts = condensed_index(n, np.arange(n, dtype=np.int64), np.arange(n, dtype=np.int64) + 1)
+            self.allocate = allocate
+            labels = []
+            if allocate is None:
+                condensed = np.empty(condensed_size(n), dtype=self.dtype)
+            else:
+                condensed = allocate(list(self.columns), self.dtype)
+
+            for line in lines:
+                tokens = self.split(line)
+                if len(tokens) == 0:
+                    continue
+                i = self.row_number
+                if i >= n or len(tokens) - 1 not in (i, i + 1):
+                    raise ValueError(self.ERROR_FORMAT)
+                if self.header and self.validate and tokens[0] != self.columns[i]:
+                    raise ValueError(self.ERROR_FORMAT)
+                labels.append(tokens[0])
+                values = self.parse_values(tokens[1:])
+                if len(values) > i:
+                    if self.validate and values[i] != 0:
+                        raise ValueError(self.ERROR_FORMAT)
+                    values = values[:i]
+                if self.dtype != np.float64 and self.exact and not fits_dtype(values, self.dtype):
+                    condensed = self.widen(condensed, values)
+                condensed[self.lower_positions(i)] = values
+                self.row_number += 1
+
+        if self.row_number != n:
+            raise ValueError(self.ERROR_FORMAT)
+        if len(set(labels)) != n:
+            raise ValueError(self.ERROR_FORMAT)
+
+        self.columns = labels
+        if not self.sort_matrix:
+            self.labels = labels
+        elif self.rank is not None:
+            self.labels = sorted(labels)
+        else:
+            order = sorted(range(n), key=labels.__getitem__)
+            self.labels = [labels[i] for i in order]
+            condensed = permute_condensed(condensed, n, np.array(order, dtype=np.int64))
+        return self.labels, condensed
@@ -0,0 +1,833 @@
+import copy
+import io
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+from genomic_address_service.constants import MATRIX_NA_VALUES
+from genomic_address_service.compression import compression_type, open_input
+from genomic_address_service.utils import condensed_size, condensed_index, fits_dtype, narrowest_dtype
+
+# state of a worker process of a parallel read: the reader and the condensed vector it writes to
+_parallel_read = {}
+
+def _init_worker(reader):
+    _parallel_read['reader'] = reader
+
+def _open_buffer(buffer):
+    """
+    Map the condensed vector described by (file name, dtype, offset, length) in a worker.
+    """
+    if _parallel_read.get('buffer') != buffer:
+        filename, dtype, offset, size = buffer
+        if filename is None:
+            condensed = np.empty(0, dtype=dtype)
+        else:
+            condensed = np.memmap(filename, dtype=dtype, mode='r+', offset=offset, shape=(size,))
+        _parallel_read['buffer'] = buffer
+        _parallel_read['condensed'] = condensed
+    return _parallel_read['condensed']
+
+def _run_chunk(task):
+    method, buffer, start, end = task
+    try:
+        return getattr(_parallel_read['reader'], method)(_open_buffer(buffer), start, end)
+    except ValueError as e:
+        return e
+
+def create_shared_file(size, dtype, shared_memory_dir='/dev/shm'):
+    """
+    Memory map of a new temporary file of ``size`` values, which other processes can
+    map by its name (``filename`` attribute). The file is put in shared memory
+    (``shared_memory_dir``) when it has room for it and otherwise in the temporary
+    directory (``$TMPDIR``); the caller removes it. The space is reserved up front,
+    so a full file system is reported here rather than by a crash. An empty vector
+    is returned as an in-memory array.
+
+    Raises
+    ------
+    ValueError
+        If neither location has room for the vector.
+    """
+    dtype = np.dtype(dtype)
+    if size == 0:
+        return np.empty(0, dtype=dtype)
+    nbytes = size * dtype.itemsize
+    directories = [tempfile.gettempdir()]
+    if os.path.isdir(shared_memory_dir):
+        directories.insert(0, shared_memory_dir)
+    for directory in directories:
+        stats = os.statvfs(directory)
+        if stats.f_bavail * stats.f_frsize < nbytes:
+            continue
+        fd, filename = tempfile.mkstemp(prefix='gas-', suffix='.condensed', dir=directory)
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, 0, nbytes)
+            else:
+                os.ftruncate(fd, nbytes)
+        except OSError:
+            os.remove(filename)
+            continue
+        finally:
+            os.close(fd)
+        return np.memmap(filename, dtype=dtype, mode='r+', shape=(size,))
+    raise ValueError(f'Reading with multiple threads needs {nbytes} bytes of temporary space for the distance matrix, '
+                     f'which is not available in {" or ".join(directories)}; set TMPDIR to a larger file system')
+
+class matrix_reader:
+    """
+    Stream a square, tab-delimited distance matrix into a condensed distance vector.
+
+    The matrix is read one line at a time and the values of each row are written
+    directly into a preallocated condensed vector of length n*(n-1)/2 (the layout
+    expected by ``scipy.cluster.hierarchy.linkage``). The header, row labels,
+    missing values and symmetry are validated as the rows arrive, so the peak
+    memory use is approximately one condensed vector plus one row.
+
+    Attributes
+    ----------
+    labels : list of str
+        Sample labels in the order of the returned condensed vector.
+    n : int
+        Number of samples in the matrix.
+    row_number : int
+        Number of matrix rows (excluding the header) read so far.
+
+    Notes
+    -----
+    - When ``sort_matrix`` is set, the labels are sorted before any rows are
+      read and every value is written to its sorted position, so no reordering
+      of the matrix is needed afterwards.
+    - Rows are converted and validated in blocks of ``block_size`` rows, so the
+      validation working set is bounded by ``block_size`` rows.
+    - Symmetry is checked with an optional absolute/relative tolerance
+      (``|lower - upper| <= atol + rtol * |upper|``); the upper triangle values
+      are the ones kept. With ``validate=False`` only the upper triangle of each
+      row is parsed and the symmetry check is skipped.
+    - The condensed vector is stored with ``dtype``. With 'auto' it starts as
+      uint16 and is widened (uint32, float32, float64) the first time a value
+      cannot be held exactly, so integer distances use 2 or 4 bytes per pair.
+      An explicit 'uint16'/'uint32' rejects values it cannot hold, while an
+      explicit 'float32' is lossy: values are rounded to single precision (e.g.
+      0.1 is stored as 0.100000001), which can move a distance across a
+      threshold.
+    - With ``threads`` > 1 the rows after the header are split into byte ranges
+      at line boundaries and parsed by a pool of worker processes, which map the
+      condensed vector and write straight into disjoint parts of it. The vector
+      is the memory map returned by ``allocate`` or, by default, a memory map of
+      a temporary file in shared memory (``/dev/shm``) or, when that is too
+      small (e.g. 64 MB in a default Docker container), in ``$TMPDIR``. The file
+      is removed once the read is over. Workers are spawned rather than forked, as
+      forking a process whose numba thread pool is running can deadlock.
+      Each worker returns per-column hashes of its rows, so an exact symmetry
+      check needs no second pass; a check with ``atol``/``rtol`` (or the search
+      for the offending pairs) re-reads the rows in parallel once all of them
+      have been stored. Compressed matrices cannot be split into byte ranges, so
+      they are read on one thread (decompressed as they are read).
+    """
+    ERROR_FORMAT = "Incorrect Distance Matrix Format: --matrix must have (n x n) dimensions, 0 diagonal starting at position [0,0] and rows/columns must in the same order."
+    ERROR_NON_NUMERIC = "Input matrix should only contain numerical values"
+    ERROR_NAN = "Distance matrix contains NaN, null or NA values."
+    ERROR_ASYMMETRIC = "Distance matrix has non-symmetrical values"
+    ERROR_DTYPE = "Distance matrix values cannot be stored exactly as {dtype}; use --dtype auto or a wider type"
+
+    MAX_REPORTED_PAIRS = 5
+    # upper bound on the size of the byte range parsed by a worker in one task
+    CHUNK_BYTES = 1 << 25
+    SHARED_MEMORY_DIR = '/dev/shm'
+
+    # types tried by dtype='auto', narrowest first, and the types each one can be widened to
+    AUTO_DTYPES = [np.uint16, np.uint32, np.float32, np.float64]
+    WIDER_DTYPES = {
+        np.dtype(np.uint16): [np.uint32, np.float32, np.float64],
+        np.dtype(np.uint32): [np.float64],
+        np.dtype(np.float32): [np.float64],
+    }
+
+    def __init__(self, f, delim="\t", sort_matrix=False, validate=True, atol=0.0, rtol=0.0, block_size=256,
+                 dtype='float64', threads=1) -> None:
+        self.fpath = f
+        self.delim = delim
+        self.sort_matrix = sort_matrix
+        self.validate = validate
+        self.atol = atol
+        self.rtol = rtol
+        self.block_size = max(1, block_size)
+        self.auto_dtype = dtype == 'auto'
+        self.dtype = np.dtype(self.AUTO_DTYPES[0] if self.auto_dtype else dtype)
+        # only an explicit float32 stores values that it cannot hold exactly (rounded)
+        self.exact = self.auto_dtype or self.dtype != np.float32
+        self.threads = max(1, threads)
+        self.shared_files = []
+        self.allocate = None
+        self.labels = []
+        self.n = 0
+        self.row_number = 0
+        self.rank = None
+        self.row_starts = None
+        self.columns = []
+        self.column_index = {}
+
+    def read_header(self, fh):
+        """
+        Read the header line and prepare the label order.
+
+        Parameters
+        ----------
+        fh : file object
+            Open handle positioned at the start of the matrix file.
+
+        Returns
+        -------
+        list of str
+            Column labels in file order.
+        """
+        line = fh.readline()
+        header = line.rstrip("\r\n").split(self.delim)
+        columns = header[1:]
+        if len(columns) == 0 or len(set(columns)) != len(columns):
+            raise ValueError(self.ERROR_FORMAT)
+
+        self.n = len(columns)
+        self.columns = columns
+        self.column_index = {label: i for i, label in enumerate(columns)}
+        self.row_starts = condensed_index(self.n, np.arange(self.n, dtype=np.int64), np.arange(self.n, dtype=np.int64) + 1)
+
+        if self.sort_matrix:
+            order = sorted(range(self.n), key=columns.__getitem__)
+            self.rank = np.empty(self.n, dtype=np.int64)
+            self.rank[order] = np.arange(self.n, dtype=np.int64)
+            self.labels = [columns[i] for i in order]
+        else:
+            self.rank = None
+            self.labels = list(columns)
+
+        return columns
+
+    def parse_values(self, tokens):
+        """
+        Convert the distance tokens of one row to floats.
+
+        Parameters
+        ----------
+        tokens : list of str
+            Distance values of a row (without the row label).
+
+        Returns
+        -------
+        np.ndarray
+            Row values as a float64 array.
+        """
+        try:
+            values = np.array(tokens, dtype=np.float64)
+        except ValueError:
+            has_missing = False
+            for token in tokens:
+                try:
+                    float(token)
+                except ValueError:
+                    if token.strip() not in MATRIX_NA_VALUES:
+                        raise ValueError(self.ERROR_NON_NUMERIC)
+                    has_missing = True
+            if has_missing:
+                raise ValueError(self.ERROR_NAN)
+            raise ValueError(self.ERROR_NON_NUMERIC)
+
+        if np.isnan(values).any():
+            raise ValueError(self.ERROR_NAN)
+
+        return values
+
+    def parse_block(self, rows):
+        """
+        Convert the distance tokens of a block of rows to a 2D float array.
+
+        Parameters
+        ----------
+        rows : list of list of str
+            Distance values of each row (without the row labels).
+
+        Returns
+        -------
+        np.ndarray
+            Block values with one row per matrix row.
+        """
+        try:
+            values = np.array(rows, dtype=np.float64)
+        except ValueError:
+            # locate and classify the offending value
+            for tokens in rows:
+                self.parse_values(tokens)
+            raise ValueError(self.ERROR_NON_NUMERIC)
+
+        if np.isnan(values).any():
+            raise ValueError(self.ERROR_NAN)
+
+        return values
+
+    def read_rows(self, fh, columns, part=None, partial=False):
+        """
+        Yield the validated rows of the matrix in blocks.
+
+        Parameters
+        ----------
+        fh : file object
+            Open handle positioned after the header line.
+        columns : list of str
+            Column labels in file order, as returned by ``read_header``.
+        part : str, optional
+            Part of each row to parse: 'full', 'upper' (values after the diagonal)
+            or 'lower' (values before the diagonal). Defaults to 'full' when
+            validating and 'upper' otherwise.
+        partial : bool, optional (default=False)
+            ``fh`` holds a consecutive run of rows from anywhere in the matrix (a
+            chunk of a parallel read): the index of its first row is looked up from
+            the row label and the check that every row was read is skipped.
+
+        Yields
+        ------
+        tuple of (int, np.ndarray or list of np.ndarray)
+            The index (in file order) of the first row of the block and the values
+            of each row (a 2D array for full rows).
+        """
+        if part is None:
+            part = 'full' if self.validate else 'upper'
+        full = part == 'full'
+        block = []
+        block_start = None if partial else self.row_number
+        for line in fh:
+            line = line.rstrip("\r\n")
+            if line == '':
+                continue
+            tokens = line.split(self.delim)
+            if block_start is None:
+                block_start = self.row_number = self.column_index.get(tokens[0], self.n)
+            if self.row_number >= self.n or len(tokens) != self.n + 1 or tokens[0] != columns[self.row_number]:
+                raise ValueError(self.ERROR_FORMAT)
+            if full:
+                block.append(tokens[1:])
+            elif part == 'upper':
+                block.append(self.parse_values(tokens[self.row_number + 2:]))
+            else:
+                block.append(self.parse_values(tokens[1:self.row_number + 1]))
+            self.row_number += 1
+
+            if len(block) == self.block_size:
+                yield block_start, self.parse_block(block) if full else block
+                block = []
+                block_start = self.row_number
+
+        if len(block) > 0:
+            yield block_start, self.parse_block(block) if full else block
+
+        if not partial and self.row_number != self.n:
+            raise ValueError(self.ERROR_FORMAT)
+
+    def upper_positions(self, i):
+        """
+        Condensed positions of the pairs (i, j) for j > i, in file order of j.
+        """
+        r = self.rank[i]
+        upper = self.rank[i + 1:]
+        return condensed_index(self.n, np.minimum(upper, r), np.maximum(upper, r))
+
+    def lower_positions(self, i):
+        """
+        Condensed positions of the pairs (j, i) for j < i, in file order of j.
+        """
+        if self.rank is None:
+            # pair (j, i) for j < i is stored at row_starts[j] + (i - j - 1)
+            return self.row_starts[:i] + (i - 1) - np.arange(i, dtype=np.int64)
+        r = self.rank[i]
+        lower = self.rank[:i]
+        return condensed_index(self.n, np.minimum(lower, r), np.maximum(lower, r))
+
+    def store_block(self, condensed, block_start, block):
+        """
+        Write the upper triangle part of a block of rows into the condensed vector
+        and, when validating, check the lower triangle part of the same rows against
+        the values already stored.
+
+        Parameters
+        ----------
+        condensed : np.ndarray
+            Preallocated condensed distance vector.
+        block_start : int
+            Row index (in file order) of the first row of the block.
+        block : np.ndarray or list of np.ndarray
+            Row values as produced by ``read_rows``.
+
+        Returns
+        -------
+        np.ndarray
+            The condensed vector, which is a new (wider) array when the block holds
+            values that the current dtype cannot represent and ``dtype='auto'``.
+        """
+        if self.dtype != np.float64 and self.exact:
+            upper = self.upper_values(block_start, block)
+            if not fits_dtype(upper, self.dtype):
+                condensed = self.widen(condensed, upper)
+        self.store_upper(condensed, block_start, block)
+
+        if self.validate:
+            offending = self.check_lower(condensed, block_start, block)
+            if len(offending) > 0:
+                raise ValueError(self.format_asymmetry(offending))
+        return condensed
+
+    def upper_values(self, block_start, block):
+        """
+        Values of a block of rows that lie above the diagonal, as one flat array.
+        """
+        if not self.validate:
+            return np.concatenate(block) if len(block) > 0 else np.empty(0)
+        rows = np.arange(block_start, block_start + len(block))
+        return block[np.arange(self.n)[None, :] > rows[:, None]]
+
+    def store_upper(self, condensed, block_start, block):
+        """
+        Write the upper triangle part of a block of rows into the condensed vector.
+        """
+        n = self.n
+        for offset in range(len(block)):
+            i = block_start + offset
+            upper = block[offset][i + 1:] if self.validate else block[offset]
+            if self.rank is None:
+                start = self.row_starts[i]
+                condensed[start:start + n - i - 1] = upper
+            else:
+                condensed[self.upper_positions(i)] = upper
+
+    def check_lower(self, condensed, block_start, block):
+        """
+        Compare the lower triangle part of a block of rows with the stored values.
+
+        Returns
+        -------
+        list of tuple
+            Up to ``MAX_REPORTED_PAIRS`` offending pairs (row, col, value at [row, col],
+            value at [col, row]) in file order.
+        """
+        offending = []
+        for offset in range(len(block)):
+            i = block_start + offset
+            if i == 0:
+                continue
+            stored = condensed[self.lower_positions(i)]
+            lower = block[offset][:i]
+            if not self.exact:
+                # compare with the rounding applied to the stored values
+                lower = lower.astype(condensed.dtype)
+            mismatched = ~np.isclose(lower, stored, rtol=self.rtol, atol=self.atol)
+            for j in np.flatnonzero(mismatched)[:self.MAX_REPORTED_PAIRS - len(offending)]:
+                offending.append((i, int(j), lower[j], stored[j]))
+            if len(offending) == self.MAX_REPORTED_PAIRS:
+                break
+        return offending
+
+    def widen(self, condensed, values):
+        """
+        Move the condensed vector to the narrowest wider dtype that holds ``values`` exactly.
+
+        Raises
+        ------
+        ValueError
+            If the dtype was set explicitly (not 'auto').
+        """
+        if not self.auto_dtype:
+            raise ValueError(self.ERROR_DTYPE.format(dtype=self.dtype.name))
+        return self.convert(condensed, narrowest_dtype(values, self.WIDER_DTYPES[self.dtype]))
+
+    def convert(self, condensed, dtype):
+        """
+        Copy the condensed vector to a new vector of type ``dtype`` (obtained from
+        ``allocate`` when one was given).
+        """
+        self.dtype = np.dtype(dtype)
+        if self.allocate is None:
+            return condensed.astype(self.dtype)
+        widened = self.allocate(self.labels, self.dtype)
+        widened[:] = condensed
+        return widened
+
+    def format_asymmetry(self, offending):
+        """
+        Build the error message listing the first offending pairs.
+
+        Parameters
+        ----------
+        offending : list of tuple
+            (row, col, value at [row, col], value at [col, row]) with row/col in file order.
+        """
+        columns = self.columns
+        pairs = [f'[{columns[i]}, {columns[j]}]={a:g} vs [{columns[j]}, {columns[i]}]={b:g}'
+                 for i, j, a, b in offending]
+        return f'{self.ERROR_ASYMMETRIC}: ' + '; '.join(pairs)
+
+    def find_asymmetric_pairs(self, i, lower):
+        """
+        Re-read column i of the rows above the diagonal to locate the values that
+        differ from the lower triangle part of row i.
+
+        Returns
+        -------
+        list of tuple
+            (row, col, value at [row, col], value at [col, row]) in file order.
+        """
+        offending = []
+        with open_input(self.fpath) as fh:
+            fh.readline()
+            j = 0
+            for line in fh:
+                if j == i:
+                    break
+                line = line.rstrip("\r\n")
+                if line == '':
+                    continue
+                upper = float(line.split(self.delim)[i + 1])
+                if not np.isclose(lower[j], upper, rtol=self.rtol, atol=self.atol):
+                    offending.append((i, j, lower[j], upper))
+                    if len(offending) == self.MAX_REPORTED_PAIRS:
+                        break
+                j += 1
+        return offending
+
+    def stream_lower(self):
+        """
+        Stream the rows of the matrix without storing it, for algorithms that only
+        need the distances of each sample to the samples before it (e.g. SLINK).
+
+        Symmetry is checked as in ``stream_rows``; without validation only the lower
+        triangle part of each row is parsed.
+
+        Yields
+        ------
+        tuple of (int, np.ndarray)
+            Row index in file order and the distances between that sample and the
+            samples of the previous rows.
+        """
+        if self.validate:
+            for i, row in self.stream_rows():
+                yield i, row[:i]
+            return
+
+        self.row_number = 0
+        with open_input(self.fpath) as fh:
+            columns = self.read_header(fh)
+            for block_start, block in self.read_rows(fh, columns, part='lower'):
+                for offset in range(len(block)):
+                    yield block_start + offset, block[offset]
+
+    def stream_rows(self):
+        """
+        Stream the full rows of the matrix without storing it.
+
+        Symmetry is checked in O(n) memory: for each column, a hash of the upper
+        triangle values (a sum of the value bit patterns times random per-row
+        weights, modulo 2^64) is accumulated as the rows are read and compared with
+        the same hash of the lower triangle part of the row when it arrives. This
+        only detects exact differences, so a non-zero ``atol``/``rtol`` is rejected.
+
+        Yields
+        ------
+        tuple of (int, np.ndarray)
+            Row index in file order and the distances between that sample and every
+            sample, in file order.
+        """
+        if self.validate and (self.atol != 0 or self.rtol != 0):
+            raise ValueError('streaming the rows only supports exact symmetry checks (atol=rtol=0)')
+
+        self.row_number = 0
+        with open_input(self.fpath) as fh:
+            columns = self.read_header(fh)
+            if self.validate:
+                weights = self.symmetry_weights()
+                column_hash = np.zeros(self.n, dtype=np.uint64)
+            for block_start, block in self.read_rows(fh, columns, part='full'):
+                for offset in range(len(block)):
+                    i = block_start + offset
+                    row = block[offset] + 0.0 # map -0.0 to 0.0
+                    if self.validate:
+                        bits = row.view(np.uint64)
+                        if np.sum(bits[:i] * weights[:i], dtype=np.uint64) != column_hash[i]:
+                            raise ValueError(self.format_asymmetry(self.find_asymmetric_pairs(i, row[:i])))
+                        column_hash[i + 1:] += bits[i + 1:] * weights[i]
+                    yield i, row
+
+    def symmetry_weights(self):
+        """
+        Random odd per-row weights of the symmetry hashes (fixed for a given n).
+        """
+        n = self.n
+        return np.random.default_rng(n).integers(1, np.iinfo(np.int64).max, size=n, dtype=np.int64).view(np.uint64) | np.uint64(1)
+
+    def read_data(self, allocate=None):
+        """
+        Read the matrix into a condensed distance vector.
+
+        Parameters
+        ----------
+        allocate : callable, optional
+            Called with the list of labels and a dtype once the header has been read
+            (and again if ``dtype='auto'`` has to widen the vector); must return a
+            writable array of length n*(n-1)/2 of that dtype to receive the values (e.g.
+            a memory map of an output file). By default an in-memory array is used.
+            With ``threads`` > 1 the returned array must be a ``np.memmap``.
+
+        Returns
+        -------
+        labels : list of str
+            Sample labels in the order used by the condensed vector.
+        np.ndarray
+            Condensed (upper triangle, row-major) distance vector of length n*(n-1)/2,
+            of type ``self.dtype``.
+        """
+        self.row_number = 0
+        if self.threads > 1 and compression_type(self.fpath) is None:
+            return self.read_data_parallel(allocate)
+        with open_input(self.fpath) as fh:
+            columns = self.read_header(fh)
+            self.allocate = allocate
+            if allocate is None:
+                condensed = np.empty(condensed_size(self.n), dtype=self.dtype)
+            else:
+                condensed = allocate(self.labels, self.dtype)
+            for block_start, block in self.read_rows(fh, columns):
+                condensed = self.store_block(condensed, block_start, block)
+
+        return self.labels, condensed
+
+    def read_data_parallel(self, allocate=None):
+        """
+        Read the matrix into a condensed distance vector with ``threads`` worker
+        processes. Takes the same arguments and returns the same values as
+        ``read_data``.
+        """
+        with open_input(self.fpath) as fh:
+            self.read_header(fh)
+        with open(self.fpath, 'rb') as fh:
+            fh.readline()
+            ranges = self.chunk_ranges(fh.tell())
+
+        # the workers get a copy of the reader without the allocate callback, which may not be picklable
+        worker_reader = copy.copy(self)
+        worker_reader.allocate = None
+        self.allocate = self.allocate_shared if allocate is None else allocate
+        try:
+            condensed = self.allocate(self.labels, self.dtype)
+            if len(condensed) > 0 and not isinstance(condensed, np.memmap):
+                raise ValueError('allocate must return a memory map when reading with multiple threads')
+            processes = max(1, min(self.threads, len(ranges)))
+            with multiprocessing.get_context('spawn').Pool(processes, initializer=_init_worker,
+                                                           initargs=(worker_reader,)) as pool:
+                condensed = self.parse_chunks(pool, ranges, condensed)
+        finally:
+            # the memory maps stay valid once their files are removed
+            for filename in self.shared_files:
+                os.remove(filename)
+            self.shared_files = []
+
+        return self.labels, condensed
+
+    def parse_chunks(self, pool, ranges, condensed):
+        """
+        Parse, store and validate the byte ranges of the matrix in a worker pool.
+
+        Returns
+        -------
+        np.ndarray
+            The condensed vector (a new, wider one when ``dtype='auto'`` had to widen it).
+        """
+        n = self.n
+        exact = self.validate and self.atol == 0 and self.rtol == 0
+        column_hash = np.zeros(n, dtype=np.uint64)
+        row_hash = np.zeros(n, dtype=np.uint64)
+        rows = [None] * len(ranges)
+        pending = list(range(len(ranges)))
+        while len(pending) > 0:
+            # chunks holding values that do not fit the current type are parsed again once it is widened
+            failed = []
+            dtype = self.dtype
+            results = self.map_chunks(pool, 'parse_chunk', [ranges[k] for k in pending], condensed)
+            for k, result in zip(pending, results):
+                if isinstance(result, Exception):
+                    raise result
+                first_row, end_row, chunk_dtype, fits, chunk_column_hash, chunk_row_hash = result
+                if not fits:
+                    if not self.auto_dtype:
+                        raise ValueError(self.ERROR_DTYPE.format(dtype=self.dtype.name))
+                    failed.append(k)
+                    dtype = self.common_dtype(dtype, chunk_dtype)
+                    continue
+                rows[k] = (first_row, end_row)
+                if exact and first_row is not None:
+                    column_hash += chunk_column_hash
+                    row_hash[first_row:end_row] = chunk_row_hash
+            if len(failed) > 0:
+                condensed = self.convert(condensed, dtype)
+            pending = failed
+
+        # the chunks must hold the rows in order, each row exactly once
+        expected = 0
+        for first_row, end_row in rows:
+            if first_row is None:
+                continue
+            if first_row != expected:
+                raise ValueError(self.ERROR_FORMAT)
+            expected = end_row
+        if expected != n:
+            raise ValueError(self.ERROR_FORMAT)
+        self.row_number = n
+
+        if self.validate and (not exact or np.any(column_hash != row_hash)):
+            offending = []
+            for result in self.map_chunks(pool, 'check_chunk', ranges, condensed):
+                if isinstance(result, Exception):
+                    raise result
+                offending += result[:self.MAX_REPORTED_PAIRS - len(offending)]
+                if len(offending) == self.MAX_REPORTED_PAIRS:
+                    break
+            if len(offending) > 0:
+                raise ValueError(self.format_asymmetry(offending))
+
+        return condensed
+
+    def map_chunks(self, pool, method, ranges, condensed):
+        """
+        Run a chunk method of the reader (``parse_chunk`` or ``check_chunk``) on byte
+        ranges in the worker pool; the workers map ``condensed`` through its file.
+
+        Returns
+        -------
+        iterator
+            The results (or the ValueError raised) of each range, in order.
+        """
+        if len(condensed) == 0:
+            buffer = (None, condensed.dtype.str, 0, 0)
+        else:
+            buffer = (condensed.filename, condensed.dtype.str, condensed.offset, len(condensed))
+        return pool.imap(_run_chunk, [(method, buffer, start, end) for start, end in ranges])
+
+    def chunk_ranges(self, data_start):
+        """
+        Split the rows of the matrix file into byte ranges that start at line boundaries.
+
+        Parameters
+        ----------
+        data_start : int
+            Byte offset of the first row (just after the header line).
+
+        Returns
+        -------
+        list of tuple of (int, int)
+            (start, end) byte offsets of each range, in file order.
+        """
+        size = os.path.getsize(self.fpath)
+        num_chunks = max(self.threads * 4, -(-(size - data_start) // self.CHUNK_BYTES))
+        bounds = [data_start]
+        with open(self.fpath, 'rb') as fh:
+            for k in range(1, num_chunks):
+                position = data_start + (size - data_start) * k // num_chunks
+                if position <= bounds[-1]:
+                    continue
+                # move to the start of the line following the one holding the byte before position
+                fh.seek(position - 1)
+                fh.readline()
+                position = fh.tell()
+                if position >= size:
+                    break
+                if position > bounds[-1]:
+                    bounds.append(position)
+        bounds.append(size)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def read_chunk(self, start, end):
+        """
+        Open a byte range of the matrix file as a text stream.
+        """
+        with open(self.fpath, 'rb') as fh:
+            fh.seek(start)
+            return io.TextIOWrapper(io.BytesIO(fh.read(end - start)))
+
+    def parse_chunk(self, condensed, start, end):
+        """
+        Parse the rows of a byte range and store their upper triangle parts (run by a worker).
+
+        Returns
+        -------
+        tuple
+            Index of the first and one past the last row of the range (None and 0 when
+            the range holds no row), the narrowest type holding the values of the range,
+            whether the values were stored (they fit the type of ``condensed``), and, for an exact
+            symmetry check, the hashes of the upper triangle part of each column and of
+            the lower triangle part of each row of the range.
+        """
+        n = self.n
+        exact = self.validate and self.atol == 0 and self.rtol == 0
+        column_hash = np.zeros(n, dtype=np.uint64) if exact else None
+        row_hash = []
+        weights = self.symmetry_weights() if exact else None
+        # the type of the vector, which may have been widened since this reader was copied to the worker
+        dtype = condensed.dtype
+        fits = True
+        first_row = None
+        for block_start, block in self.read_rows(self.read_chunk(start, end), self.columns, partial=True):
+            if first_row is None:
+                first_row = block_start
+            if dtype != np.float64 and self.exact:
+                upper = self.upper_values(block_start, block)
+                if not fits_dtype(upper, dtype):
+                    fits = False
+                    if not self.auto_dtype:
+                        break
+                    dtype = narrowest_dtype(upper, self.WIDER_DTYPES[dtype])
+            if fits:
+                self.store_upper(condensed, block_start, block)
+            if exact:
+                for offset in range(len(block)):
+                    i = block_start + offset
+                    bits = (block[offset] + 0.0).view(np.uint64) # map -0.0 to 0.0
+                    row_hash.append(np.sum(bits[:i] * weights[:i], dtype=np.uint64))
+                    column_hash[i + 1:] += bits[i + 1:] * weights[i]
+        end_row = 0 if first_row is None else self.row_number
+        return first_row, end_row, dtype, fits, column_hash, np.array(row_hash, dtype=np.uint64)
+
+    def check_chunk(self, condensed, start, end):
+        """
+        Compare the lower triangle part of the rows of a byte range with the stored
+        values (run by a worker once every row has been stored).
+
+        Returns
+        -------
+        list of tuple
+            Up to ``MAX_REPORTED_PAIRS`` offending pairs, see ``check_lower``.
+        """
+        offending = []
+        for block_start, block in self.read_rows(self.read_chunk(start, end), self.columns, partial=True):
+            offending += self.check_lower(condensed, block_start, block)[:self.MAX_REPORTED_PAIRS - len(offending)]
+            if len(offending) == self.MAX_REPORTED_PAIRS:
+                break
+        return offending
+
+    def common_dtype(self, a, b):
+        """
+        Narrowest type that ``dtype='auto'`` can widen to that holds the values of both types.
+        """
+        a, b = np.dtype(a), np.dtype(b)
+        wider_b = [b] + [np.dtype(t) for t in self.WIDER_DTYPES.get(b, [])]
+        for candidate in [a] + [np.dtype(t) for t in self.WIDER_DTYPES.get(a, [])]:
+            if candidate in wider_b:
+                return candidate
+        return np.dtype(np.float64)
+
+    def allocate_shared(self, labels, dtype):
+        """
+        Allocate the condensed vector as a memory map of a temporary file, so that
+        worker processes can map it too (see ``create_shared_file``). The file is
+        removed at the end of the read.
+        """
+        condensed = create_shared_file(condensed_size(len(labels)), dtype, self.SHARED_MEMORY_DIR)
+        if isinstance(condensed, np.memmap):
+            self.shared_files.append(condensed.filename)
+        return condensed
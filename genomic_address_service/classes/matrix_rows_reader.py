@@ -0,0 +1,110 @@
+import numpy as np
+from genomic_address_service.classes.matrix_reader import matrix_reader
+from genomic_address_service.compression import open_input
+
+class matrix_rows_reader(matrix_reader):
+    """
+    Stream the rows of the new samples of a square distance matrix, to add them to a
+    clustering of the other samples without reading the distances between those.
+
+    The header is the square matrix header (``dists`` followed by the labels) listing
+    every sample: the samples already clustered, in any order, and the new ones. It is
+    followed by one row per new sample, in the order of their columns, so the file is
+    the bottom rows of the square matrix when the new samples come last.
+
+    Attributes
+    ----------
+    known : list of str
+        Labels of the samples already clustered.
+    labels : list of str
+        Labels of the new samples, in the order of their rows.
+    n : int
+        Number of columns (known and new samples).
+
+    Notes
+    -----
+    - Every row must hold a distance to every known and new sample. As in
+      ``matrix_reader``, the distances between new samples are taken from the upper
+      triangle (the row of the earlier sample), so those m*m values are kept in
+      memory; with ``validate`` the diagonal must be 0 and the lower triangle must
+      match them (within ``atol``/``rtol``). The distances to the known samples are
+      only read once.
+    - The values are read as float64 (``dtype`` does not apply).
+    """
+    ERROR_ROWS = ("Incorrect Distance Matrix Rows Format: the header must list every clustered sample and the new "
+                  "samples, followed by one row per new sample in the order of its column")
+
+    def __init__(self, f, known, delim="\t", validate=True, atol=0.0, rtol=0.0) -> None:
+        super().__init__(f, delim=delim, sort_matrix=False, validate=validate, atol=atol, rtol=rtol)
+        self.known = list(known)
+        self.known_columns = None
+        self.new_columns = None
+
+    def read_labels(self):
+        """
+        Read the header and find the columns of the known and new samples.
+
+        Returns
+        -------
+        list of str
+            Labels of the new samples.
+        """
+        with open_input(self.fpath) as fh:
+            self.select_columns(self.read_header(fh))
+        return self.labels
+
+    def select_columns(self, columns):
+        """
+        Split the header columns into known and new samples.
+        """
+        missing = [label for label in self.known if label not in self.column_index]
+        if len(missing) > 0:
+            raise ValueError(f'{self.ERROR_ROWS}: no column for the clustered samples {missing[:self.MAX_REPORTED_PAIRS]}')
+        known = set(self.known)
+        self.known_columns = np.array([self.column_index[label] for label in self.known], dtype=np.int64)
+        self.new_columns = np.array([i for i, label in enumerate(columns) if label not in known], dtype=np.int64)
+        self.labels = [columns[i] for i in self.new_columns]
+
+    def stream_rows(self):
+        """
+        Stream the rows of the new samples.
+
+        Yields
+        ------
+        tuple of (int, np.ndarray)
+            Index of the new sample and its distances to the known samples (in the
+            order of ``known``) followed by its distances to the new samples of the
+            previous rows.
+        """
+        self.row_number = 0
+        with open_input(self.fpath) as fh:
+            self.select_columns(self.read_header(fh))
+            known_columns = self.known_columns
+            new_columns = self.new_columns
+            m = len(new_columns)
+            new_distances = np.empty((m, m), dtype=np.float64)
+
+            for line in fh:
+                line = line.rstrip("\r\n")
+                if line == '':
+                    continue
+                tokens = line.split(self.delim)
+                k = self.row_number
+                if k >= m or len(tokens) != self.n + 1 or tokens[0] != self.labels[k]:
+                    raise ValueError(self.ERROR_ROWS)
+                values = self.parse_values(tokens[1:])
+                row = values[new_columns]
+                upper = new_distances[:k, k]
+                if self.validate:
+                    if row[k] != 0:
+                        raise ValueError(self.ERROR_FORMAT)
+                    offending = np.nonzero(np.abs(row[:k] - upper) > self.atol + self.rtol * np.abs(upper))[0]
+                    if len(offending) > 0:
+                        raise ValueError(self.format_asymmetry([(new_columns[k], new_columns[j], row[j], upper[j])
+                                                                for j in offending[:self.MAX_REPORTED_PAIRS]]))
+                new_distances[k] = row
+                self.row_number += 1
+                yield k, np.concatenate((values[known_columns], upper))
+
+        if self.row_number != m:
+            raise ValueError(self.ERROR_ROWS)
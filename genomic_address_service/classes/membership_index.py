@@ -0,0 +1,164 @@
+import numpy as np
+
+class membership_index:
+    """
+    Members of every cluster of a set of multi-level addresses, in CSR arrays.
+
+    The clusters of a level are the distinct address prefixes up to that level. Each
+    sample (a row of the addresses) has a cluster code at every level, and the rows of
+    the members of cluster c at a level are
+    ``members[level][offsets[level][c]:offsets[level][c + 1]]``, in row order. Rows
+    added with ``append`` go to a buffer of the clusters they join (new clusters
+    included), which is merged into the CSR arrays when it grows as large as them.
+
+    Attributes
+    ----------
+    num_levels : int
+        Number of levels of the addresses.
+    num_rows : int
+        Number of samples.
+    codes : np.ndarray
+        Cluster code of every sample at each level, of shape (num_rows, num_levels)
+        (rows past ``num_rows`` are unused capacity).
+    offsets : list of np.ndarray
+        Start of the members of each cluster, per level.
+    members : list of np.ndarray
+        Rows of the members of the clusters (int32), per level.
+
+    Notes
+    -----
+    - The clusters of the initial addresses are numbered in the order of their
+      prefixes and found with a binary search over them; clusters created by
+      ``append`` are numbered after them and kept in a dict.
+    - Memory is O(n * levels) integers, instead of a list of sample ids and a prefix
+      string per sample and level.
+    """
+
+    def __init__(self, addresses) -> None:
+        addresses = np.asarray(addresses, dtype=np.int64)
+        n, num_levels = addresses.shape
+        self.num_levels = num_levels
+        self.num_rows = n
+        self.codes = np.empty((n, num_levels), dtype=np.int32)
+        # (parent cluster, value) of the initial clusters, sorted, per level
+        self.parents = []
+        self.values = []
+        self.new_clusters = [{} for _ in range(num_levels)]
+        self.offsets = []
+        self.members = []
+        self.appended = [{} for _ in range(num_levels)]
+        self.num_appended = 0
+
+        parent = np.zeros(n, dtype=np.int64)
+        for level in range(num_levels):
+            # lexsort is stable: the members of a cluster stay in row order
+            order = np.lexsort((addresses[:, level], parent))
+            parents = parent[order]
+            values = addresses[order, level]
+            first = np.ones(n, dtype=bool)
+            first[1:] = (parents[1:] != parents[:-1]) | (values[1:] != values[:-1])
+            codes = np.empty(n, dtype=np.int64)
+            codes[order] = np.cumsum(first) - 1
+            self.parents.append(parents[first])
+            self.values.append(values[first])
+            self.offsets.append(np.append(np.flatnonzero(first), n).astype(np.int64))
+            self.members.append(order.astype(np.int32))
+            self.codes[:, level] = codes
+            parent = codes
+
+    def num_clusters(self, level):
+        """
+        Number of clusters at a level.
+        """
+        return len(self.parents[level]) + len(self.new_clusters[level])
+
+    def find(self, level, parent, value):
+        """
+        Code of the cluster of value ``value`` inside cluster ``parent`` of the
+        previous level (0 for the first level), or -1 if there is none.
+        """
+        parents = self.parents[level]
+        start = np.searchsorted(parents, parent, side='left')
+        end = np.searchsorted(parents, parent, side='right')
+        i = start + np.searchsorted(self.values[level][start:end], value)
+        if i < end and self.values[level][i] == value:
+            return int(i)
+        return self.new_clusters[level].get((parent, value), -1)
+
+    def lookup(self, address):
+        """
+        Codes of the clusters of an address prefix at each of its levels.
+
+        Returns
+        -------
+        list of int
+            One code per level of ``address``, cut at the first level with no cluster.
+        """
+        codes = []
+        parent = 0
+        for level, value in enumerate(address):
+            code = self.find(level, parent, int(value))
+            if code < 0:
+                break
+            codes.append(code)
+            parent = code
+        return codes
+
+    def get_members(self, level, code):
+        """
+        Rows of the members of cluster ``code`` at a level, in row order.
+        """
+        offsets = self.offsets[level]
+        if code < len(offsets) - 1:
+            members = self.members[level][offsets[code]:offsets[code + 1]]
+        else:
+            members = self.members[level][:0]
+        appended = self.appended[level].get(code)
+        if appended is not None:
+            members = np.concatenate((members, np.array(appended, dtype=np.int32)))
+        return members
+
+    def append(self, address):
+        """
+        Add a sample, creating the clusters of its address that do not exist.
+
+        Returns
+        -------
+        int
+            Row of the sample.
+        """
+        row = self.num_rows
+        if row == len(self.codes):
+            grown = np.zeros((max(2 * row, 16), self.num_levels), dtype=np.int32)
+            grown[:row] = self.codes
+            self.codes = grown
+        parent = 0
+        for level, value in enumerate(address):
+            value = int(value)
+            code = self.find(level, parent, value)
+            if code < 0:
+                code = self.num_clusters(level)
+                self.new_clusters[level][(parent, value)] = code
+            self.codes[row, level] = code
+            self.appended[level].setdefault(code, []).append(row)
+            parent = code
+        self.num_rows += 1
+        self.num_appended += 1
+        if self.num_appended >= max(row, 1024):
+            self.compact()
+        return row
+
+    def compact(self):
+        """
+        Merge the rows added by ``append`` into the CSR arrays.
+        """
+        n = self.num_rows
+        for level in range(self.num_levels):
+            codes = self.codes[:n, level]
+            self.members[level] = np.argsort(codes, kind='stable').astype(np.int32)
+            counts = np.bincount(codes, minlength=self.num_clusters(level))
+            offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self.offsets[level] = offsets
+            self.appended[level] = {}
+        self.num_appended = 0
@@ -1,7 +1,19 @@
 import numpy as np
-import pandas as pd
 import scipy
-import skbio.tree
+import io
+from genomic_address_service.classes.matrix_reader import matrix_reader
+from genomic_address_service.classes.pairwise_reader import pairwise_reader
+from genomic_address_service.classes.lower_triangle_reader import lower_triangle_reader
+from genomic_address_service.classes.matrix_rows_reader import matrix_rows_reader
+from genomic_address_service.classes.slink import slink
+from genomic_address_service.classes.nn_chain import nn_chain
+from genomic_address_service.classes.component_linkage import component_linkage
+from genomic_address_service.classes.identical_samples import identical_samples
+from genomic_address_service.classes.out_of_core_linkage import out_of_core_linkage
+from genomic_address_service.binary_matrix import is_binary_matrix, read_binary_matrix
+from genomic_address_service.linkage_file import read_linkage_file
+from genomic_address_service.utils import cut_linkage
+from genomic_address_service.newick import branch_lengths, write_newick
 
 class multi_level_clustering:
     """
@@ -15,8 +27,12 @@ class multi_level_clustering:
 
     Attributes
     ----------
+    memberships : np.ndarray
+        int32 array of shape (n, len(thresholds)); row i holds the cluster IDs of
+        ``labels[i]`` across thresholds.
     cluster_memberships : dict[str, list[str]]
-        Mapping from each label to a list of cluster IDs across thresholds.
+        Mapping from each label to a list of cluster IDs across thresholds
+        (compatibility view of ``memberships``, built on access).
     thresholds : list of float
         Distance thresholds at which the dendrogram is cut to form clusters.
     labels : list of str
@@ -24,17 +40,31 @@ class multi_level_clustering:
     linkage : np.ndarray
         The hierarchical clustering linkage matrix of shape (n-1, 4).
     newick : str
-        The Newick-formatted string representation of the tree.
+        The Newick-formatted string representation of the tree (built on access;
+        use ``write_newick`` to stream it to a file).
 
     Notes
     -----
-    - Cluster memberships are stored as strings, one per threshold.
-    - The linkage matrix is built using SciPy's `scipy.cluster.hierarchy.linkage`.
-    - Newick export relies on scikit-bio's `TreeNode`.
+    - Cluster memberships are stored as integers, one column per threshold, and are
+      only converted to strings for output.
+    - The linkage matrix is built using SciPy's `scipy.cluster.hierarchy.linkage`, or
+      optionally with the SLINK engine (single linkage; streams the matrix and keeps
+      O(n) state) or the compiled nearest-neighbour chain engine (average/complete
+      linkage; works in place on the condensed vector).
+    - With ``components``, the connected components at the largest threshold are
+      clustered independently and reassembled into one linkage matrix.
+    - With ``update``, new samples are inserted into a saved single linkage matrix
+      with SLINK, reading only their rows of the matrix.
+    - Newick export is written directly from the linkage matrix and matches the
+      output of scikit-bio's `TreeNode.from_linkage_matrix`.
     """
     VALID_TREE_DISTANCES = ['patristic', 'cophenetic']
+    VALID_ENGINES = ['scipy', 'slink', 'nnchain']
 
-    def __init__(self, dist_mat_file, thresholds, method, sort_matrix, tree_distances='patristic'):
+    def __init__(self, dist_mat_file, thresholds, method, sort_matrix, tree_distances='patristic',
+                 skip_validation=False, atol=0.0, rtol=0.0, engine='scipy', dtype='float64', threads=1,
+                 components=False, pairwise=False, lower_triangle=False, distances=None, deduplicate=False,
+                 out_of_core=False, update=None):
         """
         Initialize the clustering object.
 
@@ -51,44 +81,221 @@ class multi_level_clustering:
             If pastristic, the distances in the distance matrix correspond to the patristic distances between nodes or leaves in the tree.
             If 'cophenetic', the distances in the distance matrix correspond to the cophenetic distance (height in tree where leaves first
             share a common ancestor). For ultrametic trees this corresponds to twice the patristic distance.
+        skip_validation : bool, optional (default=False)
+            Skip the symmetry check of text matrices and the checksum check of binary matrices.
+        atol, rtol : float, optional (default=0.0)
+            Absolute and relative tolerance allowed between the upper and lower triangles.
+        engine : str, optional (default='scipy')
+            Linkage implementation: 'scipy', 'slink' (single linkage only, O(n) memory) or
+            'nnchain' (average/complete linkage, in place on the condensed vector).
+        dtype : str, optional (default='float64')
+            Storage type of the distances read from a text matrix: 'auto', 'uint16',
+            'uint32', 'float32' or 'float64'. Binary matrices keep the type they were
+            converted with.
+        threads : int, optional (default=1)
+            Number of worker processes used to parse a text matrix into the condensed
+            vector (the streaming SLINK path reads on one thread), and to cluster the
+            connected components when ``components`` is set.
+        components : bool, optional (default=False)
+            Split the samples into the connected components of the pairs at distance
+            <= max(thresholds) and cluster them independently (see ``component_linkage``).
+            Supported by the scipy and nnchain engines.
+        pairwise : bool, optional (default=False)
+            ``dist_mat_file`` is a long-format query_id/ref_id/dist file listing every
+            pair, read straight into the condensed vector (see ``pairwise_reader``).
+        lower_triangle : bool, optional (default=False)
+            ``dist_mat_file`` is a lower triangle matrix (PHYLIP or TSV, see
+            ``lower_triangle_reader``).
+        distances : tuple, optional
+            (labels, condensed vector) already read from ``dist_mat_file`` with
+            ``read_distance_matrix``, e.g. to cluster it with several methods. The file
+            is not read again and the vector is not modified (the nnchain engine works
+            on a copy and slink inserts the vector instead of streaming the file).
+        deduplicate : bool, optional (default=False)
+            Cluster only one sample of each group of identical samples (same row of
+            the matrix) and add the others back at height 0 (see ``identical_samples``),
+            when this gives the same clusters (see ``_unique_linkage``).
+            The slink engine then reads the whole condensed vector instead of streaming
+            it. Not supported with ``components``.
+        out_of_core : bool, optional (default=False)
+            Cluster a square TSV or binary matrix without holding it in memory, with
+            ``out_of_core_linkage`` (a compressed HDF5 copy of the matrix read one row
+            at a time), which gives the linkage matrix of the scipy engine; the slink
+            engine streams the rows into SLINK instead. Not supported with ``pairwise``, ``lower_triangle``, ``deduplicate`` or
+            ``distances``, nor with ``atol``/``rtol``.
+        update : str, optional
+            Linkage file (``linkage.bin``) of a previous single linkage clustering.
+            ``dist_mat_file`` then only holds the rows of the new samples (see
+            ``matrix_rows_reader``), which are added to it (see ``_update_linkage``).
+            Single linkage only; not supported with the other input options,
+            ``components``, ``deduplicate`` or ``out_of_core``.
         """
 
         #init class attributes
         self.thresholds = thresholds
         self.labels = []
         self.linkage = None
-        self.newick = None
-        self.cluster_memberships = {}
+        self.branch_lengths = None
+        self.memberships = None
 
         #perform clustering
-        self.labels, matrix = self.read_distance_matrix(dist_mat_file, sort_matrix=sort_matrix)
-        self.linkage = scipy.cluster.hierarchy.linkage(matrix, method=method, metric='precomputed')
-        self._init_membership()
+        if components and engine not in component_linkage.VALID_ENGINES:
+            raise ValueError(f'Clustering by components supports the {component_linkage.VALID_ENGINES} engines, not [{engine}]')
+        if components and deduplicate:
+            raise ValueError('Clustering by components does not support removing identical samples')
+        if out_of_core and (pairwise or lower_triangle or deduplicate or distances is not None):
+            raise ValueError('Out-of-core clustering only supports square TSV and binary matrices, without removing identical samples')
+        if out_of_core and not skip_validation and (atol != 0 or rtol != 0):
+            raise ValueError('Out-of-core clustering only supports exact symmetry checks (atol=rtol=0)')
+        if update is not None and method != 'single':
+            raise ValueError(f'Updating a clustering only supports single linkage, not [{method}]')
+        if update is not None and (pairwise or lower_triangle or components or deduplicate or out_of_core
+                                   or distances is not None):
+            raise ValueError('Updating a clustering only supports the rows of the new samples of a square TSV matrix')
+        if distances is not None:
+            self.labels, matrix = list(distances[0]), distances[1]
+        elif deduplicate:
+            self.labels, matrix = self.read_distance_matrix(dist_mat_file, sort_matrix=sort_matrix,
+                                                            validate=not skip_validation, atol=atol, rtol=rtol, dtype=dtype,
+                                                            threads=threads, pairwise=pairwise,
+                                                            lower_triangle=lower_triangle)
+        if update is not None:
+            self.labels, self.linkage = self._update_linkage(update, dist_mat_file, sort_matrix=sort_matrix,
+                                                             validate=not skip_validation, atol=atol, rtol=rtol)
+        elif deduplicate:
+            if engine not in self.VALID_ENGINES:
+                raise ValueError(f'Invalid engine [{engine}]. Must be one of {self.VALID_ENGINES}')
+            if engine == 'slink' and method != 'single':
+                raise ValueError(f'The slink engine only supports single linkage, not [{method}]')
+            self.linkage = self._unique_linkage(matrix, method, engine)
+        elif out_of_core and engine == 'slink':
+            if method != 'single':
+                raise ValueError(f'The slink engine only supports single linkage, not [{method}]')
+            # SLINK streams the rows with O(n) memory
+            self.labels, self.linkage = self._slink_linkage(dist_mat_file, sort_matrix=sort_matrix,
+                                                            validate=not skip_validation, dtype=dtype)
+        elif out_of_core:
+            if engine not in self.VALID_ENGINES:
+                raise ValueError(f'Invalid engine [{engine}]. Must be one of {self.VALID_ENGINES}')
+            if engine == 'nnchain':
+                # validates the method against the engine
+                nn_chain(method)
+            linkage_engine = out_of_core_linkage(method)
+            self.labels, self.linkage = linkage_engine.cluster_file(dist_mat_file, sort_matrix=sort_matrix,
+                                                                    validate=not skip_validation, dtype=dtype)
+        elif components:
+            linkage_engine = component_linkage(method, max(thresholds), engine=engine, processes=threads)
+            if distances is None:
+                self.labels, matrix = self.read_distance_matrix(dist_mat_file, sort_matrix=sort_matrix,
+                                                                validate=not skip_validation, atol=atol, rtol=rtol, dtype=dtype,
+                                                                threads=threads, pairwise=pairwise,
+                                                                lower_triangle=lower_triangle)
+            self.linkage = linkage_engine.get_linkage(matrix, len(self.labels))
+        elif engine == 'slink':
+            if method != 'single':
+                raise ValueError(f'The slink engine only supports single linkage, not [{method}]')
+            if distances is None:
+                self.labels, self.linkage = self._slink_linkage(dist_mat_file, sort_matrix=sort_matrix,
+                                                                validate=not skip_validation, atol=atol, rtol=rtol, dtype=dtype,
+                                                                threads=threads, pairwise=pairwise,
+                                                                lower_triangle=lower_triangle)
+            else:
+                linkage_engine = slink(len(self.labels))
+                linkage_engine.insert_condensed(matrix)
+                self.linkage = linkage_engine.get_linkage()
+        elif engine == 'scipy':
+            if distances is None:
+                self.labels, matrix = self.read_distance_matrix(dist_mat_file, sort_matrix=sort_matrix,
+                                                                validate=not skip_validation, atol=atol, rtol=rtol, dtype=dtype,
+                                                                threads=threads, pairwise=pairwise,
+                                                                lower_triangle=lower_triangle)
+            # scipy works on float64; convert first so that a narrower vector is released before its own copies
+            matrix = np.asarray(matrix, dtype=np.float64)
+            self.linkage = scipy.cluster.hierarchy.linkage(matrix, method=method, metric='precomputed')
+        elif engine == 'nnchain':
+            linkage_engine = nn_chain(method)
+            if distances is None:
+                self.labels, matrix = self.read_distance_matrix(dist_mat_file, sort_matrix=sort_matrix,
+                                                                validate=not skip_validation, atol=atol, rtol=rtol, dtype=dtype,
+                                                                threads=threads, pairwise=pairwise,
+                                                                lower_triangle=lower_triangle)
+            # the vector read from a text matrix is ours to overwrite; a read-only memory map is copied
+            self.linkage = linkage_engine.get_linkage(matrix, len(self.labels), overwrite=distances is None)
+        else:
+            raise ValueError(f'Invalid engine [{engine}]. Must be one of {self.VALID_ENGINES}')
         self._assign_clusters()
         self._linkage_to_newick(tree_distances=tree_distances)
 
-    def _init_membership(self):
+    def _unique_linkage(self, matrix, method, engine):
         """
-        Initialize the cluster membership dictionary.
+        Linkage matrix of all the samples from the clustering of one sample of each
+        group of identical samples.
 
-        For each label in `self.labels`, create an empty list to store
-        its cluster IDs across thresholds.
+        Notes
+        -----
+        - The unique samples are only clustered when this gives the clusters of a run
+          on all the samples (see ``identical_samples.preserves_clusters``): always for
+          single linkage, for complete linkage when the only distances of 0 are between
+          identical samples, never for average linkage. Otherwise all the samples are
+          clustered.
+        - ``matrix`` is not modified.
         """
-        self.cluster_memberships = {}
-
-        for label in self.labels:
-            self.cluster_memberships[label] = []
+        samples = identical_samples(matrix, len(self.labels))
+        reduced = samples.get_condensed(matrix)
+        if not samples.preserves_clusters(method, reduced):
+            return self._condensed_linkage(matrix, len(self.labels), method, engine, overwrite=False)
+        k = len(samples.unique)
+        if k < 2:
+            Z = np.empty((0, 4))
+        else:
+            Z = self._condensed_linkage(reduced, k, method, engine)
+        return samples.expand_linkage(Z)
 
-    def read_distance_matrix(self,file_path, delim="\t", sort_matrix=False):
+    @staticmethod
+    def _condensed_linkage(condensed, n, method, engine, overwrite=True):
+        """
+        Linkage matrix of a condensed vector with the given engine; the nnchain engine
+        works in place unless ``overwrite`` is False.
+        """
+        if engine == 'nnchain':
+            return nn_chain(method).get_linkage(condensed, n, overwrite=overwrite)
+        if engine == 'slink':
+            linkage_engine = slink(n)
+            linkage_engine.insert_condensed(condensed)
+            return linkage_engine.get_linkage()
+        return scipy.cluster.hierarchy.linkage(np.asarray(condensed, dtype=np.float64), method=method, metric='precomputed')
+
+    @staticmethod
+    def read_distance_matrix(file_path, delim="\t", sort_matrix=False, validate=True, atol=0.0, rtol=0.0, dtype='float64',
+                             threads=1, pairwise=False, lower_triangle=False, allocate=None):
         """
         Read a precomputed distance matrix from file.
 
         Parameters
         ----------
         file_path : str
-            Path to the distance matrix file.
+            Path to the distance matrix file (TSV or binary from ``gas convert``).
         delim : str, optional (default="\\t")
             Delimiter used in the file (default: tab).
+        sort_matrix : bool, optional (default=False)
+            Order the samples by label instead of by their position in the file.
+        validate : bool, optional (default=True)
+            Check the symmetry of text matrices and the checksum of binary matrices.
+        atol, rtol : float, optional (default=0.0)
+            Absolute and relative tolerance allowed between the upper and lower triangles.
+        dtype : str, optional (default='float64')
+            Storage type of the condensed vector of a text matrix (see ``matrix_reader``).
+        threads : int, optional (default=1)
+            Number of worker processes parsing a text matrix (see ``matrix_reader``).
+        pairwise : bool, optional (default=False)
+            The file is in long format (query_id, ref_id, dist) instead of a square
+            matrix (see ``pairwise_reader``, which reads on one thread).
+        lower_triangle : bool, optional (default=False)
+            The file holds the lower triangle of the matrix (see ``lower_triangle_reader``,
+            which reads on one thread).
+        allocate : callable, optional
+            Allocator of the condensed vector of a text matrix (see ``matrix_reader.read_data``);
+            binary matrices are returned as their memory map.
 
         Returns
         -------
@@ -101,71 +308,143 @@ class multi_level_clustering:
         -----
         - The function assumes the first line is a header and skips it.
         - Each subsequent line should start with a label followed by distances.
-        - Distances are extracted row by row, omitting redundant lower-triangle entries.
-        """
-        labels: list[str] = []
-        values: list[float] = []
-
-        # Read the distance matrix into a DataFrame
-        df = pd.read_csv(file_path, header=0, sep=delim, low_memory=False, dtype=str)
-
-        # There's a bug in some versions of pandas with the read_csv function.
-        # If you attempt pd.read_csv(dtype=str, index_col=0),
-        # then pandas will not cast the index to the specified type (str).
-        # We work around this by not loading an index, and then reshaping the
-        # DataFrame to have the index we want, which will be in str format.
-        index = df.iloc[:, 0]
-        df = df.iloc[:, 1:]
-        df = df.set_index(index)
-        # Convert all values to float, raising an error if conversion fails
-        try:
-            df = df.astype(float)
-        except ValueError as e:
-            raise ValueError("Input matrix should only contain numerical values") from e
-
-        # Check that there are no NaN values in the distance matrix
-        if np.isnan(df.values).any():
-            raise ValueError("Distance matrix contains NaN, null or NA values.")
-        # Check that the distance matrix is square and rows/columns match
-        if not df.index.equals(df.columns):
-            raise ValueError("Incorrect Distance Matrix Format: --matrix must have (n x n) dimensions, 0 diagonal starting at position [0,0] and rows/columns must in the same order.")
-        if sort_matrix:
-            df = df.sort_index(ascending=True)
-            df = df.sort_index(axis=1, ascending=True)
+        - Rows are streamed by ``matrix_reader`` straight into a preallocated
+          condensed vector; the full square matrix is never held in memory.
+        - Binary matrices are memory-mapped read-only and returned without a copy.
+        """
+        if pairwise:
+            reader = pairwise_reader(file_path, delim=delim, sort_matrix=sort_matrix, validate=validate, atol=atol, rtol=rtol,
+                                     dtype=dtype)
+            return reader.read_data(allocate)
+
+        if lower_triangle:
+            reader = lower_triangle_reader(file_path, delim=delim, sort_matrix=sort_matrix, validate=validate, dtype=dtype)
+            return reader.read_data(allocate)
 
-        # Split matrix into lower and upper triangular matrices
-        upper_mask = np.triu(np.ones_like(df, dtype=bool))
-        lower_mask = np.tril(np.ones_like(df, dtype=bool))
-        
-        lower_tri = df.mask(upper_mask) # Mask upper triangle
-        upper_tri = df.mask(lower_mask) # Mask lower triangle
+        if is_binary_matrix(file_path):
+            return read_binary_matrix(file_path, verify=validate, sort_matrix=sort_matrix)
 
-        one_dim_tri_lower = lower_tri.values.flatten(order='F') # Reads elements column-wise
-        one_dim_tri_upper = upper_tri.values.flatten(order='C') # Reads elements row-wise
+        reader = matrix_reader(file_path, delim=delim, sort_matrix=sort_matrix, validate=validate, atol=atol, rtol=rtol,
+                               dtype=dtype, threads=threads)
+        return reader.read_data(allocate)
 
-        lower_array = one_dim_tri_lower[~np.isnan(one_dim_tri_lower)]
-        upper_array = one_dim_tri_upper[~np.isnan(one_dim_tri_upper)]
+    def _slink_linkage(self, file_path, delim="\t", sort_matrix=False, validate=True, atol=0.0, rtol=0.0, dtype='float64',
+                       threads=1, pairwise=False, lower_triangle=False):
+        """
+        Build a single linkage matrix with SLINK without holding the distance matrix in memory.
 
-        # Validate symmetry of distance matrix values. Upper and lower triangles must match.
-        if not np.array_equal(lower_array, upper_array):
-            raise ValueError("Distance matrix has non-symmetrical values")
+        Parameters
+        ----------
+        See ``read_distance_matrix``.
 
-        # Extract non-NaN values from one triangle (lower)
-        values.extend(lower_array)
-        labels.extend(df.index.tolist())
-        
-        return (labels, np.array(values))
+        Returns
+        -------
+        labels : list of str
+            Observation labels in the order used by the linkage matrix.
+        np.ndarray
+            Linkage matrix of shape (n-1, 4).
+
+        Notes
+        -----
+        - Text matrices are streamed row by row; each row contributes its distances
+          to the previous rows. Symmetry is checked with per-column hashes, so an
+          exact check needs O(n) memory. A check with ``atol``/``rtol`` needs the
+          upper triangle, so in that case the condensed vector is read first, as it
+          is for long-format (``pairwise``) and ``lower_triangle`` files.
+        - Binary matrices are traversed in place through the memory map, and
+          ``sort_matrix`` is applied as a relabelling instead of a sorted copy.
+        - The linkage matrix does not depend on which of these paths is taken (see
+          ``slink``), so a text matrix and its binary form give the same cluster IDs.
+        """
+        if is_binary_matrix(file_path):
+            labels, condensed = read_binary_matrix(file_path, verify=validate)
+            ids = None
+            if sort_matrix:
+                order = sorted(range(len(labels)), key=labels.__getitem__)
+                ids = np.empty(len(labels), dtype=np.int64)
+                ids[order] = np.arange(len(labels), dtype=np.int64)
+                labels = [labels[i] for i in order]
+            engine = slink(len(labels))
+            engine.insert_condensed(condensed, ids=ids)
+            return labels, engine.get_linkage()
+
+        if pairwise or lower_triangle or (validate and (atol != 0 or rtol != 0)):
+            labels, condensed = self.read_distance_matrix(file_path, delim=delim, sort_matrix=sort_matrix,
+                                                          validate=validate, atol=atol, rtol=rtol, dtype=dtype,
+                                                          threads=threads, pairwise=pairwise,
+                                                          lower_triangle=lower_triangle)
+            engine = slink(len(labels))
+            engine.insert_condensed(condensed)
+            return labels, engine.get_linkage()
+
+        reader = matrix_reader(file_path, delim=delim, sort_matrix=sort_matrix, validate=validate)
+        engine = None
+        for i, distances in reader.stream_lower():
+            if engine is None:
+                engine = slink(reader.n)
+            engine.insert(i if reader.rank is None else reader.rank[i], distances)
+        if engine is None:
+            engine = slink(reader.n)
+        return reader.labels, engine.get_linkage()
+
+    @staticmethod
+    def _update_linkage(linkage_file, file_path, delim="\t", sort_matrix=False, validate=True, atol=0.0, rtol=0.0):
+        """
+        Add new samples to a saved single linkage matrix.
+
+        Parameters
+        ----------
+        linkage_file : str
+            Linkage file of a single linkage clustering (``linkage.bin``).
+        file_path : str
+            Rows of the new samples of the distance matrix (see ``matrix_rows_reader``).
+        delim, validate, atol, rtol
+            See ``read_distance_matrix``; ``validate`` also checks the linkage file checksum.
+        sort_matrix : bool, optional (default=False)
+            Order all of the samples by label; otherwise the new samples follow the
+            saved ones, in the order of their rows.
+
+        Returns
+        -------
+        labels : list of str
+            Observation labels in the order used by the linkage matrix.
+        np.ndarray
+            Linkage matrix of shape (n-1, 4).
 
+        Notes
+        -----
+        - A single linkage matrix holds everything SLINK needs to insert more samples
+          (its pointer representation, see ``slink.from_linkage``), so each new sample
+          costs O(n) with its row of distances, and the distances between the saved
+          samples are never read: O(new x n) time instead of O(n²).
+        - The result is the linkage matrix of the slink engine on the whole matrix
+          (with the saved samples first, or sorted), so the clusters are those of a
+          full run. A saved matrix from another engine can order tied merges
+          differently, so cluster IDs can change where distances are tied.
+        """
+        known, Z, header = read_linkage_file(linkage_file, verify=validate)
+        if header['method'] != 'single':
+            raise ValueError(f'{linkage_file} holds a {header["method"]} linkage; only single linkage can be updated')
+        reader = matrix_rows_reader(file_path, known, delim=delim, validate=validate, atol=atol, rtol=rtol)
+        labels = known + reader.read_labels()
+        n = len(labels)
+        ids = np.arange(n, dtype=np.int64)
+        if sort_matrix:
+            order = sorted(range(n), key=labels.__getitem__)
+            ids[order] = np.arange(n, dtype=np.int64)
+            labels = [labels[i] for i in order]
+        engine = slink.from_linkage(Z, n, ids=ids[:len(known)])
+        for k, distances in reader.stream_rows():
+            engine.insert(ids[len(known) + k], distances)
+        return labels, engine.get_linkage()
 
     def _assign_clusters(self):
         """
         Assign cluster memberships for each threshold distance.
 
-        For each threshold in ``self.thresholds``, this method applies 
-        hierarchical clustering (using SciPy's ``fcluster``) to the stored 
-        linkage matrix. Each label in ``self.labels`` is assigned a cluster 
-        identifier at that threshold, and the result is appended to 
-        ``self.cluster_memberships``.
+        The linkage matrix is cut at all of the thresholds in a single depth-first
+        pass (``cut_linkage``), which numbers the clusters exactly like SciPy's
+        ``fcluster`` with ``criterion="distance"``.
 
         Attributes Used
         ---------------
@@ -173,33 +452,18 @@ class multi_level_clustering:
             The hierarchical clustering linkage matrix (n-1, 4).
         self.thresholds : list of float
             A sequence of distance thresholds at which to cut the dendrogram.
-        self.labels : list of str
-            Labels corresponding to the original observations (tip labels).
-        self.cluster_memberships : dict[str, list[str]]
-            A mapping of labels to a list of cluster IDs. After execution, 
-            each list will contain one entry per threshold.
 
-        Notes
-        -----
-        - Cluster IDs are integers as returned by ``scipy.cluster.hierarchy.fcluster``.
-        - Memberships are stored as strings (converted with ``f'{clusters[cid]}'``).
-        - The order of assignments in ``self.cluster_memberships`` corresponds 
-        to the order of ``self.thresholds``.
-        """
-        for dist in self.thresholds:
-            clusters = scipy.cluster.hierarchy.fcluster(
-                self.linkage, dist, criterion="distance"
-            )
-            for label, cluster_id in zip(self.labels, clusters):
-                self.cluster_memberships[label].append(str(cluster_id))
+        Attributes Updated
+        ------------------
+        self.memberships : np.ndarray
+            int32 array of shape (n, len(thresholds)); column j holds the cluster IDs
+            at ``self.thresholds[j]``.
+        """
+        self.memberships = cut_linkage(self.linkage, np.asarray(self.thresholds, dtype=np.float64))
 
     def _linkage_to_newick(self, tree_distances):
         """
-        Convert a SciPy linkage matrix into a Newick-formatted tree string.
-
-        This function optionally rescales the distance (cophenetic) values in the
-        linkage matrix before building a tree. The tree is constructed using
-        scikit-bio's `TreeNode.from_linkage_matrix` and then exported as a Newick string.
+        Compute the branch lengths of the Newick tree of the linkage matrix.
 
         Parameters
         ----------
@@ -208,42 +472,69 @@ class multi_level_clustering:
             If pastristic, the distances in the distance matrix correspond to the patristic distances between nodes or leaves in the tree.
             If 'cophenetic', the distances in the distance matrix correspond to the cophenetic distance (height in tree where leaves first
             share a common ancestor). For ultrametic trees this corresponds to twice the patristic distance 
-            (hence we multiply distances values (third column) in the linkage matrix by 2).
+            (hence the distances (third column) of the linkage matrix are multiplied by 2, on a copy).
 
         Attributes Updated
         ------------------
-        self.newick : str
-            The Newick-formatted string representation of the hierarchical tree.
+        self.branch_lengths : np.ndarray
+            Branch length above each node of the tree, indexed like the linkage matrix nodes.
 
         Notes
         -----
-        - The function assumes `self.linkage` is a valid SciPy linkage matrix of
-        shape (n-1, 4).
-        - The tip labels are taken from `self.labels`.
-        - Single quotes in the Newick string are removed for consistency.
-        """
-        lmat = None
-        if tree_distances == 'patristic':
-            lmat = self.linkage
-        elif tree_distances == 'cophenetic':
-            lmat = self.linkage
-            for i in range(lmat.shape[0]):
-                lmat[i, 2] *= 2
-        else:
+        - ``self.linkage`` is not modified.
+        - The tree itself is only written by ``write_newick`` (or the ``newick`` property).
+        """
+        if not tree_distances in self.VALID_TREE_DISTANCES:
             raise Exception(f'Invalid tree_distances value [{tree_distances}]. Must be one of {self.VALID_TREE_DISTANCES}')
-        
-        skb_tree = skbio.tree.TreeNode.from_linkage_matrix(lmat, id_list=self.labels)
-        self.newick = str(skb_tree).strip().replace("'", "")
+
+        self.branch_lengths = branch_lengths(self.linkage, tree_distances=tree_distances)
+
+    def write_newick(self, fh):
+        """
+        Write the tree in Newick format to a text stream.
+
+        Parameters
+        ----------
+        fh : file object
+            Output stream; the tree is written up to and including the final ';'.
+
+        Notes
+        -----
+        - The tip labels are taken from `self.labels`.
+        - Single quotes in labels are removed for consistency.
+        """
+        write_newick(fh, self.linkage, self.labels, self.branch_lengths)
+
+    @property
+    def newick(self):
+        """
+        The Newick-formatted string representation of the hierarchical tree.
+        """
+        if self.branch_lengths is None:
+            return None
+        fh = io.StringIO()
+        self.write_newick(fh)
+        return fh.getvalue()
+
+    @property
+    def cluster_memberships(self):
+        """
+        Cluster memberships as a mapping from each label to its list of cluster IDs
+        (as strings) across thresholds. Kept for compatibility; ``get_memberships``
+        returns the integer array without any conversion.
+        """
+        if self.memberships is None:
+            return {}
+        return {label: [str(x) for x in row] for label, row in zip(self.labels, self.memberships.tolist())}
 
     def get_memberships(self):
         """
-        Get the cluster membership mapping.
+        Get the cluster memberships.
 
         Returns
         -------
-        dict[str, list[str]]
-            Dictionary mapping each label to a list of cluster IDs
-            across thresholds.
+        np.ndarray
+            int32 array of shape (n, len(thresholds)); row i holds the cluster IDs of
+            ``self.labels[i]`` across thresholds.
         """
-        return self.cluster_memberships 
-
+        return self.memberships
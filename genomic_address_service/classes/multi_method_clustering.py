@@ -0,0 +1,123 @@
+import mmap
+import multiprocessing
+import os
+import numpy as np
+from genomic_address_service.classes.matrix_reader import create_shared_file
+from genomic_address_service.classes.multi_level_clustering import multi_level_clustering
+from genomic_address_service.utils import condensed_size
+
+def _cluster_method(task):
+    """
+    Cluster the shared condensed vector, described by (file name, dtype, offset,
+    length), with one method in a worker process.
+    """
+    method, labels, buffer, options = task
+    filename, dtype, offset, size = buffer
+    if size == 0:
+        condensed = np.empty(0, dtype=dtype)
+    else:
+        condensed = np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=(size,))
+    return multi_level_clustering(None, method=method, distances=(labels, condensed), **options)
+
+class multi_method_clustering:
+    """
+    Cluster one distance matrix with several linkage methods.
+
+    The matrix is read (and validated) once into a condensed vector, which every
+    method then clusters without modifying it. With ``threads`` > 1 the methods run
+    in a pool of worker processes that map the vector read-only: a text matrix is
+    read straight into a temporary file in shared memory (see
+    ``matrix_reader.create_shared_file``) and a binary matrix is shared through its
+    own memory map.
+
+    Attributes
+    ----------
+    methods : list of str
+        Linkage methods, in the order given.
+    thresholds : list of float
+        Distance thresholds at which the dendrograms are cut.
+    labels : list of str
+        Sample labels, shared by every method.
+    results : dict[str, multi_level_clustering]
+        Clustering of each method (memberships, linkage and tree).
+
+    Notes
+    -----
+    - Each method still makes its own working copy where its engine needs one
+      (scipy clusters a float64 copy, nnchain copies the vector, slink inserts it
+      into O(n) state), so the processes running at once each hold one.
+    - The ``threads`` are split between the methods running at the same time, for
+      the nnchain engine and for ``components``.
+    """
+    SHARED_MEMORY_DIR = '/dev/shm'
+
+    def __init__(self, dist_mat_file, thresholds, methods, sort_matrix, tree_distances='patristic',
+                 skip_validation=False, atol=0.0, rtol=0.0, engine='scipy', dtype='float64', threads=1,
+                 components=False, pairwise=False, lower_triangle=False, deduplicate=False):
+        self.methods = list(methods)
+        self.thresholds = thresholds
+        self.results = {}
+        self.shared_files = []
+        processes = max(1, min(threads, len(self.methods)))
+        options = {'thresholds': thresholds, 'sort_matrix': sort_matrix, 'tree_distances': tree_distances,
+                   'engine': engine, 'threads': max(1, threads // processes), 'components': components,
+                   'deduplicate': deduplicate}
+
+        try:
+            self.labels, condensed = multi_level_clustering.read_distance_matrix(
+                dist_mat_file, sort_matrix=sort_matrix, validate=not skip_validation, atol=atol, rtol=rtol,
+                dtype=dtype, threads=threads, pairwise=pairwise, lower_triangle=lower_triangle,
+                allocate=self.allocate_shared if processes > 1 else None)
+
+            if processes == 1:
+                for method in self.methods:
+                    self.results[method] = multi_level_clustering(dist_mat_file, method=method,
+                                                                  distances=(self.labels, condensed), **options)
+            else:
+                buffer = self.share(condensed)
+                tasks = [(method, self.labels, buffer, options) for method in self.methods]
+                # spawned, not forked: forking while numba's thread pool runs can deadlock
+                with multiprocessing.get_context('spawn').Pool(processes) as pool:
+                    for method, result in zip(self.methods, pool.map(_cluster_method, tasks)):
+                        self.results[method] = result
+        finally:
+            # the memory maps stay valid once their files are removed
+            for filename in self.shared_files:
+                os.remove(filename)
+            self.shared_files = []
+
+    def allocate_shared(self, labels, dtype):
+        """
+        Allocate the condensed vector in a temporary file that the workers can map.
+        """
+        condensed = create_shared_file(condensed_size(len(labels)), dtype, self.SHARED_MEMORY_DIR)
+        if isinstance(condensed, np.memmap):
+            self.shared_files.append(condensed.filename)
+        return condensed
+
+    def share(self, condensed):
+        """
+        Describe the condensed vector as (file name, dtype, offset, length) for the
+        workers, copying it to a temporary file unless it is already a memory map of
+        a whole file region (a binary matrix, or a vector from ``allocate_shared``).
+        """
+        if len(condensed) == 0:
+            return None, condensed.dtype.str, 0, 0
+        if not (isinstance(condensed, np.memmap) and isinstance(condensed.base, mmap.mmap)):
+            shared = self.allocate_shared(self.labels, condensed.dtype)
+            shared[:] = condensed
+            condensed = shared
+        condensed.flush()
+        return condensed.filename, condensed.dtype.str, condensed.offset, len(condensed)
+
+    def get_memberships(self, method):
+        """
+        Get the cluster memberships of a method.
+
+        Returns
+        -------
+        np.ndarray
+            int32 array of shape (n, len(thresholds)); row i holds the cluster IDs of
+            ``self.labels[i]`` across thresholds.
+        """
+        return self.results[method].get_memberships()
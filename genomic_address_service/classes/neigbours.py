@@ -1,6 +1,8 @@
 import os
 from numba import jit
 from numba.typed import List
+from genomic_address_service.compression import open_input
+from genomic_address_service.utils import get_file_length
 
 class neighbours:
     file_path = None
@@ -59,7 +61,7 @@ class neighbours:
         }
 
     def get_file_length(self):
-        return int(os.popen(f'wc -l {self.file_path}').read().split()[0])
+        return get_file_length(self.file_path)
 
     def init_nearest_neighbor(self,samples):
         for sample_id in samples:
@@ -70,7 +72,7 @@ class neighbours:
 
     def parse_square_distance_matrix(self):
         t = self.threshhold
-        with open(self.file_path, 'r') as f:
+        with open_input(self.file_path) as f:
             samples = list(next(f).rstrip().split(self.delim)[1:])
             self.init_nearest_neighbor(samples)
             for line in f:
@@ -111,7 +113,7 @@ class neighbours:
 
     def parse_ltriangle_distance_matrix(self):
         t = self.threshhold
-        with open(self.file_path, 'r') as f:
+        with open_input(self.file_path) as f:
             for line in f:
                 line_split = line.strip().split(self.delim)
                 label = line_split[0]
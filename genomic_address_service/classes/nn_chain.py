@@ -0,0 +1,164 @@
+import numpy as np
+from numba import njit, prange
+from genomic_address_service.utils import label_linkage
+
+METHOD_AVERAGE = 0
+METHOD_COMPLETE = 1
+
+@njit(cache=True, inline='always')
+def _index(n, i, j):
+    if i > j:
+        i, j = j, i
+    return n * i - (i * (i + 1)) // 2 + (j - i - 1)
+
+@njit(cache=True, inline='always')
+def _new_distance(method, d_xi, d_yi, nx, ny):
+    if method == METHOD_COMPLETE:
+        return max(d_xi, d_yi)
+    return (nx * d_xi + ny * d_yi) / (nx + ny)
+
+@njit(cache=True)
+def _all_finite(D):
+    for i in range(len(D)):
+        if not np.isfinite(D[i]):
+            return False
+    return True
+
+@njit(cache=True, parallel=True)
+def _nn_chain(D, size, n, method):
+    """
+    Nearest-neighbour chain algorithm, following ``scipy.cluster.hierarchy``'s
+    ``nn_chain`` step by step (same tie-breaking) so that the result is identical.
+
+    ``D`` is the condensed distance vector and is overwritten; ``size`` holds the
+    initial cluster sizes. Returns the unsorted merges (x, y, distance, size).
+    """
+    Z = np.empty((n - 1, 4), dtype=np.float64)
+    chain = np.empty(n, dtype=np.int64)
+    chain_length = 0
+    y = 0
+    for k in range(n - 1):
+        if chain_length == 0:
+            chain_length = 1
+            for i in range(n):
+                if size[i] > 0:
+                    chain[0] = i
+                    break
+
+        # follow the chain of nearest neighbours until two mutual neighbours are found
+        while True:
+            x = chain[chain_length - 1]
+            # prefer the previous element of the chain to avoid cycles on ties
+            if chain_length > 1:
+                y = chain[chain_length - 2]
+                current_min = np.float64(D[_index(n, x, y)])
+            else:
+                current_min = np.inf
+            for i in range(n):
+                if size[i] == 0 or x == i:
+                    continue
+                dist = np.float64(D[_index(n, x, i)])
+                if dist < current_min:
+                    current_min = dist
+                    y = i
+            if chain_length > 1 and y == chain[chain_length - 2]:
+                break
+            chain[chain_length] = y
+            chain_length += 1
+
+        chain_length -= 2
+        if x > y:
+            x, y = y, x
+        nx = size[x]
+        ny = size[y]
+        Z[k, 0] = x
+        Z[k, 1] = y
+        Z[k, 2] = current_min
+        Z[k, 3] = nx + ny
+        size[x] = 0
+        size[y] = nx + ny
+        # Lance-Williams update of the distances to the new cluster, stored in slot y
+        for p in prange(n):
+            i = np.int64(p)
+            if size[i] == 0 or i == y:
+                continue
+            D[_index(n, i, y)] = _new_distance(method, D[_index(n, i, x)], D[_index(n, i, y)], nx, ny)
+    return Z
+
+class nn_chain:
+    """
+    Average and complete linkage with the nearest-neighbour chain algorithm.
+
+    The algorithm works directly on the condensed distance vector, which is
+    overwritten unless a copy is requested, so no float64 working copy of the
+    matrix is made. float32 vectors are processed as float32. The linkage matrix is
+    identical to ``scipy.cluster.hierarchy.linkage`` for float64 input, including
+    the handling of tied distances.
+
+    Attributes
+    ----------
+    method : str
+        Linkage method, 'average' or 'complete'.
+
+    Notes
+    -----
+    - Complete linkage also runs in place on uint16/uint32 vectors.
+    - With float32 input, complete linkage is still identical to SciPy's (distances
+      are only compared and copied). Average linkage stores the updated distances
+      as float32, so merge heights can differ from SciPy's in the last bits.
+    - The distance updates after each merge run on multiple threads (numba's thread
+      pool, see ``NUMBA_NUM_THREADS``).
+    """
+    VALID_METHODS = {'average': METHOD_AVERAGE, 'complete': METHOD_COMPLETE}
+    VALID_DTYPES = [np.float32, np.float64]
+    # complete linkage only compares and copies distances, so integers can be used in place
+    COMPLETE_DTYPES = [np.uint16, np.uint32, np.float32, np.float64]
+
+    def __init__(self, method) -> None:
+        if method not in self.VALID_METHODS:
+            raise ValueError(f'The nnchain engine only supports {list(self.VALID_METHODS)} linkage, not [{method}]')
+        self.method = method
+
+    def get_linkage(self, condensed, n, overwrite=True, sizes=None):
+        """
+        Cluster a condensed distance vector.
+
+        Parameters
+        ----------
+        condensed : np.ndarray
+            Condensed (upper triangle, row-major) float32 or float64 distance vector
+            (uint16 and uint32 are also used in place for complete linkage; other
+            types are converted to a float64 copy).
+        n : int
+            Number of samples.
+        overwrite : bool, optional (default=True)
+            Use ``condensed`` as the working memory. When False (or when the vector is
+            read-only or of another type) a copy is made.
+        sizes : np.ndarray, optional
+            Number of samples in each of the n items, when they are clusters rather
+            than single samples (average linkage weights the distance updates by
+            them). Defaults to ones.
+
+        Returns
+        -------
+        np.ndarray
+            Linkage matrix of shape (n-1, 4).
+        """
+        if len(condensed) != n * (n - 1) // 2:
+            raise ValueError(f'condensed distance vector has {len(condensed)} values, expected {n * (n - 1) // 2}')
+        if n < 2:
+            raise ValueError('at least two samples are required for clustering')
+        D = np.asarray(condensed)
+        valid_dtypes = self.COMPLETE_DTYPES if self.method == 'complete' else self.VALID_DTYPES
+        if D.dtype not in valid_dtypes:
+            D = D.astype(np.float64)
+        elif not overwrite or not D.flags.writeable:
+            D = D.copy()
+        if not _all_finite(D):
+            raise ValueError('The condensed distance matrix must contain only finite values.')
+
+        size = np.ones(n, dtype=np.int64) if sizes is None else np.array(sizes, dtype=np.int64)
+        Z = _nn_chain(D, size, n, self.VALID_METHODS[self.method])
+        Z = Z[np.argsort(Z[:, 2], kind='mergesort')]
+        label_linkage(Z, n)
+        return Z
@@ -0,0 +1,321 @@
+import os
+import tempfile
+import numpy as np
+import tables
+from numba import njit
+from genomic_address_service.classes.matrix_reader import matrix_reader
+from genomic_address_service.binary_matrix import is_binary_matrix, read_binary_matrix
+from genomic_address_service.utils import condensed_index, fits_dtype, label_linkage
+
+METHOD_AVERAGE = 0
+METHOD_COMPLETE = 1
+METHOD_SINGLE = 2
+
+@njit(cache=True)
+def _all_finite(row):
+    for i in range(len(row)):
+        if not np.isfinite(row[i]):
+            return False
+    return True
+
+@njit(cache=True)
+def _prim_step(row, x, merged, D):
+    """
+    One step of SciPy's ``mst_single_linkage`` (Prim's algorithm from sample 0): add
+    sample x, whose distances are ``row``, and return the unmerged sample nearest to
+    the merged ones (the first one on ties) and its distance.
+    """
+    merged[x] = 1
+    current_min = np.inf
+    y = -1
+    for i in range(len(D)):
+        if merged[i] == 1:
+            continue
+        if D[i] > row[i]:
+            D[i] = row[i]
+        if D[i] < current_min:
+            current_min = D[i]
+            y = i
+    return y, current_min
+
+@njit(cache=True)
+def _replay(row, merges, start, end, method):
+    """
+    Apply the Lance-Williams updates of the merges [start, end) (rows of x, y, size of
+    x, size of y) to the stored distances of a cluster, as ``nn_chain._nn_chain``
+    applies them to the condensed vector.
+    """
+    for k in range(start, end):
+        x = merges[k, 0]
+        y = merges[k, 1]
+        if method == METHOD_COMPLETE:
+            row[y] = max(row[x], row[y])
+        else:
+            row[y] = (merges[k, 2] * row[x] + merges[k, 3] * row[y]) / (merges[k, 2] + merges[k, 3])
+
+@njit(cache=True)
+def _nearest(row, size, x, y, current_min):
+    """
+    Nearest active cluster to x, keeping y (the previous element of the chain) on ties.
+    """
+    for i in range(len(size)):
+        if size[i] == 0 or x == i:
+            continue
+        if row[i] < current_min:
+            current_min = row[i]
+            y = i
+    return y, current_min
+
+@njit(cache=True)
+def _merge_rows(row_x, row_y, nx, ny, method):
+    """
+    Distances of the cluster merged from x and y (of sizes nx and ny) to the other
+    clusters, written into ``row_y``.
+    """
+    for i in range(len(row_y)):
+        if method == METHOD_COMPLETE:
+            row_y[i] = max(row_x[i], row_y[i])
+        else:
+            row_y[i] = (nx * row_x[i] + ny * row_y[i]) / (nx + ny)
+
+class out_of_core_linkage:
+    """
+    Hierarchical clustering of a distance matrix that does not fit in memory.
+
+    The rows of a TSV matrix are streamed (``matrix_reader.stream_rows``, which checks
+    the symmetry in O(n) memory) into a compressed HDF5 dataset of the square matrix
+    in a temporary file, chunked by row; the rows of a binary matrix are gathered from
+    its memory map. The clustering then reads one row at a time: single linkage is
+    SciPy's minimum spanning tree algorithm and average/complete linkage SciPy's
+    nearest-neighbour chain, step by step, so the linkage matrix is the one of
+    ``scipy.cluster.hierarchy.linkage``, tied distances included.
+
+    Attributes
+    ----------
+    method : str
+        Linkage method, 'single', 'average' or 'complete'.
+    directory : str
+        Directory of the temporary HDF5 file (``$TMPDIR`` by default).
+
+    Notes
+    -----
+    - Memory is O(n): a few rows and the merges. The file holds the n² distances as
+      float64, which the compression keeps small for integer distances.
+    - Average and complete linkage update the distances to a merged cluster as the
+      nearest-neighbour chain does, but lazily: the row of the merged cluster is
+      written back, and the other rows catch up with the merges made since they were
+      written (one value per merge) when they are read. Time is O(n²) row values, as
+      in memory, plus one row read and decompressed per step.
+    - With ``sort_matrix`` each row is written in sorted order, so the samples are
+      clustered in the order of the sorted matrix, as in memory.
+    - Symmetry is checked exactly (no ``atol``/``rtol``); without validation the
+      matrix is taken to be symmetric. Values are stored as ``dtype`` would store them
+      ('auto' is exact), e.g. rounded to single precision for 'float32'.
+    """
+    VALID_METHODS = {'average': METHOD_AVERAGE, 'complete': METHOD_COMPLETE, 'single': METHOD_SINGLE}
+    FILTERS = tables.Filters(complevel=5, complib='blosc:lz4', shuffle=True)
+
+    def __init__(self, method, directory=None) -> None:
+        if method not in self.VALID_METHODS:
+            raise ValueError(f'Out-of-core clustering supports {list(self.VALID_METHODS)} linkage, not [{method}]')
+        self.method = method
+        self.directory = tempfile.gettempdir() if directory is None else directory
+
+    def cluster_file(self, file_path, sort_matrix=False, validate=True, delim="\t", dtype='float64'):
+        """
+        Cluster a TSV or binary distance matrix file.
+
+        Returns
+        -------
+        labels : list of str
+            Sample labels in the order of the linkage matrix leaves.
+        np.ndarray
+            Linkage matrix of shape (n-1, 4).
+        """
+        fd, hdf5_path = tempfile.mkstemp(prefix='gas-', suffix='.h5', dir=self.directory)
+        os.close(fd)
+        try:
+            with tables.open_file(hdf5_path, 'w') as h5:
+                if is_binary_matrix(file_path):
+                    labels, node = self.write_binary(h5, file_path, sort_matrix=sort_matrix, validate=validate)
+                else:
+                    reader = matrix_reader(file_path, delim=delim, sort_matrix=sort_matrix, validate=validate,
+                                           dtype=dtype)
+                    node = self.write_rows(h5, reader)
+                    labels = list(reader.labels)
+                Z = self.get_linkage(node)
+        finally:
+            os.remove(hdf5_path)
+        return labels, Z
+
+    def create_rows(self, h5, n):
+        """
+        Create the dataset of the square matrix, one row per chunk.
+        """
+        return h5.create_carray(h5.root, 'rows', atom=tables.Float64Atom(), shape=(n, n),
+                                chunkshape=(1, max(1, n)), filters=self.FILTERS)
+
+    def write_rows(self, h5, reader):
+        """
+        Stream the rows of a TSV matrix into the dataset of the square matrix, in
+        sorted order when the reader sorts the samples.
+
+        Returns
+        -------
+        tables.CArray
+            The dataset, of shape (n, n).
+        """
+        dtype = np.dtype(np.float64) if reader.auto_dtype else reader.dtype
+        node = None
+        order = None
+        for i, row in reader.stream_rows():
+            if node is None:
+                node = self.create_rows(h5, reader.n)
+                if reader.rank is not None:
+                    order = np.argsort(reader.rank)
+            if reader.exact and not fits_dtype(row, dtype):
+                raise ValueError(reader.ERROR_DTYPE.format(dtype=dtype.name))
+            row = row.astype(dtype)
+            if order is not None:
+                i = reader.rank[i]
+                row = row[order]
+            node[i] = row
+        if node is None:
+            node = self.create_rows(h5, reader.n)
+        node.flush()
+        return node
+
+    def write_binary(self, h5, file_path, sort_matrix=False, validate=True):
+        """
+        Write the rows of a binary matrix into the dataset of the square matrix,
+        gathering each row from the memory map of its condensed vector.
+
+        Returns
+        -------
+        labels : list of str
+            Sample labels in the order of the rows.
+        tables.CArray
+            The dataset, of shape (n, n).
+        """
+        labels, condensed = read_binary_matrix(file_path, verify=validate)
+        n = len(labels)
+        order = np.arange(n, dtype=np.int64)
+        if sort_matrix:
+            order = np.array(sorted(range(n), key=labels.__getitem__), dtype=np.int64)
+            labels = [labels[i] for i in order]
+        node = self.create_rows(h5, n)
+        for i in range(n):
+            # sample order[i] against the other samples, in the order of the rows
+            others = np.arange(n) != i
+            a = order[i]
+            b = order[others]
+            row = np.zeros(n, dtype=np.float64)
+            row[others] = condensed[condensed_index(n, np.minimum(a, b), np.maximum(a, b))]
+            node[i] = row
+        node.flush()
+        return labels, node
+
+    def get_linkage(self, node):
+        """
+        Cluster the square matrix dataset.
+
+        Returns
+        -------
+        np.ndarray
+            Linkage matrix of shape (n-1, 4).
+        """
+        n = node.shape[0]
+        if n < 2:
+            raise ValueError('at least two samples are required for clustering')
+        if self.method == 'single':
+            Z = self.prim_linkage(node, n)
+        else:
+            Z = self.nn_chain_linkage(node, n)
+        Z = Z[np.argsort(Z[:, 2], kind='mergesort')]
+        label_linkage(Z, n)
+        return Z
+
+    @staticmethod
+    def read_row(node, i):
+        row = node[i]
+        if not _all_finite(row):
+            raise ValueError('The condensed distance matrix must contain only finite values.')
+        return row
+
+    def prim_linkage(self, node, n):
+        """
+        Unsorted merges of single linkage, as SciPy's ``mst_single_linkage``.
+        """
+        Z = np.zeros((n - 1, 4), dtype=np.float64)
+        merged = np.zeros(n, dtype=np.uint8)
+        D = np.full(n, np.inf)
+        x = 0
+        for k in range(n - 1):
+            y, current_min = _prim_step(self.read_row(node, x), x, merged, D)
+            Z[k, 0] = x
+            Z[k, 1] = y
+            Z[k, 2] = current_min
+            x = y
+        return Z
+
+    def nn_chain_linkage(self, node, n):
+        """
+        Unsorted merges of average or complete linkage, as ``nn_chain._nn_chain``.
+
+        ``node`` is overwritten: the row of each merged cluster is replaced by its
+        distances to the other clusters at the time of the merge.
+        """
+        method = self.VALID_METHODS[self.method]
+        Z = np.empty((n - 1, 4), dtype=np.float64)
+        merges = np.empty((n - 1, 4), dtype=np.int64)
+        # number of merges applied to each stored row
+        updated = np.zeros(n, dtype=np.int64)
+        size = np.ones(n, dtype=np.int64)
+        chain = np.empty(n, dtype=np.int64)
+        chain_length = 0
+        y = 0
+
+        def current_row(i, k):
+            row = self.read_row(node, i)
+            _replay(row, merges, updated[i], k, method)
+            return row
+
+        for k in range(n - 1):
+            if chain_length == 0:
+                chain_length = 1
+                chain[0] = np.flatnonzero(size)[0]
+
+            # follow the chain of nearest neighbours until two mutual neighbours are found
+            while True:
+                x = chain[chain_length - 1]
+                row = current_row(x, k)
+                # prefer the previous element of the chain to avoid cycles on ties
+                if chain_length > 1:
+                    y = chain[chain_length - 2]
+                    current_min = row[y]
+                else:
+                    current_min = np.inf
+                y, current_min = _nearest(row, size, x, y, current_min)
+                if chain_length > 1 and y == chain[chain_length - 2]:
+                    break
+                chain[chain_length] = y
+                chain_length += 1
+
+            chain_length -= 2
+            other = current_row(y, k)
+            if x > y:
+                x, y = y, x
+                row, other = other, row
+            nx = size[x]
+            ny = size[y]
+            Z[k, 0] = x
+            Z[k, 1] = y
+            Z[k, 2] = current_min
+            Z[k, 3] = nx + ny
+            merges[k] = (x, y, nx, ny)
+            size[x] = 0
+            size[y] = nx + ny
+            _merge_rows(row, other, nx, ny, method)
+            node[y] = other
+            updated[y] = k + 1
+        return Z
@@ -0,0 +1,212 @@
+import csv
+import numpy as np
+import pandas as pd
+from numba import njit
+from genomic_address_service.constants import PD_HEADER
+from genomic_address_service.classes.matrix_reader import matrix_reader
+from genomic_address_service.compression import open_input
+from genomic_address_service.utils import condensed_size, fits_dtype, narrowest_dtype
+
+@njit(cache=True)
+def _store_pairs(condensed, seen, n, query, ref, values, validate, atol, rtol):
+    """
+    Write a batch of pairs into the condensed vector, marking them in the ``seen``
+    bit set. A pair seen before is compared with the stored value instead.
+
+    Returns the number of pairs stored for the first time and the position of the
+    first offending pair of the batch (-1 if there is none): a self pair with a
+    non-zero distance, or a pair whose value differs from the stored one.
+    """
+    filled = 0
+    for k in range(len(values)):
+        i = query[k]
+        j = ref[k]
+        value = np.float64(values[k])
+        if i == j:
+            if value != 0:
+                return filled, k
+            continue
+        if i > j:
+            i, j = j, i
+        index = n * i - (i * (i + 1)) // 2 + (j - i - 1)
+        byte = index >> 3
+        bit = np.uint8(1 << (index & 7))
+        if seen[byte] & bit:
+            stored = np.float64(condensed[index])
+            if validate and abs(value - stored) > atol + rtol * abs(stored):
+                return filled, k
+        else:
+            condensed[index] = values[k]
+            seen[byte] |= bit
+            filled += 1
+    return filled, -1
+
+@njit(cache=True)
+def _first_missing(seen, n):
+    """
+    First pair (i, j) not marked in the ``seen`` bit set.
+    """
+    index = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            if not seen[index >> 3] & (1 << (index & 7)):
+                return i, j
+            index += 1
+    return -1, -1
+
+class pairwise_reader(matrix_reader):
+    """
+    Read a long-format (``query_id``/``ref_id``/``dist``) distance file directly into
+    a condensed distance vector.
+
+    The file is read twice in batches of ``batch_size`` rows: the first pass interns
+    the sample labels (in order of first appearance, or sorted), which fixes n, and
+    the second writes every pair straight to its position in a preallocated vector
+    of length n*(n-1)/2. The square matrix is never built.
+
+    Attributes
+    ----------
+    labels : list of str
+        Sample labels in the order of the returned condensed vector.
+    n : int
+        Number of samples.
+
+    Notes
+    -----
+    - Every pair of samples must be listed at least once, in either direction. A pair
+      listed more than once must have the same distance each time (within
+      ``atol``/``rtol``; the first value is kept), and a sample paired with itself
+      must have distance 0. With ``validate=False`` repeated pairs are not compared.
+    - The pairs written so far are tracked in a bit set of n*(n-1)/16 bytes.
+    - ``dtype`` works as in ``matrix_reader``: 'auto' widens the vector when a batch
+      holds a value that the current type cannot hold exactly, and an explicit
+      'float32' rounds the values.
+    - Batches are parsed with the pandas C parser, on one thread. A compressed file
+      is decompressed once per pass.
+    """
+    ERROR_PAIRWISE_FORMAT = f"Incorrect pairwise distance format: every line must have the {len(PD_HEADER)} columns {', '.join(PD_HEADER)}"
+    ERROR_SELF = "Pairwise distances list a sample with a non-zero distance to itself"
+    ERROR_MISSING = "Pairwise distances are incomplete"
+    ERROR_EMPTY = "Pairwise distances do not list any samples"
+
+    def __init__(self, f, delim="\t", sort_matrix=False, validate=True, atol=0.0, rtol=0.0, batch_size=1 << 20,
+                 dtype='float64') -> None:
+        super().__init__(f, delim=delim, sort_matrix=sort_matrix, validate=validate, atol=atol, rtol=rtol, dtype=dtype)
+        self.batch_size = max(1, batch_size)
+
+    def read_batches(self, columns):
+        """
+        Iterate over the rows after the header in batches.
+
+        Parameters
+        ----------
+        columns : list of int
+            Columns to parse (0 query, 1 reference, 2 distance).
+
+        Yields
+        ------
+        int
+            Line number of the first row of the batch.
+        list of np.ndarray
+            Object arrays of strings, one per column requested.
+        """
+        line_number = 2
+        with open_input(self.fpath) as fh:
+            try:
+                batches = pd.read_csv(fh, sep=self.delim, header=None, skiprows=1, dtype=str, na_filter=False,
+                                      quoting=csv.QUOTE_NONE, skip_blank_lines=True, chunksize=self.batch_size)
+                for batch in batches:
+                    if batch.shape[1] != len(PD_HEADER):
+                        raise ValueError(self.ERROR_PAIRWISE_FORMAT)
+                    yield line_number, [batch[c].to_numpy() for c in columns]
+                    line_number += len(batch)
+            except pd.errors.ParserError:
+                raise ValueError(self.ERROR_PAIRWISE_FORMAT)
+            except pd.errors.EmptyDataError:
+                return
+
+    def read_labels(self):
+        """
+        First pass: collect the sample labels in order of first appearance.
+        """
+        with open_input(self.fpath) as fh:
+            header = fh.readline().rstrip("\r\n").split(self.delim)
+        if len(header) != len(PD_HEADER):
+            raise ValueError(self.ERROR_PAIRWISE_FORMAT)
+
+        index = {}
+        for _, (query, ref) in self.read_batches([0, 1]):
+            pairs = np.empty(2 * len(query), dtype=object)
+            pairs[0::2] = query
+            pairs[1::2] = ref
+            for label in pd.unique(pairs):
+                index.setdefault(label, len(index))
+        if len(index) == 0:
+            raise ValueError(self.ERROR_EMPTY)
+
+        self.columns = list(index)
+        self.n = len(self.columns)
+        self.labels = sorted(self.columns) if self.sort_matrix else list(self.columns)
+        self.column_index = {label: i for i, label in enumerate(self.labels)}
+        return self.labels
+
+    def fit_values(self, condensed, values):
+        """
+        Check that a batch of values can be stored in the condensed vector, widening it
+        (dtype 'auto') if needed.
+        """
+        if not self.exact or fits_dtype(values, condensed.dtype):
+            return condensed
+        if not self.auto_dtype:
+            raise ValueError(self.ERROR_DTYPE.format(dtype=self.dtype.name))
+        return self.convert(condensed, narrowest_dtype(values, self.WIDER_DTYPES[condensed.dtype]))
+
+    def read_data(self, allocate=None):
+        """
+        Read the pairwise distances into a condensed distance vector.
+
+        Parameters
+        ----------
+        allocate : callable, optional
+            See ``matrix_reader.read_data``.
+
+        Returns
+        -------
+        labels : list of str
+            Sample labels in the order used by the condensed vector.
+        np.ndarray
+            Condensed (upper triangle, row-major) distance vector of length n*(n-1)/2,
+            of type ``self.dtype``.
+        """
+        labels = self.read_labels()
+        index = pd.Index(labels)
+        self.allocate = allocate
+        if allocate is None:
+            condensed = np.empty(condensed_size(self.n), dtype=self.dtype)
+        else:
+            condensed = allocate(self.labels, self.dtype)
+        seen = np.zeros((condensed_size(self.n) + 7) // 8, dtype=np.uint8)
+
+        filled = 0
+        for line_number, (query, ref, dist) in self.read_batches([0, 1, 2]):
+            values = self.parse_values(dist)
+            condensed = self.fit_values(condensed, values)
+            query = index.get_indexer(query).astype(np.int64)
+            ref = index.get_indexer(ref).astype(np.int64)
+            stored, offending = _store_pairs(condensed, seen, self.n, query, ref, values.astype(condensed.dtype),
+                                             self.validate, self.atol, self.rtol)
+            filled += stored
+            if offending >= 0:
+                q = labels[query[offending]]
+                r = labels[ref[offending]]
+                if q == r:
+                    raise ValueError(f'{self.ERROR_SELF}: line {line_number + offending} [{q}, {r}]={dist[offending]}')
+                raise ValueError(f'{self.ERROR_ASYMMETRIC}: line {line_number + offending} [{q}, {r}]={dist[offending]} '
+                                 f'differs from an earlier value for the same pair')
+
+        if filled != condensed_size(self.n):
+            i, j = _first_missing(seen, self.n)
+            raise ValueError(f'{self.ERROR_MISSING}: {condensed_size(self.n) - filled} pairs are missing, '
+                             f'e.g. [{labels[i]}, {labels[j]}]')
+
+        return self.labels, condensed
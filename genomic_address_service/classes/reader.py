@@ -1,5 +1,45 @@
+import csv
+import numpy as np
+import pandas as pd
+from genomic_address_service.compression import open_input
+
+class dist_batch:
+    """
+    Distances of a batch of queries, integer coded and grouped by query (CSR).
+
+    The distances of query ``queries[i]`` are ``dists[offsets[i]:offsets[i+1]]``, to the
+    references ``refs[offsets[i]:offsets[i+1]]``, sorted by distance (ties keep the file
+    order). Queries and references are codes into ``labels``.
+
+    Attributes
+    ----------
+    labels : np.ndarray
+        Object array of the sample labels of the batch.
+    queries : np.ndarray
+        int64 codes of the queries, in order of first appearance in the file.
+    offsets : np.ndarray
+        int64 array of length len(queries)+1.
+    refs : np.ndarray
+        int64 reference codes.
+    dists : np.ndarray
+        float64 distances.
+    """
+
+    def __init__(self, labels, queries, offsets, refs, dists) -> None:
+        self.labels = labels
+        self.queries = queries
+        self.offsets = offsets
+        self.refs = refs
+        self.dists = dists
+
+    def __len__(self):
+        return len(self.queries)
+
 class dist_reader:
 
+    # rows parsed at a time by read_batches
+    CHUNK_ROWS = 1 << 20
+
     def __init__(self, f, n_records=1000, delim="\t") -> None:
         self.record_ids = set()
         self.dists = {}
@@ -59,7 +99,7 @@ class dist_reader:
         self.sort_distances()
 
     def read_data(self):
-        self.file_handle = open(self.fpath,'r')
+        self.file_handle = open_input(self.fpath)
         self.header = next(self.file_handle).split(self.delim)
 
         for chunk in self.read_pd():
@@ -70,3 +110,123 @@ class dist_reader:
 
         self.file_handle.close()
         return chunk
+
+    def read_chunks(self):
+        """
+        Parse the rows after the header with the pandas C parser.
+
+        Yields
+        ------
+        tuple of np.ndarray
+            Query and reference labels (object arrays) and float64 distances of a
+            chunk of rows. Rows without a distance (fewer than 3 fields) are skipped.
+        """
+        with open_input(self.fpath) as fh:
+            try:
+                chunks = pd.read_csv(fh, sep=self.delim, header=None, skiprows=1, usecols=[0, 1, 2],
+                                     dtype={0: str, 1: str, 2: np.float64}, keep_default_na=False,
+                                     na_values={2: ['']}, quoting=csv.QUOTE_NONE, skip_blank_lines=True,
+                                     chunksize=self.CHUNK_ROWS)
+                for chunk in chunks:
+                    self.row_number += len(chunk)
+                    query, ref, dist = (chunk[c].to_numpy() for c in chunk.columns)
+                    complete = ~np.isnan(dist)
+                    if not complete.all():
+                        query, ref, dist = query[complete], ref[complete], dist[complete]
+                    yield query, ref, dist
+            except pd.errors.EmptyDataError:
+                return
+
+    def read_batches(self):
+        """
+        Read the pairwise distances in batches of ``n_records`` queries.
+
+        Each chunk of ``read_coded`` is ordered with a single stable sort by (query,
+        distance), so a query's distances are a slice of the batch arrays instead of
+        a dict.
+
+        Yields
+        ------
+        dist_batch
+            The distances of up to ``n_records`` queries.
+        """
+        for labels, q, r, dist in self.read_coded():
+            yield from self.make_batches(labels, q, r, dist)
+
+    def read_coded(self):
+        """
+        Read the pairwise distances in integer coded chunks of rows.
+
+        Each chunk of rows is integer coded with ``pd.factorize``. The rows of the
+        query of the last row of a chunk are held back until the next chunk, as they
+        can continue there. A pair listed more than once keeps its last distance, at
+        the position of its first line, as in ``read_pd``.
+
+        Yields
+        ------
+        labels : np.ndarray
+            Object array of the labels of the chunk, queries first (see ``code_rows``).
+        q, r : np.ndarray
+            int64 codes of the query and reference of each row, in file order.
+        dist : np.ndarray
+            float64 distances.
+        """
+        held = None
+        for query, ref, dist in self.read_chunks():
+            if held is not None:
+                query, ref, dist = (np.concatenate(pair) for pair in zip(held, (query, ref, dist)))
+            if len(query) == 0:
+                continue
+            labels, q, r = self.code_rows(query, ref)
+            last = q == q[-1]
+            held = (query[last], ref[last], dist[last])
+            rest = ~last
+            if rest.any():
+                yield (labels, *self.last_distances(labels, q[rest], r[rest], dist[rest]))
+        if held is not None:
+            labels, q, r = self.code_rows(held[0], held[1])
+            yield (labels, *self.last_distances(labels, q, r, held[2]))
+
+    @staticmethod
+    def last_distances(labels, q, r, dist):
+        """
+        Keep one row per (query, reference) pair, with the distance of its last row
+        at the position of its first.
+        """
+        keys = q * len(labels) + r
+        if not pd.Index(keys).has_duplicates:
+            return q, r, dist
+        last = pd.Series(dist).groupby(keys, sort=False).last()
+        keys = last.index.to_numpy()
+        return keys // len(labels), keys % len(labels), last.to_numpy()
+
+    @staticmethod
+    def code_rows(query, ref):
+        """
+        Integer codes of the query and reference labels of some rows.
+
+        Returns
+        -------
+        labels : np.ndarray
+            Object array of the labels; the queries come first, so their codes are
+            0..num_queries-1 in order of first appearance.
+        q, r : np.ndarray
+            int64 codes of the query and reference of each row.
+        """
+        codes, labels = pd.factorize(np.concatenate((query, ref)))
+        return np.asarray(labels, dtype=object), codes[:len(query)].astype(np.int64), codes[len(query):].astype(np.int64)
+
+    def make_batches(self, labels, q, r, dist):
+        """
+        Group coded rows by query and split them into batches of ``n_records`` queries.
+        """
+        num_queries = int(q.max()) + 1
+        order = np.lexsort((dist, q))
+        r = r[order]
+        dist = dist[order]
+        offsets = np.zeros(num_queries + 1, dtype=np.int64)
+        np.cumsum(np.bincount(q, minlength=num_queries), out=offsets[1:])
+        for start in range(0, num_queries, self.n_records):
+            end = min(start + self.n_records, num_queries)
+            yield dist_batch(labels, np.arange(start, end, dtype=np.int64), offsets[start:end + 1] - offsets[start],
+                             r[offsets[start]:offsets[end]], dist[offsets[start]:offsets[end]])
@@ -0,0 +1,251 @@
+import numpy as np
+from numba import njit
+from genomic_address_service.utils import find_root, label_linkage
+
+@njit(cache=True)
+def _slink_fill(pi, lam, m, k):
+    """
+    SLINK update for the k-th inserted sample (Sibson, 1973).
+
+    ``m[i]`` must hold the distance between the new sample and the i-th inserted sample.
+    """
+    pi[k] = k
+    lam[k] = np.inf
+    for i in range(k):
+        p = pi[i]
+        if lam[i] >= m[i]:
+            if lam[i] < m[p]:
+                m[p] = lam[i]
+            lam[i] = m[i]
+            pi[i] = k
+        elif m[i] < m[p]:
+            m[p] = m[i]
+    for i in range(k):
+        if lam[i] >= lam[pi[i]]:
+            pi[i] = k
+
+@njit(cache=True)
+def _slink_insert(pi, lam, m, k, distances):
+    for i in range(k):
+        m[i] = distances[i]
+    _slink_fill(pi, lam, m, k)
+
+@njit(cache=True)
+def _slink_condensed(pi, lam, m, condensed, n):
+    """
+    Run SLINK over a condensed distance vector, inserting the samples from the last
+    to the first so that each step reads one contiguous row of the upper triangle.
+    """
+    for k in range(n):
+        i = n - 1 - k
+        start = n * i - (i * (i + 1)) // 2
+        # the previously inserted samples are n-1, n-2, ..., i+1
+        for j in range(k):
+            m[j] = condensed[start + n - i - 2 - j]
+        _slink_fill(pi, lam, m, k)
+
+@njit(cache=True)
+def _pointer_representation(Z, m, pi, lam):
+    """
+    SLINK pointer representation of the first m samples from their linkage matrix
+    (samples numbered by insertion order): ``pi[i]`` is the last sample of the
+    cluster that sample i joins at height ``lam[i]`` as the last sample of its own.
+    """
+    last = np.empty(2 * m - 1, dtype=np.int64)
+    for i in range(m):
+        last[i] = i
+    for r in range(m - 1):
+        a = last[int(Z[r, 0])]
+        b = last[int(Z[r, 1])]
+        if a > b:
+            a, b = b, a
+        pi[a] = b
+        lam[a] = Z[r, 2]
+        last[m + r] = b
+    pi[m - 1] = m - 1
+    lam[m - 1] = np.inf
+    # clusters joined at the same height point to the last sample of their union
+    for i in range(m - 2, -1, -1):
+        if lam[pi[i]] == lam[i]:
+            pi[i] = pi[pi[i]]
+
+@njit(cache=True)
+def _canonical_merges(a, b, heights, n):
+    """
+    Merges of a single linkage dendrogram in an order that only depends on the
+    dendrogram, not on the spanning tree SLINK found (which depends on the insertion
+    order when distances are tied).
+
+    ``a``, ``b`` and ``heights`` are the spanning tree edges sorted by height. The
+    clusters joined at one height are merged one at a time into the cluster holding
+    the smallest sample of their group, by increasing smallest sample. Returns the
+    merges (x, y, height) with x, y samples of the merged clusters.
+    """
+    # the root of a cluster is its smallest sample
+    parent = np.arange(n)
+    group = np.arange(n)
+    roots = np.empty(2 * (n - 1), dtype=np.int64)
+    Z = np.zeros((n - 1, 4), dtype=np.float64)
+    k = 0
+    start = 0
+    while start < n - 1:
+        end = start + 1
+        while end < n - 1 and heights[end] == heights[start]:
+            end += 1
+        # group the clusters joined at this height
+        m = 0
+        for e in range(start, end):
+            ra = find_root(parent, a[e])
+            rb = find_root(parent, b[e])
+            roots[m] = ra
+            roots[m + 1] = rb
+            m += 2
+            ga = find_root(group, ra)
+            gb = find_root(group, rb)
+            if ga < gb:
+                group[gb] = ga
+            elif gb < ga:
+                group[ga] = gb
+        keys = np.empty(m, dtype=np.int64)
+        for r in range(m):
+            keys[r] = find_root(group, roots[r]) * n + roots[r]
+        keys = np.unique(keys)
+        for r in range(len(keys)):
+            g = keys[r] // n
+            c = keys[r] % n
+            if c != g:
+                Z[k, 0] = g
+                Z[k, 1] = c
+                Z[k, 2] = heights[start]
+                k += 1
+                parent[c] = g
+        for r in range(m):
+            group[roots[r]] = roots[r]
+        start = end
+    return Z
+
+class slink:
+    """
+    Single linkage clustering in O(n^2) time and O(n) memory (SLINK).
+
+    Samples are inserted one at a time together with their distances to the samples
+    inserted before them, so the distance matrix can be consumed as it is read and
+    never has to be held in memory. The result is a linkage matrix in the format
+    produced by ``scipy.cluster.hierarchy.linkage``.
+
+    Attributes
+    ----------
+    n : int
+        Number of samples.
+    num_inserted : int
+        Number of samples inserted so far.
+
+    Notes
+    -----
+    - The insertion order does not change the linkage matrix: when several merges
+      happen at exactly the same height they are put in a canonical order (see
+      ``_canonical_merges``), so a streamed text matrix and a binary matrix give the
+      same cluster numbering.
+    - The clusters at any threshold and the merge heights are the same as SciPy's.
+      SciPy orders merges at the same height by the order in which its minimum
+      spanning tree visits the samples, which depends on the distances themselves
+      rather than on the dendrogram, and cannot be reproduced without the whole
+      matrix. With tied distances the cluster IDs and the order of the tied merges
+      in the tree (not the clusters) can therefore differ from the ``scipy``
+      engine's, so SLINK is only used when it is selected (``--engine slink`` or
+      ``--update``), never in place of scipy.
+    """
+
+    def __init__(self, n) -> None:
+        self.n = n
+        self.num_inserted = 0
+        self.pi = np.empty(n, dtype=np.int64)
+        self.lam = np.empty(n, dtype=np.float64)
+        self.m = np.empty(n, dtype=np.float64)
+        self.ids = np.empty(n, dtype=np.int64)
+
+    @classmethod
+    def from_linkage(cls, linkage, n, ids=None):
+        """
+        Resume SLINK from the single linkage matrix of the first samples, so that more
+        samples can be inserted without the distances between the first ones.
+
+        Parameters
+        ----------
+        linkage : np.ndarray
+            Single linkage matrix of shape (m-1, 4), e.g. from ``get_linkage``.
+        n : int
+            Total number of samples (m already inserted plus the ones to insert).
+        ids : np.ndarray, optional
+            Index in the output linkage matrix of each of the m samples (defaults to
+            their position in ``linkage``).
+
+        Returns
+        -------
+        slink
+            Engine with the m samples inserted, in the order of ``linkage``.
+        """
+        m = len(linkage) + 1
+        if m > n:
+            raise ValueError(f'the linkage matrix has {m} samples, more than {n}')
+        engine = cls(n)
+        _pointer_representation(np.asarray(linkage, dtype=np.float64), m, engine.pi, engine.lam)
+        engine.ids[:m] = np.arange(m, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        engine.num_inserted = m
+        return engine
+
+    def insert(self, sample_id, distances):
+        """
+        Insert a sample.
+
+        Parameters
+        ----------
+        sample_id : int
+            Index of the sample in the output linkage matrix (0 to n-1).
+        distances : np.ndarray
+            Distances between the sample and the previously inserted samples, in
+            insertion order.
+        """
+        k = self.num_inserted
+        if k >= self.n or len(distances) != k:
+            raise ValueError(f'expected {k} distances for sample {k} of {self.n}')
+        _slink_insert(self.pi, self.lam, self.m, k, np.asarray(distances, dtype=np.float64))
+        self.ids[k] = sample_id
+        self.num_inserted += 1
+
+    def insert_condensed(self, condensed, ids=None):
+        """
+        Insert all of the samples of a condensed distance vector.
+
+        Parameters
+        ----------
+        condensed : np.ndarray
+            Condensed (upper triangle, row-major) distance vector, e.g. a memory map.
+        ids : np.ndarray, optional
+            Index in the output linkage matrix of each sample of ``condensed``.
+            Defaults to the position of the sample.
+        """
+        if self.num_inserted != 0:
+            raise ValueError('insert_condensed() must be called on an empty slink object')
+        n = self.n
+        _slink_condensed(self.pi, self.lam, self.m, np.asarray(condensed), n)
+        if ids is None:
+            ids = np.arange(n, dtype=np.int64)
+        self.ids[:] = np.asarray(ids, dtype=np.int64)[::-1]
+        self.num_inserted = n
+
+    def get_linkage(self):
+        """
+        Build the linkage matrix once all of the samples have been inserted.
+
+        Returns
+        -------
+        np.ndarray
+            Linkage matrix of shape (n-1, 4).
+        """
+        if self.num_inserted != self.n:
+            raise ValueError(f'only {self.num_inserted} of {self.n} samples were inserted')
+        order = np.argsort(self.lam, kind='stable')[:self.n - 1]
+        Z = _canonical_merges(self.ids[order], self.ids[self.pi[order]], self.lam[order], self.n)
+        label_linkage(Z, self.n)
+        return Z
@@ -0,0 +1,149 @@
+from array import array
+import numpy as np
+from numba import njit
+from genomic_address_service.constants import PD_HEADER
+from genomic_address_service.compression import open_input
+from genomic_address_service.utils import find_root
+
+@njit(cache=True)
+def _sweep(u, v, d, n, thresholds):
+    """
+    Union-find sweep over edges sorted by distance.
+
+    Returns an int32 array of shape (n, len(thresholds)) with the cluster of each
+    sample at each threshold (thresholds in decreasing order, as given to mcluster),
+    numbered from 1 in the order the samples are listed.
+    """
+    num_levels = len(thresholds)
+    memberships = np.zeros((n, num_levels), dtype=np.int32)
+    parent = np.arange(n)
+    cluster = np.zeros(n, dtype=np.int32)
+    k = 0
+    for level in range(num_levels - 1, -1, -1):
+        while k < len(d) and d[k] <= thresholds[level]:
+            x = find_root(parent, u[k])
+            y = find_root(parent, v[k])
+            if x < y:
+                parent[y] = x
+            elif y < x:
+                parent[x] = y
+            k += 1
+        cluster[:] = 0
+        num_clusters = 0
+        for i in range(n):
+            root = find_root(parent, i)
+            if cluster[root] == 0:
+                num_clusters += 1
+                cluster[root] = num_clusters
+            memberships[i, level] = cluster[root]
+    return memberships
+
+class sparse_single_linkage:
+    """
+    Single linkage clusters at several thresholds from a list of close pairs.
+
+    Single linkage clusters at a threshold t are the connected components of the graph
+    of the pairs at distance <= t, so only the pairs within the largest threshold are
+    needed. They are read from a three column ``query_id``/``ref_id``/``dist`` file (the
+    pairwise format of ``gas call``); any pair that is not listed is taken to be farther
+    apart than the largest threshold. Memory is O(samples + edges within the largest
+    threshold) instead of O(n²).
+
+    Attributes
+    ----------
+    thresholds : list of float
+        Distance thresholds, in decreasing order.
+    labels : list of str
+        Sample ids, in the order they first appear in the file (or sorted).
+    memberships : np.ndarray
+        int32 array of shape (n, len(thresholds)); row i holds the cluster IDs of
+        ``labels[i]`` across thresholds.
+
+    Notes
+    -----
+    - Clusters are numbered at each threshold in the order of ``labels``, not by the
+      tree order used by the dense engines, so the addresses name the same clusters
+      with different numbers. No tree is built: the merges above the largest
+      threshold are unknown.
+    - Both directions of a pair may be listed; the smaller distance links them.
+    """
+
+    def __init__(self, file_path, thresholds, sort_matrix=False, delim="\t") -> None:
+        self.thresholds = thresholds
+        self.labels, u, v, d = self.read_edges(file_path, max(thresholds), delim=delim)
+        if sort_matrix:
+            order = sorted(range(len(self.labels)), key=self.labels.__getitem__)
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order), dtype=np.int64)
+            self.labels = [self.labels[i] for i in order]
+            u = rank[u]
+            v = rank[v]
+        order = np.argsort(d, kind='stable')
+        self.memberships = _sweep(u[order], v[order], d[order], len(self.labels),
+                                  np.asarray(thresholds, dtype=np.float64))
+
+    def read_edges(self, file_path, max_threshold, delim="\t"):
+        """
+        Read the pairs within the largest threshold.
+
+        Parameters
+        ----------
+        file_path : str
+            Tab-delimited file with a ``query_id``/``ref_id``/``dist`` header.
+        max_threshold : float
+            Pairs farther apart are not kept (their samples are).
+        delim : str, optional (default="\\t")
+            Column delimiter.
+
+        Returns
+        -------
+        labels : list of str
+            Sample ids in order of first appearance.
+        u, v : np.ndarray
+            int64 sample indices of the kept pairs.
+        d : np.ndarray
+            float64 distances of the kept pairs.
+        """
+        index = {}
+        u = array('q')
+        v = array('q')
+        d = array('d')
+        with open_input(file_path) as fh:
+            header = next(fh, '').rstrip("\r\n").split(delim)
+            if len(header) != len(PD_HEADER):
+                raise ValueError(f'{file_path} header must have the {len(PD_HEADER)} columns {PD_HEADER}')
+            for row_number, line in enumerate(fh, start=2):
+                line = line.rstrip("\r\n")
+                if line == '':
+                    continue
+                row = line.split(delim)
+                if len(row) != len(PD_HEADER):
+                    raise ValueError(f'{file_path} line {row_number} has {len(row)} columns, expected {len(PD_HEADER)}')
+                try:
+                    dist = float(row[2])
+                except ValueError:
+                    raise ValueError(f'{file_path} line {row_number}: distance [{row[2]}] is not a number')
+                if not dist >= 0:
+                    raise ValueError(f'{file_path} line {row_number}: distance [{row[2]}] must be a non-negative number')
+                x = index.setdefault(row[0], len(index))
+                y = index.setdefault(row[1], len(index))
+                if dist <= max_threshold and x != y:
+                    u.append(x)
+                    v.append(y)
+                    d.append(dist)
+        if len(index) == 0:
+            raise ValueError(f'{file_path} does not list any samples')
+        return (list(index), np.frombuffer(u, dtype=np.int64), np.frombuffer(v, dtype=np.int64),
+                np.frombuffer(d, dtype=np.float64))
+
+    def get_memberships(self):
+        """
+        Get the cluster memberships.
+
+        Returns
+        -------
+        np.ndarray
+            int32 array of shape (n, len(thresholds)); row i holds the cluster IDs of
+            ``self.labels[i]`` across thresholds.
+        """
+        return self.memberships
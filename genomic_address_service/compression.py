@@ -0,0 +1,143 @@
+"""
+Transparent decompression of input files.
+
+Compressed inputs are recognised from their first bytes (gzip, bzip2, zstd and xz), not
+from the file name. They are decompressed while they are read, by an external tool
+running in its own process when one is installed (pigz, lbzip2/pbzip2 and xz -T0
+decompress on several threads; the others at least decompress in parallel with the
+parsing), or otherwise by the Python modules in the same process.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+import subprocess
+from genomic_address_service.constants import COMPRESSION_MAGIC, COMPRESSION_EXTENSIONS
+
+# command lines tried for each format, in order of preference (the file name is appended)
+DECOMPRESSION_COMMANDS = {
+    'gzip': [['pigz', '-dc'], ['gzip', '-dc']],
+    'bz2': [['lbzip2', '-dc'], ['pbzip2', '-dc'], ['bzip2', '-dc']],
+    'zstd': [['zstd', '-dcq']],
+    'xz': [['xz', '-dc', '-T0']],
+}
+
+def compression_type(file_path):
+    """
+    Compression format of a file ('gzip', 'bz2', 'zstd' or 'xz'), or None.
+    """
+    try:
+        with open(file_path, 'rb') as fh:
+            start = fh.read(max(len(magic) for magic in COMPRESSION_MAGIC))
+    except OSError:
+        return None
+    for magic, name in COMPRESSION_MAGIC.items():
+        if start.startswith(magic):
+            return name
+    return None
+
+def input_extension(file_path):
+    """
+    Extension of a file name, ignoring a compression suffix ('a.tsv.gz' -> '.tsv').
+    """
+    root, extension = os.path.splitext(file_path)
+    if extension.lower() in COMPRESSION_EXTENSIONS:
+        extension = os.path.splitext(root)[1]
+    return extension
+
+def decompression_command(compression):
+    """
+    First installed command line that decompresses the format to stdout, or None.
+    """
+    for command in DECOMPRESSION_COMMANDS[compression]:
+        if shutil.which(command[0]) is not None:
+            return command
+    return None
+
+class process_reader:
+    """
+    Read the output of a decompression command as a file.
+
+    Closing the file checks the exit status of the command once its whole output has
+    been read, so a truncated or corrupt input raises an error instead of being read
+    as a shorter file. A command with output left when the file is closed (the reader
+    stopped early) is terminated.
+    """
+
+    def __init__(self, command, file_path, mode='r') -> None:
+        self.file_path = file_path
+        self.process = subprocess.Popen(command + [file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.fh = self.process.stdout if 'b' in mode else io.TextIOWrapper(self.process.stdout)
+
+    def __getattr__(self, name):
+        return getattr(self.fh, name)
+
+    def __iter__(self):
+        return iter(self.fh)
+
+    def __next__(self):
+        return next(self.fh)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.process is None:
+            return
+        process = self.process
+        self.process = None
+        # the whole output was read if the command has exited or nothing is left in the pipe
+        finished = process.poll() is not None or process.stdout.read(1) == b''
+        if not finished:
+            process.terminate()
+        self.fh.close()
+        error = process.stderr.read().decode('utf-8', 'replace').strip()
+        process.stderr.close()
+        process.wait()
+        if finished and process.returncode != 0:
+            raise ValueError(f'{self.file_path} could not be decompressed: {error}')
+
+def open_input(file_path, mode='r'):
+    """
+    Open an input file for reading, decompressing it if needed.
+
+    Parameters
+    ----------
+    file_path : str
+        Plain or compressed (gzip, bzip2, zstd, xz) file.
+    mode : str, optional (default='r')
+        'r' for text or 'rb' for bytes.
+
+    Returns
+    -------
+    file object
+        Supports iteration, ``read``/``readline`` and the ``with`` statement; not
+        seekable when the file is compressed.
+    """
+    compression = compression_type(file_path)
+    if compression is None:
+        return open(file_path, mode)
+
+    command = decompression_command(compression)
+    if command is not None:
+        return process_reader(command, file_path, mode)
+
+    text_mode = 'rb' if 'b' in mode else 'rt'
+    if compression == 'gzip':
+        return gzip.open(file_path, text_mode)
+    if compression == 'bz2':
+        return bz2.open(file_path, text_mode)
+    if compression == 'xz':
+        return lzma.open(file_path, text_mode)
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError(f'{file_path} is zstd compressed: install the zstd command line tool or the zstandard package')
+    fh = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+    return fh if 'b' in mode else io.TextIOWrapper(fh)
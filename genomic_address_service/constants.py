@@ -4,6 +4,15 @@ TEXT = 'text'
 EXTENSIONS = {}
 EXTENSIONS.update(dict.fromkeys(['.txt', '.tsv', '.mat', '.text'], TEXT))
 # '.txt' -> TEXT, '.tsv' -> TEXT, etc.
+# Compressed inputs are recognised from their first bytes; a compression suffix after
+# one of the EXTENSIONS (e.g. '.tsv.gz') is accepted
+COMPRESSION_MAGIC = {
+    b'\x1f\x8b': 'gzip',
+    b'BZh': 'bz2',
+    b'\x28\xb5\x2f\xfd': 'zstd',
+    b'\xfd7zXZ\x00': 'xz',
+}
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd', '.xz': 'xz'}
 
 PD_HEADER = [
     'query_id',
@@ -12,14 +21,39 @@ PD_HEADER = [
 ]
 
 MIN_FILE_SIZE = 32
+
+# Binary condensed distance matrix written by `gas convert`
+BINARY_MATRIX_MAGIC = b'GASDMAT\x00'
+BINARY_MATRIX_VERSION = 1
+BINARY_MATRIX_HEADER_SIZE = 512
+
+# Linkage matrix saved by `gas mcluster` and read by `gas recut` and `gas sweep`
+LINKAGE_FILE_NAME = 'linkage.bin'
+LINKAGE_FILE_MAGIC = b'GASLINK\x00'
+LINKAGE_FILE_VERSION = 1
+LINKAGE_FILE_HEADER_SIZE = 512
+
+# Tokens treated as missing values in a distance matrix (mirrors the pandas read_csv defaults)
+MATRIX_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+
+# Storage types for distances; 'auto' picks the narrowest type holding every value exactly
+DISTANCE_DTYPES = ['auto', 'uint16', 'uint32', 'float32', 'float64']
+
 CLUSTER_METHODS = ['average','complete','single']
 
+# mcluster --out-of-core: 'auto' clusters out of core when the matrix would not fit in memory
+OUT_OF_CORE_MODES = ['auto', 'always', 'never']
+
 def build_mc_run_data():
     run_data = {
         'genomic address service: de novo clustering': f'version: {__version__}',
         'analysis_start_time':'',
         'analysis_end_time':'',
         'parameters':{},
+        'out_of_core':False,
         'threshold_map':{},
         'result_file':''
     }
@@ -37,3 +71,28 @@ def build_call_run_data():
     }
 
     return run_data
+
+def build_recut_run_data():
+    run_data = {
+        'genomic address service: recut': f'version: {__version__}',
+        'analysis_start_time':'',
+        'analysis_end_time':'',
+        'parameters':{},
+        'linkage':{},
+        'threshold_map':{},
+        'result_file':''
+    }
+
+    return run_data
+
+def build_sweep_run_data():
+    run_data = {
+        'genomic address service: sweep': f'version: {__version__}',
+        'analysis_start_time':'',
+        'analysis_end_time':'',
+        'parameters':{},
+        'linkage':{},
+        'result_file':''
+    }
+
+    return run_data
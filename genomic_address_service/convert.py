@@ -0,0 +1,93 @@
+import os
+import sys
+from argparse import (ArgumentParser, ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter)
+from genomic_address_service.version import __version__
+from genomic_address_service.constants import DISTANCE_DTYPES
+from genomic_address_service.classes.matrix_reader import matrix_reader
+from genomic_address_service.binary_matrix import create_binary_matrix, finalize_binary_matrix
+from genomic_address_service.utils import is_file_ok, has_valid_header_matrix
+
+def parse_args():
+    class CustomFormatter(ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter):
+        pass
+
+    parser = ArgumentParser(
+        description="Genomic Address Service: Convert a TSV distance matrix into the binary format read by mcluster",
+        formatter_class=CustomFormatter)
+    parser.add_argument('-i','--matrix', type=str, required=True,help='TSV-formated distance matrix')
+    parser.add_argument('-o','--outfile', type=str, required=True, help='Binary distance matrix to write')
+    parser.add_argument('-s', '--sort_matrix', required=False, help='Store the samples sorted by label',
+                        action='store_true')
+    parser.add_argument('--dtype', type=str, required=False, default='float64', choices=DISTANCE_DTYPES,
+                        help='Storage type of the distances; auto picks the narrowest type that holds every value exactly')
+    parser.add_argument('--threads', type=int, required=False, default=1,
+                        help=('Number of worker processes parsing a TSV matrix; with more than one, the distances are shared '
+                              'with the workers through a temporary file of n*(n-1)/2 values in /dev/shm, or in TMPDIR '
+                              'when /dev/shm is too small'))
+    parser.add_argument('-V', '--version', action='version', version="%(prog)s " + __version__)
+    parser.add_argument('-f', '--force', required=False, help='Overwrite existing file',
+                        action='store_true')
+
+    return parser.parse_args()
+
+def convert(cmd_args):
+    matrix = cmd_args["matrix"]
+    outfile = cmd_args["outfile"]
+    sort_matrix = cmd_args["sort_matrix"]
+    force = cmd_args["force"]
+    dtype = cmd_args.get("dtype", "float64")
+    threads = cmd_args.get("threads", 1)
+
+    if not is_file_ok(matrix):
+        message = f'{matrix} does not exist or is empty'
+        raise Exception(message)
+
+    if not has_valid_header_matrix(matrix):
+        message = f'{matrix} does not appear to be a properly TSV-formatted file'
+        raise Exception(message)
+
+    if os.path.isfile(outfile) and not force:
+        message = f'{outfile} exists, if you would like to overwrite, then specify --force'
+        raise Exception(message)
+
+    if not dtype in DISTANCE_DTYPES:
+        message = f'{dtype} is not one of the accepted types {DISTANCE_DTYPES}'
+        raise Exception(message)
+
+    if threads < 1:
+        message = f'--threads must be at least 1, not {threads}'
+        raise Exception(message)
+
+    # rows are streamed straight into a memory map of the output file; with --dtype auto
+    # the file may have to be recreated with a wider type, so each type gets its own file
+    parts = {}
+    def allocate(labels, part_dtype):
+        parts[part_dtype.name] = f'{outfile}.{part_dtype.name}.part'
+        return create_binary_matrix(parts[part_dtype.name], labels, dtype=part_dtype, is_sorted=sort_matrix)
+
+    reader = matrix_reader(matrix, sort_matrix=sort_matrix, dtype=dtype, threads=threads)
+    try:
+        labels, condensed = reader.read_data(allocate=allocate)
+        part = parts[condensed.dtype.name]
+        finalize_binary_matrix(part, condensed)
+        del condensed
+        os.replace(part, outfile)
+    finally:
+        for part in parts.values():
+            if os.path.isfile(part):
+                os.remove(part)
+
+def run():
+
+    cmd_args = parse_args()
+
+    try:
+        convert(vars(cmd_args))
+
+    except Exception as exception:
+        print("Exception: " + str(exception))
+        sys.exit(1)
+
+# call main function
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,111 @@
+"""
+Linkage matrix file written by `gas mcluster` and read by `gas recut`.
+
+    bytes [0, 8)            magic string b'GASLINK\\x00'
+    bytes [8, 512)          UTF-8 JSON header, padded with spaces and terminated by a newline
+    bytes [512, labels)     linkage matrix, (n-1) x 4 little-endian float64 values (row-major)
+    bytes [labels, EOF)     UTF-8 sample labels separated by newlines
+
+The JSON header holds: version, n, method (linkage method), tree_distances (as used by
+mcluster), data_offset, data_length (bytes), labels_offset, labels_length (bytes) and
+checksum ('crc32:<hex>' of the linkage bytes). The linkage matrix has the layout of
+scipy.cluster.hierarchy.linkage, so the clusters at any threshold and the tree can be
+rebuilt from it without the distance matrix.
+"""
+
+import json
+import numpy as np
+from genomic_address_service.constants import LINKAGE_FILE_MAGIC, LINKAGE_FILE_VERSION, LINKAGE_FILE_HEADER_SIZE
+from genomic_address_service.binary_matrix import compute_checksum
+
+LINKAGE_DTYPE = np.dtype('<f8')
+
+def is_linkage_file(file_path):
+    """
+    Check whether a file starts with the linkage file magic string.
+    """
+    try:
+        with open(file_path, 'rb') as fh:
+            return fh.read(len(LINKAGE_FILE_MAGIC)) == LINKAGE_FILE_MAGIC
+    except OSError:
+        return False
+
+def write_linkage_file(file_path, linkage, labels, method, tree_distances='patristic'):
+    """
+    Write a linkage matrix and its sample labels.
+
+    Parameters
+    ----------
+    file_path : str
+        Output file.
+    linkage : np.ndarray
+        Linkage matrix of shape (n-1, 4).
+    labels : list of str
+        Sample labels, in the order of the linkage matrix leaves.
+    method : str
+        Linkage method the matrix was built with.
+    tree_distances : str, optional (default='patristic')
+        How the tree written with the matrix represents the distances.
+    """
+    n = len(labels)
+    data = np.ascontiguousarray(linkage, dtype=LINKAGE_DTYPE).reshape(max(n - 1, 0), 4)
+    labels_bytes = "\n".join(labels).encode('utf-8')
+    header = {
+        'version': LINKAGE_FILE_VERSION,
+        'n': n,
+        'method': method,
+        'tree_distances': tree_distances,
+        'data_offset': LINKAGE_FILE_HEADER_SIZE,
+        'data_length': data.nbytes,
+        'labels_offset': LINKAGE_FILE_HEADER_SIZE + data.nbytes,
+        'labels_length': len(labels_bytes),
+        'checksum': compute_checksum(data)
+    }
+    content = json.dumps(header).encode('utf-8')
+    size = LINKAGE_FILE_HEADER_SIZE - len(LINKAGE_FILE_MAGIC) - 1
+    if len(content) > size:
+        raise ValueError(f'linkage file header exceeds {LINKAGE_FILE_HEADER_SIZE} bytes')
+    with open(file_path, 'wb') as fh:
+        fh.write(LINKAGE_FILE_MAGIC + content.ljust(size) + b'\n')
+        fh.write(data.tobytes())
+        fh.write(labels_bytes)
+
+def read_linkage_file(file_path, verify=True):
+    """
+    Read a linkage file.
+
+    Parameters
+    ----------
+    file_path : str
+        Linkage file written by ``write_linkage_file``.
+    verify : bool, optional (default=True)
+        Recompute the checksum of the linkage matrix and compare it with the header.
+
+    Returns
+    -------
+    labels : list of str
+        Sample labels.
+    np.ndarray
+        Linkage matrix of shape (n-1, 4).
+    dict
+        Header fields (see module description).
+    """
+    with open(file_path, 'rb') as fh:
+        block = fh.read(LINKAGE_FILE_HEADER_SIZE)
+        if not block.startswith(LINKAGE_FILE_MAGIC) or len(block) != LINKAGE_FILE_HEADER_SIZE:
+            raise ValueError(f'{file_path} is not a linkage file')
+        header = json.loads(block[len(LINKAGE_FILE_MAGIC):].decode('utf-8'))
+        if header.get('version') != LINKAGE_FILE_VERSION:
+            raise ValueError(f'{file_path} has unsupported linkage file version {header.get("version")}')
+        n = header['n']
+        fh.seek(header['data_offset'])
+        data = fh.read(header['data_length'])
+        fh.seek(header['labels_offset'])
+        labels = fh.read(header['labels_length']).decode('utf-8').split("\n")
+
+    if len(labels) != n or len(data) != max(n - 1, 0) * 4 * LINKAGE_DTYPE.itemsize:
+        raise ValueError(f'{file_path} is truncated or has an inconsistent header')
+    stored = np.frombuffer(data, dtype=LINKAGE_DTYPE).reshape(max(n - 1, 0), 4)
+    if verify and compute_checksum(stored) != header['checksum']:
+        raise ValueError(f'{file_path} failed checksum verification')
+    return labels, stored.astype(np.float64), header
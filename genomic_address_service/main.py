@@ -5,12 +5,18 @@ import sys
 tasks = {
     'mcluster': 'De novo nested multi-level clustering',
     'call': 'Call genomic address based on existing clusterings',
+    'convert': 'Convert a TSV distance matrix into the binary mcluster format',
+    'recut': 'Cut a saved mcluster linkage at new thresholds',
+    'sweep': 'Cluster statistics at every merge height of a saved mcluster linkage',
     'test': 'Test functionality on a small dataset',
 }
 
 ordered_tasks = [
     'mcluster',
     'call',
+    'convert',
+    'recut',
+    'sweep',
     'test'
 ]
 
@@ -4,9 +4,17 @@ import json
 from datetime import datetime
 from argparse import (ArgumentParser, ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter)
 from genomic_address_service.version import __version__
-from genomic_address_service.constants import CLUSTER_METHODS, build_mc_run_data
+from genomic_address_service.constants import CLUSTER_METHODS, DISTANCE_DTYPES, LINKAGE_FILE_NAME, OUT_OF_CORE_MODES, \
+    build_mc_run_data
 from genomic_address_service.classes.multi_level_clustering import multi_level_clustering
-from genomic_address_service.utils import is_file_ok, format_threshold_map, write_threshold_map, process_thresholds, has_valid_header_matrix
+from genomic_address_service.classes.multi_method_clustering import multi_method_clustering
+from genomic_address_service.classes.nn_chain import nn_chain
+from genomic_address_service.classes.component_linkage import component_linkage
+from genomic_address_service.classes.sparse_single_linkage import sparse_single_linkage
+from genomic_address_service.binary_matrix import is_binary_matrix, read_binary_header
+from genomic_address_service.linkage_file import is_linkage_file, write_linkage_file
+from genomic_address_service.utils import is_file_ok, format_threshold_map, write_threshold_map, process_thresholds, has_valid_header_matrix, \
+    has_valid_header_pairwise_distances, get_file_header, clustering_memory, fits_in_memory
 
 def parse_args():
     class CustomFormatter(ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter):
@@ -15,9 +23,10 @@ def parse_args():
     parser = ArgumentParser(
         description="Genomic Address Service: De novo hierarchical sequence clustering",
         formatter_class=CustomFormatter)
-    parser.add_argument('-i','--matrix', type=str, required=True,help='TSV-formated distance matrix')
+    parser.add_argument('-i','--matrix', type=str, required=True,help='TSV-formated distance matrix or binary matrix from gas convert')
     parser.add_argument('-o','--outdir', type=str, required=True, help='Output directory to put cluster results')
-    parser.add_argument('-m','--method', type=str, required=False, help='cluster method [single, complete, average]',default='average')
+    parser.add_argument('-m','--method', type=str, required=False, help=('cluster method [single, complete, average], or several delimited by , '
+                              '(the matrix is read once and each method writes to its own subdirectory)'),default='average')
     parser.add_argument('-t','--thresholds', type=str, required=True, help='thresholds delimited by ,')
     parser.add_argument('-d', '--delimiter', type=str, required=False, help='delimiter desired for nomenclature code',default=".")
     parser.add_argument('-V', '--version', action='version', version="%(prog)s " + __version__)
@@ -30,6 +39,46 @@ def parse_args():
                              'to be in order to be grouped into the same cluster.'))
     parser.add_argument('-s', '--sort_matrix', required=False, help='Sort the distance matrix by label before clustering',
                         action='store_true')
+    parser.add_argument('--skip-validation', required=False, dest='skip_validation', action='store_true',
+                        help='Skip the symmetry check (text matrix) or checksum check (binary matrix) for trusted inputs')
+    parser.add_argument('--atol', type=float, required=False, default=0.0,
+                        help='Absolute tolerance allowed between the upper and lower triangles of the matrix')
+    parser.add_argument('--rtol', type=float, required=False, default=0.0,
+                        help='Relative tolerance allowed between the upper and lower triangles of the matrix')
+    parser.add_argument('--engine', type=str, required=False, default='scipy', choices=multi_level_clustering.VALID_ENGINES,
+                        help=('Linkage implementation; slink (single linkage only) streams the matrix and uses O(n) memory, '
+                              'but with tied distances its cluster IDs and tree topology can differ from scipy, so it is '
+                              'only used when selected here; nnchain (average/complete linkage only) is compiled, '
+                              'multithreaded and works in place'))
+    parser.add_argument('--dtype', type=str, required=False, default='float64', choices=DISTANCE_DTYPES,
+                        help='Storage type of the distances of a TSV matrix; auto picks the narrowest type that holds every value exactly')
+    parser.add_argument('--threads', type=int, required=False, default=1,
+                        help=('Number of worker processes parsing a TSV matrix; with more than one, the distances are shared '
+                              'with the workers through a temporary file of n*(n-1)/2 values in /dev/shm, or in TMPDIR '
+                              'when /dev/shm is too small'))
+    parser.add_argument('--components', required=False, action='store_true',
+                        help=('Cluster the connected components of the pairs within the largest threshold independently, '
+                              'in --threads worker processes (scipy and nnchain engines)'))
+    parser.add_argument('--pairwise', required=False, action='store_true',
+                        help=('--matrix is a query_id/ref_id/dist file listing every pair (in either direction), read '
+                              'straight into the condensed matrix without building the square matrix'))
+    parser.add_argument('--lower-triangle', required=False, dest='lower_triangle', action='store_true',
+                        help=('--matrix holds only the lower triangle, as PHYLIP (sample count on the first line) or TSV '
+                              '(with or without a header); each row lists the distances to the previous rows'))
+    parser.add_argument('--sparse', required=False, action='store_true',
+                        help=('--matrix is a query_id/ref_id/dist list of the pairs within the largest threshold; '
+                              'single linkage only, missing pairs are taken to be farther apart, no tree is written'))
+    parser.add_argument('--deduplicate', required=False, action='store_true',
+                        help=('Cluster one sample of each group of identical samples (same row of the matrix) and add '
+                              'the others back at distance 0, when the clusters are unchanged: single linkage, and complete '
+                              'linkage without other distances of 0 (average linkage clusters every sample)'))
+    parser.add_argument('--out-of-core', type=str, required=False, default='never', dest='out_of_core', choices=OUT_OF_CORE_MODES,
+                        help=('Cluster a square TSV or binary matrix without holding it in memory, reading a compressed '
+                              'HDF5 copy one row at a time (the outputs of the scipy engine; slows the run down); auto '
+                              'does so only when the matrix would not fit in the available memory'))
+    parser.add_argument('--update', type=str, required=False, default=None,
+                        help=(f'{LINKAGE_FILE_NAME} of a previous single linkage run (or its output directory): --matrix '
+                              'then holds only the rows of the new samples, which are added to the saved tree'))
 
     return parser.parse_args()
 
@@ -44,15 +93,83 @@ def write_clusters(clusters,num_thresholds,file,delimiter="."):
             address = f'{delimiter}'.join([str(x) for x in clusters[id]])
             fh.write("{}\n".format("\t".join(str(x) for x in ([id, address ] + clusters[id]))))
 
+def write_memberships(labels, memberships, file, delimiter="."):
+    """
+    Write an integer membership array in the same format as ``write_clusters``.
+
+    Parameters
+    ----------
+    labels : list of str
+        Sample ids, one per row of ``memberships``.
+    memberships : np.ndarray
+        Integer array of shape (n, num_thresholds).
+    file : str
+        Output file.
+    delimiter : str, optional (default=".")
+        Delimiter between the levels of the address.
+    """
+    header = ['id','address'] + [f'level_{i+1}' for i in range(memberships.shape[1])]
+    with open(file,'w') as fh:
+        fh.write("{}\n".format("\t".join(header)))
+        for id, row in zip(labels, memberships.tolist()):
+            levels = [str(x) for x in row]
+            fh.write("{}\t{}\t{}\n".format(id, delimiter.join(levels), "\t".join(levels)))
+
+def write_results(mc, outdir, method, t_map, delimiter, tree_distances, tree=True):
+    """
+    Write clusters.text, thresholds.json and (with ``tree``) tree.nwk and the linkage
+    file of a clustering to a directory.
+
+    Returns
+    -------
+    str
+        Path of clusters.text.
+    """
+    memberships = mc.get_memberships()
+
+    if len(memberships) == 0:
+        message = f'something when wrong during clustering'
+        raise Exception(message)
+
+    result_file = os.path.join(outdir,"clusters.text")
+
+    write_memberships(mc.labels, memberships, result_file, delimiter)
+
+    write_threshold_map(t_map, os.path.join(outdir,"thresholds.json"))
+
+    if tree:
+        with open(os.path.join(outdir,"tree.nwk"),'w') as fh:
+            mc.write_newick(fh)
+            fh.write("\n")
+
+        # lets gas recut cut the same tree at other thresholds without the distance matrix
+        write_linkage_file(os.path.join(outdir, LINKAGE_FILE_NAME), mc.linkage, mc.labels, method,
+                           tree_distances=tree_distances)
+
+    return result_file
+
 def mcluster(cmd_args):
     matrix = cmd_args["matrix"]
     outdir = cmd_args["outdir"]
-    method = cmd_args["method"]
+    methods = cmd_args["method"].split(',')
     thresholds = process_thresholds(cmd_args["thresholds"].split(','))
     delimiter= cmd_args["delimiter"]
     force = cmd_args["force"]
     tree_distances = cmd_args["tree_distances"]
     sort_matrix = cmd_args["sort_matrix"]
+    skip_validation = cmd_args.get("skip_validation", False)
+    atol = cmd_args.get("atol", 0.0)
+    rtol = cmd_args.get("rtol", 0.0)
+    engine = cmd_args.get("engine", "scipy")
+    dtype = cmd_args.get("dtype", "float64")
+    threads = cmd_args.get("threads", 1)
+    components = cmd_args.get("components", False)
+    sparse = cmd_args.get("sparse", False)
+    pairwise = cmd_args.get("pairwise", False)
+    lower_triangle = cmd_args.get("lower_triangle", False)
+    deduplicate = cmd_args.get("deduplicate", False)
+    out_of_core = cmd_args.get("out_of_core", "never")
+    update = cmd_args.get("update", None)
 
     run_data = build_mc_run_data()
     run_data['analysis_start_time'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
@@ -60,41 +177,168 @@ def mcluster(cmd_args):
     t_map = format_threshold_map(thresholds)
     run_data['threshold_map'] = t_map
 
-    if not is_file_ok(matrix):
-        message = f'{matrix} does not exist or is empty'
+    if sparse or pairwise:
+        if not is_file_ok(matrix):
+            message = f'{matrix} does not exist or is empty'
+            raise Exception(message)
+
+        if not has_valid_header_pairwise_distances(matrix):
+            message = f'{matrix} does not appear to be a properly TSV-formatted pairwise distance file'
+            raise Exception(message)
+
+    elif lower_triangle:
+        if not is_file_ok(matrix):
+            message = f'{matrix} does not exist or is empty'
+            raise Exception(message)
+
+    elif not is_binary_matrix(matrix):
+        if not is_file_ok(matrix):
+            message = f'{matrix} does not exist or is empty'
+            raise Exception(message)
+
+        if not has_valid_header_matrix(matrix):
+            message = f'{matrix} does not appear to be a properly TSV-formatted file'
+            raise Exception(message)
+
+    for method in methods:
+        if not method in CLUSTER_METHODS:
+            message = f'{method} is not one of the accepeted methods {CLUSTER_METHODS}'
+            raise Exception(message)
+
+    if len(set(methods)) != len(methods):
+        message = f'each method can only be given once, not {",".join(methods)}'
         raise Exception(message)
 
-    if not has_valid_header_matrix(matrix):
-        message = f'{matrix} does not appear to be a properly TSV-formatted file'
+    if not engine in multi_level_clustering.VALID_ENGINES:
+        message = f'{engine} is not one of the accepted engines {multi_level_clustering.VALID_ENGINES}'
         raise Exception(message)
 
-    if not method in CLUSTER_METHODS:
-        message = f'{method} is not one of the accepeted methods {CLUSTER_METHODS}'
+    for method in methods:
+        if engine == 'slink' and method != 'single':
+            message = f'the slink engine only supports the single method, not {method}'
+            raise Exception(message)
+
+        if engine == 'nnchain' and not method in nn_chain.VALID_METHODS:
+            message = f'the nnchain engine only supports the {list(nn_chain.VALID_METHODS)} methods, not {method}'
+            raise Exception(message)
+
+        if sparse and method != 'single':
+            message = f'--sparse only supports the single method, not {method}'
+            raise Exception(message)
+
+    if sum([sparse, pairwise, lower_triangle]) > 1:
+        message = 'only one of --sparse, --pairwise and --lower-triangle can be given'
         raise Exception(message)
 
-    if os.path.isdir(outdir) and not force:
-        message = f'{outdir} exists, if you would like to overwrite, then specify --force'
+    if sparse and components:
+        message = '--sparse and --components cannot be combined'
         raise Exception(message)
 
-    if not os.path.isdir(outdir):
-        os.makedirs(outdir, 0o755)
+    if deduplicate and (sparse or components):
+        message = '--deduplicate cannot be combined with --sparse or --components'
+        raise Exception(message)
 
-    mc = multi_level_clustering(matrix, thresholds, method, sort_matrix, tree_distances=tree_distances)
+    if components and not engine in component_linkage.VALID_ENGINES:
+        message = f'--components is only supported by the {component_linkage.VALID_ENGINES} engines, not {engine}'
+        raise Exception(message)
 
-    memberships = mc.get_memberships()
+    if update is not None:
+        if os.path.isdir(update):
+            update = os.path.join(update, LINKAGE_FILE_NAME)
 
-    if len(memberships) == 0:
-        message = f'something when wrong during clustering'
-        raise Exception(message) 
+        if not is_linkage_file(update):
+            message = f'{update} does not exist or is not a linkage file written by gas mcluster'
+            raise Exception(message)
 
-    run_data['result_file'] = os.path.join(outdir,"clusters.text")
+        if methods != ['single']:
+            message = f'--update only supports the single method, not {",".join(methods)}'
+            raise Exception(message)
 
-    write_clusters(memberships, len(thresholds), run_data['result_file'], delimiter)
+        if sparse or pairwise or lower_triangle or components or deduplicate or is_binary_matrix(matrix):
+            message = ('--update reads the rows of the new samples from a TSV matrix and cannot be combined with '
+                       '--sparse, --pairwise, --lower-triangle, --components or --deduplicate')
+            raise Exception(message)
 
-    write_threshold_map(t_map, os.path.join(outdir,"thresholds.json"))
+    if not dtype in DISTANCE_DTYPES:
+        message = f'{dtype} is not one of the accepted types {DISTANCE_DTYPES}'
+        raise Exception(message)
+
+    if not out_of_core in OUT_OF_CORE_MODES:
+        message = f'{out_of_core} is not one of the accepted out-of-core modes {OUT_OF_CORE_MODES}'
+        raise Exception(message)
+
+    square = not (sparse or pairwise or lower_triangle or deduplicate or update is not None)
+    if out_of_core == 'always' and not square:
+        message = '--out-of-core only supports square TSV and binary matrices, without --deduplicate or --update'
+        raise Exception(message)
+
+    if out_of_core == 'auto':
+        # only when the matrix would not fit: the in-memory engines are faster
+        if square and not components:
+            if is_binary_matrix(matrix):
+                n = read_binary_header(matrix)['n']
+            else:
+                n = len(get_file_header(matrix).rstrip("\r\n").split("\t")) - 1
+            out_of_core = 'never' if fits_in_memory(clustering_memory(n, dtype)) else 'always'
+        else:
+            out_of_core = 'never'
+    out_of_core = out_of_core == 'always'
+    run_data['out_of_core'] = out_of_core
+
+    if out_of_core and (atol != 0 or rtol != 0) and not skip_validation:
+        message = '--out-of-core only supports exact symmetry checks, not --atol/--rtol'
+        raise Exception(message)
+
+    if threads < 1:
+        message = f'--threads must be at least 1, not {threads}'
+        raise Exception(message)
+
+    if atol < 0 or rtol < 0:
+        message = f'tolerances must not be negative (atol={atol}, rtol={rtol})'
+        raise Exception(message)
+
+    if os.path.isdir(outdir) and not force:
+        message = f'{outdir} exists, if you would like to overwrite, then specify --force'
+        raise Exception(message)
+
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir, 0o755)
 
-    with open(os.path.join(outdir,"tree.nwk"),'w') as fh:
-        fh.write(f"{mc.newick}\n")
+    if len(methods) > 1 and not out_of_core:
+        # the matrix is read once and clustered with every method
+        mm = multi_method_clustering(matrix, thresholds, methods, sort_matrix, tree_distances=tree_distances,
+                                     skip_validation=skip_validation, atol=atol, rtol=rtol, engine=engine,
+                                     dtype=dtype, threads=threads, components=components,
+                                     pairwise=pairwise, lower_triangle=lower_triangle, deduplicate=deduplicate)
+        run_data['result_file'] = {}
+        for method in methods:
+            method_dir = os.path.join(outdir, method)
+            if not os.path.isdir(method_dir):
+                os.makedirs(method_dir, 0o755)
+            run_data['result_file'][method] = write_results(mm.results[method], method_dir, method, t_map, delimiter,
+                                                            tree_distances)
+    elif len(methods) > 1:
+        # out of core, each method reads the matrix
+        run_data['result_file'] = {}
+        for method in methods:
+            method_dir = os.path.join(outdir, method)
+            if not os.path.isdir(method_dir):
+                os.makedirs(method_dir, 0o755)
+            mc = multi_level_clustering(matrix, thresholds, method, sort_matrix, tree_distances=tree_distances,
+                                        skip_validation=skip_validation, engine=engine, dtype=dtype, threads=threads,
+                                        out_of_core=True)
+            run_data['result_file'][method] = write_results(mc, method_dir, method, t_map, delimiter, tree_distances)
+    else:
+        method = methods[0]
+        if sparse:
+            mc = sparse_single_linkage(matrix, thresholds, sort_matrix=sort_matrix)
+        else:
+            mc = multi_level_clustering(matrix, thresholds, method, sort_matrix, tree_distances=tree_distances,
+                                        skip_validation=skip_validation, atol=atol, rtol=rtol, engine=engine,
+                                        dtype=dtype, threads=threads, components=components,
+                                        pairwise=pairwise, lower_triangle=lower_triangle, deduplicate=deduplicate,
+                                        out_of_core=out_of_core, update=update)
+        run_data['result_file'] = write_results(mc, outdir, method, t_map, delimiter, tree_distances, tree=not sparse)
 
     run_data['analysis_end_time'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
 
@@ -0,0 +1,121 @@
+"""
+Newick export of SciPy linkage matrices.
+
+The output is byte-for-byte the tree that scikit-bio's
+``TreeNode.from_linkage_matrix(Z, labels)`` writes (with single quotes removed),
+without building a tree object: branch lengths are computed from the linkage
+matrix with the same floating point operations and the tree is written with an
+explicit stack, so deep trees do not hit the recursion limit.
+"""
+
+import numpy as np
+from numba import jit
+
+NEWICK_OPERATORS = set(",:_;()[]")
+WRITE_BUFFER_SIZE = 1 << 16
+
+@jit(nopython=True, cache=True)
+def _branch_lengths(Z, path_lengths):
+    """
+    Branch length above each node (samples 0..n-1, then one node per merge).
+
+    As in scikit-bio, a child's length is the half height of the merge minus its
+    distance to a tip, measured by following first children down to a tip and
+    summing their lengths from the top.
+    """
+    n = Z.shape[0] + 1
+    lengths = np.zeros(2 * n - 1, dtype=np.float64)
+    first_child = np.full(2 * n - 1, -1, dtype=np.int64)
+    for k in range(n - 1):
+        for c in range(2):
+            child = int(Z[k, c])
+            distance = 0.0
+            node = child
+            while first_child[node] != -1:
+                node = first_child[node]
+                distance += lengths[node]
+            lengths[child] = path_lengths[k] - distance
+        first_child[n + k] = int(Z[k, 0])
+    return lengths
+
+def branch_lengths(Z, tree_distances='patristic'):
+    """
+    Compute the branch lengths of the tree of a linkage matrix.
+
+    Parameters
+    ----------
+    Z : np.ndarray
+        Linkage matrix of shape (n-1, 4). It is not modified.
+    tree_distances : str, optional (default='patristic')
+        'patristic': merge heights are the sum of the branch lengths between the
+        merged tips (each side gets half). 'cophenetic': merge heights are the
+        height of the common ancestor (distances are doubled first).
+
+    Returns
+    -------
+    np.ndarray
+        float64 array of length 2n-1 indexed like the linkage matrix nodes. The
+        entry of the root is not used.
+    """
+    heights = np.asarray(Z[:, 2], dtype=np.float64)
+    if tree_distances == 'cophenetic':
+        heights = heights * 2
+    elif tree_distances != 'patristic':
+        raise ValueError(f'Invalid tree_distances value [{tree_distances}]. Must be one of [\'patristic\', \'cophenetic\']')
+    return _branch_lengths(np.ascontiguousarray(Z, dtype=np.float64), heights / 2)
+
+def format_label(label):
+    """
+    Newick form of a tip label as written by scikit-bio once single quotes are removed:
+    labels containing Newick operators keep their spaces (they were quoted), others have
+    spaces replaced by underscores.
+    """
+    label = str(label)
+    if any(t in NEWICK_OPERATORS for t in label):
+        return label.replace("'", "")
+    return label.replace("'", "").replace(" ", "_")
+
+def write_newick(fh, Z, labels, lengths):
+    """
+    Write the tree of a linkage matrix to a text stream in Newick format.
+
+    Parameters
+    ----------
+    fh : file object
+        Output stream. Nothing is written after the final ';'.
+    Z : np.ndarray
+        Linkage matrix of shape (n-1, 4).
+    labels : list of str
+        Tip labels.
+    lengths : np.ndarray
+        Branch lengths from ``branch_lengths``.
+    """
+    n = len(labels)
+    root = 2 * n - 2
+    children = np.asarray(Z[:, :2], dtype=np.int64).tolist()
+    lengths = lengths.tolist()
+    close = -2 # node v is closed by the token close - v
+
+    parts = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node >= n:
+            left, right = children[node - n]
+            parts.append("(")
+            stack.extend((close - node, right, -1, left))
+            continue
+        if node == -1:
+            parts.append(",")
+            continue
+        if node >= 0:
+            label = format_label(labels[node])
+            parts.append(label if node == root else f"{label}:{lengths[node]}")
+        else:
+            node = close - node
+            parts.append(")" if node == root else f"):{lengths[node]}")
+        if len(parts) >= WRITE_BUFFER_SIZE:
+            fh.write("".join(parts))
+            parts = []
+    parts.append(";")
+    fh.write("".join(parts))
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+from datetime import datetime
+from argparse import (ArgumentParser, ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter)
+import numpy as np
+from genomic_address_service.version import __version__
+from genomic_address_service.constants import LINKAGE_FILE_NAME, build_recut_run_data
+from genomic_address_service.classes.multi_level_clustering import multi_level_clustering
+from genomic_address_service.linkage_file import is_linkage_file, read_linkage_file
+from genomic_address_service.mcluster import write_memberships
+from genomic_address_service.newick import branch_lengths, write_newick
+from genomic_address_service.utils import cut_linkage, format_threshold_map, write_threshold_map, process_thresholds
+
+def parse_args():
+    class CustomFormatter(ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter):
+        pass
+
+    parser = ArgumentParser(
+        description="Genomic Address Service: Cut a saved mcluster linkage at new thresholds",
+        formatter_class=CustomFormatter)
+    parser.add_argument('-i','--linkage', type=str, required=True,
+                        help=f'{LINKAGE_FILE_NAME} written by mcluster, or the mcluster output directory')
+    parser.add_argument('-o','--outdir', type=str, required=True, help='Output directory to put cluster results')
+    parser.add_argument('-t','--thresholds', type=str, required=True, help='thresholds delimited by ,')
+    parser.add_argument('-d', '--delimiter', type=str, required=False, help='delimiter desired for nomenclature code',default=".")
+    parser.add_argument('--tree', required=False, action='store_true', help='Also write tree.nwk')
+    parser.add_argument('--tree-distances', type=str, required=False, default=None, dest='tree_distances',
+                        choices=multi_level_clustering.VALID_TREE_DISTANCES,
+                        help='Distances represented by tree.nwk (see gas mcluster); defaults to the value used by mcluster')
+    parser.add_argument('-V', '--version', action='version', version="%(prog)s " + __version__)
+    parser.add_argument('-f', '--force', required=False, help='Overwrite existing directory',
+                        action='store_true')
+
+    return parser.parse_args()
+
+def recut(cmd_args):
+    linkage_file = cmd_args["linkage"]
+    outdir = cmd_args["outdir"]
+    thresholds = process_thresholds(cmd_args["thresholds"].split(','))
+    delimiter = cmd_args["delimiter"]
+    force = cmd_args["force"]
+    tree = cmd_args.get("tree", False)
+    tree_distances = cmd_args.get("tree_distances", None)
+
+    run_data = build_recut_run_data()
+    run_data['analysis_start_time'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    run_data['parameters'] = cmd_args
+    t_map = format_threshold_map(thresholds)
+    run_data['threshold_map'] = t_map
+
+    if os.path.isdir(linkage_file):
+        linkage_file = os.path.join(linkage_file, LINKAGE_FILE_NAME)
+
+    if not is_linkage_file(linkage_file):
+        message = f'{linkage_file} does not exist or is not a linkage file written by gas mcluster'
+        raise Exception(message)
+
+    if tree_distances is not None and not tree_distances in multi_level_clustering.VALID_TREE_DISTANCES:
+        message = f'{tree_distances} is not one of the accepted tree distances {multi_level_clustering.VALID_TREE_DISTANCES}'
+        raise Exception(message)
+
+    if os.path.isdir(outdir) and not force:
+        message = f'{outdir} exists, if you would like to overwrite, then specify --force'
+        raise Exception(message)
+
+    labels, linkage, header = read_linkage_file(linkage_file)
+    run_data['linkage'] = {'file': linkage_file, 'method': header['method'], 'n': header['n']}
+
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir, 0o755)
+
+    memberships = cut_linkage(linkage, np.asarray(thresholds, dtype=np.float64))
+    run_data['result_file'] = os.path.join(outdir,"clusters.text")
+    write_memberships(labels, memberships, run_data['result_file'], delimiter)
+
+    write_threshold_map(t_map, os.path.join(outdir,"thresholds.json"))
+
+    if tree:
+        if tree_distances is None:
+            tree_distances = header['tree_distances']
+        with open(os.path.join(outdir,"tree.nwk"),'w') as fh:
+            write_newick(fh, linkage, labels, branch_lengths(linkage, tree_distances=tree_distances))
+            fh.write("\n")
+
+    run_data['analysis_end_time'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
+    with open(os.path.join(outdir,"run.json"),'w') as fh:
+        fh.write(json.dumps(run_data, indent=4))
+
+def run():
+
+    cmd_args = parse_args()
+
+    try:
+        recut(vars(cmd_args))
+
+    except Exception as exception:
+        print("Exception: " + str(exception))
+        sys.exit(1)
+
+# call main function
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+from datetime import datetime
+from argparse import (ArgumentParser, ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter)
+from genomic_address_service.version import __version__
+from genomic_address_service.constants import LINKAGE_FILE_NAME, build_sweep_run_data
+from genomic_address_service.classes.linkage_sweep import linkage_sweep
+from genomic_address_service.linkage_file import is_linkage_file, read_linkage_file
+
+def parse_args():
+    class CustomFormatter(ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter):
+        pass
+
+    parser = ArgumentParser(
+        description="Genomic Address Service: Cluster statistics at every merge height of a saved mcluster linkage",
+        formatter_class=CustomFormatter)
+    parser.add_argument('-i','--linkage', type=str, required=True,
+                        help=f'{LINKAGE_FILE_NAME} written by mcluster, or the mcluster output directory')
+    parser.add_argument('-o','--outdir', type=str, required=True, help='Output directory to put the sweep results')
+    parser.add_argument('-V', '--version', action='version', version="%(prog)s " + __version__)
+    parser.add_argument('-f', '--force', required=False, help='Overwrite existing directory',
+                        action='store_true')
+
+    return parser.parse_args()
+
+def write_sweep(result, file):
+    """
+    Write the statistics of a ``linkage_sweep`` as a TSV file, one row per height.
+    """
+    with open(file,'w') as fh:
+        fh.write("{}\n".format("\t".join(result.COLUMNS)))
+        for row in result.get_table():
+            fh.write("{}\n".format("\t".join(str(x) for x in row)))
+
+def sweep(cmd_args):
+    linkage_file = cmd_args["linkage"]
+    outdir = cmd_args["outdir"]
+    force = cmd_args["force"]
+
+    run_data = build_sweep_run_data()
+    run_data['analysis_start_time'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    run_data['parameters'] = cmd_args
+
+    if os.path.isdir(linkage_file):
+        linkage_file = os.path.join(linkage_file, LINKAGE_FILE_NAME)
+
+    if not is_linkage_file(linkage_file):
+        message = f'{linkage_file} does not exist or is not a linkage file written by gas mcluster'
+        raise Exception(message)
+
+    if os.path.isdir(outdir) and not force:
+        message = f'{outdir} exists, if you would like to overwrite, then specify --force'
+        raise Exception(message)
+
+    labels, linkage, header = read_linkage_file(linkage_file)
+    run_data['linkage'] = {'file': linkage_file, 'method': header['method'], 'n': header['n']}
+
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir, 0o755)
+
+    run_data['result_file'] = os.path.join(outdir,"sweep.tsv")
+    write_sweep(linkage_sweep(linkage, len(labels)), run_data['result_file'])
+
+    run_data['analysis_end_time'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
+    with open(os.path.join(outdir,"run.json"),'w') as fh:
+        fh.write(json.dumps(run_data, indent=4))
+
+def run():
+
+    cmd_args = parse_args()
+
+    try:
+        sweep(vars(cmd_args))
+
+    except Exception as exception:
+        print("Exception: " + str(exception))
+        sys.exit(1)
+
+# call main function
+if __name__ == '__main__':
+    run()
@@ -12,16 +12,43 @@ import re
 import json
 
 from genomic_address_service.constants import MIN_FILE_SIZE
+from genomic_address_service.compression import compression_type, open_input
 
 
 def get_file_length(f):
-    return int(os.popen(f'wc -l {f}').read().split()[0])
+    """
+    Number of newline characters in a (possibly compressed) file, like ``wc -l``.
+    """
+    num_lines = 0
+    with open_input(f, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            num_lines += block.count(b'\n')
+    return num_lines
 
 def get_file_header(f):
-    return str(os.popen(f'head -n1 {f}').read())
+    with open_input(f) as fh:
+        return fh.readline()
 
 def get_file_footer(f):
-    return str(os.popen(f'tail -n1 {f}').read())
+    """
+    Last line of a (possibly compressed) file; a plain file is read from the end.
+    """
+    if compression_type(f) is None:
+        with open(f, 'rb') as fh:
+            end = fh.seek(0, os.SEEK_END)
+            block = b''
+            while end > 0 and block.rstrip(b'\n').count(b'\n') == 0:
+                start = max(0, end - (1 << 16))
+                fh.seek(start)
+                block = fh.read(end - start) + block
+                end = start
+    else:
+        block = b''
+        with open_input(f, 'rb') as fh:
+            for line in fh:
+                block = line
+    lines = block.rstrip(b'\n').split(b'\n')
+    return lines[-1].decode('utf-8') + ('\n' if block.endswith(b'\n') else '')
 
 def is_matrix_valid(f):
     num_lines = get_file_length(f)
@@ -31,15 +58,20 @@ def is_matrix_valid(f):
     return False
 
 def is_file_ok(f):
-    status = True
+    """
+    Check that a (possibly compressed) file exists, has at least two lines and
+    MIN_FILE_SIZE bytes of content. Only the start of the file is read.
+    """
     if not os.path.isfile(f):
-        status = False
-    elif get_file_length(f) < 2:
-        status = False
-    elif os.path.getsize(f) < MIN_FILE_SIZE:
-        status = False
-
-    return status
+        return False
+    start = b''
+    with open_input(f, 'rb') as fh:
+        while start.count(b'\n') < 2 or len(start) < MIN_FILE_SIZE:
+            block = fh.read(1 << 16)
+            if len(block) == 0:
+                return False
+            start += block
+    return True
 
 def format_threshold_map(thresholds):
     data = {}
@@ -98,7 +130,7 @@ def has_valid_header_matrix(file_path):
     """
     MIN_TOKENS = 2
 
-    with open(file_path) as tsv_file:
+    with open_input(file_path) as tsv_file:
         header = tsv_file.readline()
 
         valid = len(header.split("\t")) >= MIN_TOKENS
@@ -113,7 +145,7 @@ def has_valid_header_pairwise_distances(file_path):
     """
     MIN_TOKENS = 3
 
-    with open(file_path) as tsv_file:
+    with open_input(file_path) as tsv_file:
         header = tsv_file.readline()
 
         valid = len(header.split("\t")) == MIN_TOKENS
@@ -129,8 +161,235 @@ def has_valid_header_cluster(file_path):
     """
     MIN_TOKENS = 2
 
-    with open(file_path) as tsv_file:
+    with open_input(file_path) as tsv_file:
         header = tsv_file.readline()
 
         valid = len(header.split("\t")) >= MIN_TOKENS
         return valid
+
+def condensed_size(n):
+    """
+    Number of entries in the condensed (upper triangle) form of an (n x n) distance matrix.
+    """
+    return n * (n - 1) // 2
+
+def clustering_memory(n, dtype='float64'):
+    """
+    Estimated bytes needed to cluster n samples in memory: the condensed vector stored
+    as ``dtype`` ('auto' starts as uint16) plus a float64 working copy of it.
+    """
+    itemsize = np.dtype(np.uint16 if dtype == 'auto' else dtype).itemsize
+    return condensed_size(n) * (itemsize + np.dtype(np.float64).itemsize)
+
+def fits_in_memory(nbytes):
+    """
+    Whether nbytes are available in memory (``psutil.virtual_memory().available``).
+    """
+    return nbytes <= psutil.virtual_memory().available
+
+def condensed_index(n, i, j):
+    """
+    Position of the pair (i, j) with i < j in a condensed distance vector of n items,
+    using the row-major upper triangle layout expected by scipy. Works element-wise on
+    NumPy integer arrays.
+    """
+    return n * i - (i * (i + 1)) // 2 + (j - i - 1)
+
+def permute_condensed(condensed, n, order):
+    """
+    Reorder the samples of a condensed distance vector.
+
+    Parameters
+    ----------
+    condensed : np.ndarray
+        Condensed distance vector of n samples.
+    n : int
+        Number of samples.
+    order : sequence of int
+        order[k] is the current index of the sample that should be placed at position k.
+
+    Returns
+    -------
+    np.ndarray
+        A new condensed vector with the samples in the requested order.
+    """
+    order = np.asarray(order, dtype=np.int64)
+    permuted = np.empty(condensed_size(n), dtype=condensed.dtype)
+    start = 0
+    for k in range(n - 1):
+        i = order[k]
+        others = order[k + 1:]
+        lo = np.minimum(others, i)
+        hi = np.maximum(others, i)
+        permuted[start:start + n - k - 1] = condensed[condensed_index(n, lo, hi)]
+        start += n - k - 1
+    return permuted
+
+@jit(nopython=True, cache=True)
+def gather_condensed(D, n, members):
+    """
+    Condensed distance vector of a subset of samples (in increasing order).
+    """
+    m = len(members)
+    sub = np.empty(m * (m - 1) // 2, dtype=D.dtype)
+    k = 0
+    for a in range(m):
+        i = members[a]
+        start = n * i - (i * (i + 1)) // 2 - i - 1
+        for b in range(a + 1, m):
+            sub[k] = D[start + members[b]]
+            k += 1
+    return sub
+
+@jit(nopython=True, cache=True)
+def find_root(parent, i):
+    """
+    Root of element i in a union-find forest, halving the path on the way.
+    """
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+@jit(nopython=True, cache=True)
+def label_linkage(Z, n):
+    """
+    Renumber the clusters of a linkage matrix in place, the way SciPy does.
+
+    Z[k, 0] and Z[k, 1] may hold any sample of each merged cluster; they are replaced
+    by the cluster ids (samples 0..n-1, merge k creates cluster n+k) with the smaller
+    id first, and Z[k, 3] is set to the size of the new cluster. Rows must already be
+    in merge order.
+    """
+    parent = np.arange(2 * n - 1)
+    sizes = np.ones(2 * n - 1, dtype=np.int64)
+    for k in range(n - 1):
+        x = int(Z[k, 0])
+        y = int(Z[k, 1])
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        while parent[y] != y:
+            parent[y] = parent[parent[y]]
+            y = parent[y]
+        if x > y:
+            x, y = y, x
+        node = n + k
+        parent[x] = node
+        parent[y] = node
+        sizes[node] = sizes[x] + sizes[y]
+        Z[k, 0] = x
+        Z[k, 1] = y
+        Z[k, 3] = sizes[node]
+
+@jit(nopython=True, cache=True)
+def cut_linkage(Z, thresholds):
+    """
+    Flat clusters of a linkage matrix at several distance thresholds in one pass.
+
+    Equivalent to calling ``scipy.cluster.hierarchy.fcluster(Z, t, criterion='distance')``
+    for every threshold t, including the numbering of the clusters: the tree is walked
+    depth first from the root (left subtree, right subtree, then leaf children) and
+    clusters are numbered from 1 in the order they are first reached.
+
+    Parameters
+    ----------
+    Z : np.ndarray
+        Linkage matrix of shape (n-1, 4).
+    thresholds : np.ndarray
+        Distance thresholds (float64).
+
+    Returns
+    -------
+    np.ndarray
+        int32 array of shape (n, len(thresholds)) with the cluster id of each sample
+        at each threshold.
+    """
+    n = Z.shape[0] + 1
+    num_levels = len(thresholds)
+    memberships = np.zeros((n, num_levels), dtype=np.int32)
+    if n == 1:
+        memberships[0, :] = 1
+        return memberships
+
+    # largest merge distance within each subtree
+    max_dist = np.empty(n - 1, dtype=np.float64)
+    for i in range(n - 1):
+        d = Z[i, 2]
+        for child in (int(Z[i, 0]), int(Z[i, 1])):
+            if child >= n and max_dist[child - n] > d:
+                d = max_dist[child - n]
+        max_dist[i] = d
+
+    leader = np.full(num_levels, -1, dtype=np.int64)
+    num_clusters = np.zeros(num_levels, dtype=np.int32)
+    visited = np.zeros(n - 1, dtype=np.bool_)
+    stack = np.empty(n, dtype=np.int64)
+    k = 0
+    stack[0] = n - 2
+    while k >= 0:
+        node = stack[k]
+        left = int(Z[node, 0])
+        right = int(Z[node, 1])
+
+        if not visited[node]:
+            visited[node] = True
+            for level in range(num_levels):
+                if leader[level] == -1 and max_dist[node] <= thresholds[level]:
+                    leader[level] = node
+                    num_clusters[level] += 1
+
+        if left >= n and not visited[left - n]:
+            k += 1
+            stack[k] = left - n
+            continue
+        if right >= n and not visited[right - n]:
+            k += 1
+            stack[k] = right - n
+            continue
+
+        for child in (left, right):
+            if child < n:
+                for level in range(num_levels):
+                    if leader[level] == -1:
+                        num_clusters[level] += 1
+                    memberships[child, level] = num_clusters[level]
+
+        for level in range(num_levels):
+            if leader[level] == node:
+                leader[level] = -1
+        k -= 1
+
+    return memberships
+
+def fits_dtype(values, dtype):
+    """
+    Check whether every value of a float64 array is represented exactly by a dtype.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        float64 values.
+    dtype : np.dtype
+        Candidate storage type (unsigned integer or floating point).
+
+    Returns
+    -------
+    bool
+    """
+    dtype = np.dtype(dtype)
+    if values.size == 0 or dtype == np.float64:
+        return True
+    if dtype.kind == 'u':
+        info = np.iinfo(dtype)
+        return bool(np.all((values >= 0) & (values <= info.max) & (np.floor(values) == values)))
+    return bool(np.all(values.astype(dtype).astype(np.float64) == values))
+
+def narrowest_dtype(values, candidates):
+    """
+    First dtype of ``candidates`` (ordered from narrowest) that holds all values exactly.
+    """
+    for dtype in candidates:
+        if fits_dtype(values, dtype):
+            return np.dtype(dtype)
+    return np.dtype(np.float64)
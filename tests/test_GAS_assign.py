@@ -1,5 +1,6 @@
 import pytest
 import pandas as pd
+import numpy as np
 from tempfile import NamedTemporaryFile
 import os
 import textwrap
@@ -211,3 +212,105 @@ def test_add_memberships_lookup_add_double_digit():
     assert assignment.memberships_lookup["15"] == ['O']
     assert assignment.memberships_lookup["15.15"] == ['O']
     assert assignment.memberships_lookup["15.15.15"] == ['O']
+
+def test_parse_addresses(mock_dist_file, mock_membership_file):
+    threshold_map = {"level_0": 0.1, "level_1": 0.2}
+    a = assign(dist_file=mock_dist_file, membership_file=mock_membership_file, threshold_map=threshold_map, linkage_method='single', sample_col='id', address_col='address_levels_notsplit', batch_size=100, delimiter=".")
+    assert a.sample_ids == ['r1', 'r2', 'q1']
+    assert a.addresses[:a.num_samples].tolist() == [[1, 1], [2, 1], [1, 1]]
+
+    # integer addresses are parsed at once, samples listed twice keep their last address
+    samples = pd.Series(['A', 'B', 'A', 'C'])
+    sample_ids, addresses = a.parse_addresses(samples, pd.Series(['1.1', '1.2', '2.3', '+2.04']), '.')
+    assert sample_ids == ['A', 'B', 'C']
+    assert addresses.tolist() == [[2, 3], [1, 2], [2, 4]]
+    assert all(len(ids) == 0 for ids in a.error_samples.values())
+
+    # the same addresses as int() reads them
+    sample_ids, addresses = a.parse_addresses(samples, pd.Series(['1.1', '1. 2', '2.3', '2.1_0']), '.')
+    assert sample_ids == ['A', 'B', 'C']
+    assert addresses.tolist() == [[2, 3], [1, 2], [2, 10]]
+
+    sample_ids, addresses = a.parse_addresses(pd.Series(['A', 'B', 'C', 'D', 'E']),
+                                              pd.Series(['1', '1.1.1', '1.1', '1.1e3', '1.x']), '.')
+    assert sample_ids == ['C']
+    assert addresses.tolist() == [[1, 1]]
+    assert a.error_samples == {a.ERROR_MISSING_DELIMITER: ['A'], a.ERROR_LENGTH: ['B'], a.ERROR_NON_INTEGER: ['D', 'E']}
+
+def test_assign_without_references(mock_membership_file):
+    content = textwrap.dedent(
+        """\
+        query_id\tref_id\tdist
+        q1\tq1\t0.0
+        q1\tr3\t0.1
+        """
+    )
+    with NamedTemporaryFile('w+', suffix='.tsv', delete=False) as tmp:
+        tmp.write(content)
+    threshold_map = {"level_0": 0.1, "level_1": 0.2}
+    try:
+        a = assign(dist_file=tmp.name, membership_file=mock_membership_file, threshold_map=threshold_map, linkage_method='single', sample_col='id', address_col='address_levels_notsplit', batch_size=100, delimiter=".")
+    finally:
+        os.unlink(tmp.name)
+    # no distance to a clustered sample: new clusters at every level
+    assert a.memberships_dict == {'r1': '1.1', 'r2': '2.1', 'q1': '3.2'}
+
+def test_get_threshold_idx(mock_dist_file, mock_membership_file):
+    threshold_map = {"level_0": 0.2, "level_1": 0.1}
+    a = assign(dist_file=mock_dist_file, membership_file=mock_membership_file, threshold_map=threshold_map, linkage_method='single', sample_col='id', address_col='address_levels_notsplit', batch_size=100, delimiter=".")
+    assert [a.get_threshold_idx(d) for d in [0.0, 0.1, 0.15, 0.2, 0.3]] == [1, 1, 0, 0, 0]
+    # thresholds out of order are scanned
+    a.thresholds = [0.1, 0.2]
+    a.negated_thresholds = None
+    assert [a.get_threshold_idx(d) for d in [0.0, 0.15, 0.3]] == [1, 1, 0]
+
+@pytest.mark.parametrize("linkage_method", ["single", "average", "complete"])
+def test_get_cluster_level(mock_dist_file, mock_membership_file, linkage_method):
+    threshold_map = {"level_0": 5.0, "level_1": 3.0, "level_2": 1.0}
+    a = assign(dist_file=mock_dist_file, membership_file=mock_membership_file, threshold_map=threshold_map, linkage_method=linkage_method, sample_col='id', address_col='address_levels_notsplit', batch_size=100, delimiter=".")
+    rng = np.random.default_rng(3)
+    addresses = rng.integers(1, 4, size=(60, 3))
+    a.process_memberships([f's{i}' for i in range(len(addresses))], addresses)
+    for _ in range(50):
+        row_dists = rng.integers(0, 7, size=len(addresses)).astype(float)
+        row_dists[rng.random(len(addresses)) < 0.3] = np.nan
+        row = int(rng.integers(len(addresses)))
+        row_dists[row] = rng.integers(0, 6)
+        thresh_idx = a.get_threshold_idx(row_dists[row])
+        expected = -1
+        for level in range(thresh_idx, -1, -1):
+            members = np.all(addresses[:, :level + 1] == addresses[row, :level + 1], axis=1)
+            dists = row_dists[members]
+            dists = dists[~np.isnan(dists)]
+            summary = a.get_dist_summary(dists)
+            if linkage_method == 'single' or summary[{'average': 'mean', 'complete': 'max'}[linkage_method]] <= a.thresholds[level]:
+                expected = level
+                break
+        assert a.get_cluster_level(row_dists.copy(), row, thresh_idx) == expected
+
+def test_assign_nearest(tmp_path):
+    # The single linkage fast path gives the same addresses as the cluster scan
+    rng = np.random.default_rng(11)
+    threshold_map = {"level_0": 6, "level_1": 3, "level_2": 1}
+    for trial in range(10):
+        membership_file = tmp_path / "clusters.tsv"
+        dist_file = tmp_path / "dists.tsv"
+        num_refs = int(rng.integers(2, 20))
+        addresses = rng.integers(1, 4, size=(num_refs, 3))
+        membership_file.write_text("id\taddress\n" + "".join(f"r{i}\t{'.'.join(map(str, a))}\n" for i, a in enumerate(addresses)))
+        labels = [f"r{i}" for i in range(num_refs)] + [f"q{i}" for i in range(int(rng.integers(1, 12)))]
+        rows = ["query_id\tref_id\tdist\n"]
+        for query in labels[num_refs:]:
+            for ref in rng.permutation(labels):
+                if rng.random() < 0.8:
+                    rows.append(f"{query}\t{ref}\t{rng.integers(0, 8)}\n")
+            rows.append(f"{query}\t{rng.choice(labels)}\t{rng.integers(0, 8)}\n")
+        dist_file.write_text("".join(rows))
+        a = assign(dist_file=str(dist_file), membership_file=str(membership_file), threshold_map=threshold_map, linkage_method='single', sample_col='id', address_col='address', batch_size=3, delimiter=".")
+        b = assign(dist_file=str(dist_file), membership_file=str(membership_file), threshold_map=threshold_map, linkage_method='average', sample_col='id', address_col='address', batch_size=3, delimiter=".")
+        b.linkage_method = 'single'
+        b.process_memberships(b.sample_ids[:num_refs], b.addresses[:num_refs])
+        b.init_nomenclature_tracker()
+        b.assign_batches(n_records=3)
+        assert a.memberships_dict == b.memberships_dict
+        assert a.query_ids == b.query_ids
@@ -0,0 +1,132 @@
+import pytest
+import csv
+import numpy as np
+from os import path
+from genomic_address_service.binary_matrix import (
+    is_binary_matrix, write_binary_matrix, read_binary_matrix, read_binary_header
+)
+from genomic_address_service.classes.matrix_reader import matrix_reader
+from genomic_address_service.convert import convert
+from genomic_address_service.mcluster import mcluster
+
+def get_path(location):
+    directory = path.dirname(path.abspath(__file__))
+    return path.join(directory, location)
+
+def test_write_read_round_trip(tmp_path):
+    out = str(tmp_path / "matrix.gdm")
+    condensed = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    write_binary_matrix(out, ['A', 'B', 'C', 'D'], condensed)
+
+    assert is_binary_matrix(out)
+    header = read_binary_header(out)
+    assert header['n'] == 4
+    assert header['dtype'] == '<f8'
+    assert header['checksum'].startswith('crc32:')
+
+    labels, values = read_binary_matrix(out)
+    assert labels == ['A', 'B', 'C', 'D']
+    assert isinstance(values, np.memmap)
+    assert values.tolist() == condensed.tolist()
+
+def test_read_sorted_copy(tmp_path):
+    out = str(tmp_path / "matrix.gdm")
+    # C-A: 2, C-B: 4, A-B: 1
+    write_binary_matrix(out, ['C', 'A', 'B'], np.array([2.0, 4.0, 1.0]))
+    labels, values = read_binary_matrix(out, sort_matrix=True)
+    assert labels == ['A', 'B', 'C']
+    assert values.tolist() == [1.0, 2.0, 4.0]
+
+def test_checksum_mismatch(tmp_path):
+    out = str(tmp_path / "matrix.gdm")
+    write_binary_matrix(out, ['A', 'B', 'C'], np.array([1.0, 2.0, 3.0]))
+    header = read_binary_header(out)
+    with open(out, 'r+b') as fh:
+        fh.seek(header['data_offset'])
+        fh.write(np.array([9.0]).tobytes())
+
+    with pytest.raises(ValueError, match="failed checksum verification"):
+        read_binary_matrix(out)
+
+def test_convert_matches_text(tmp_path):
+    out = str(tmp_path / "basic.gdm")
+    convert({"matrix": get_path("data/matrix/basic.tsv"), "outfile": out, "sort_matrix": False, "force": False})
+
+    expected_labels, expected = matrix_reader(get_path("data/matrix/basic.tsv")).read_data()
+    labels, values = read_binary_matrix(out)
+    assert labels == expected_labels
+    assert np.array_equal(values, expected)
+
+    with pytest.raises(Exception) as exception:
+        convert({"matrix": get_path("data/matrix/basic.tsv"), "outfile": out, "sort_matrix": False, "force": False})
+    assert str(exception.value) == f"{out} exists, if you would like to overwrite, then specify --force"
+
+def test_mcluster_binary_input(tmp_path):
+    binary = str(tmp_path / "basic.gdm")
+    convert({"matrix": get_path("data/matrix/basic.tsv"), "outfile": binary, "sort_matrix": False, "force": False})
+
+    results = {}
+    for name, matrix in [("text", get_path("data/matrix/basic.tsv")), ("binary", binary)]:
+        args = {"matrix": matrix,
+                "outdir": path.join(tmp_path, name),
+                "method": "average",
+                "thresholds": "5,3,0",
+                "sort_matrix": False,
+                "delimiter": ".",
+                "force": False,
+                "tree_distances": 'patristic'}
+        mcluster(args)
+        with open(path.join(args["outdir"], "clusters.text")) as fh:
+            results[name] = list(csv.reader(fh, delimiter="\t"))
+        with open(path.join(args["outdir"], "tree.nwk")) as fh:
+            results[name].append(fh.read())
+
+    assert results["text"] == results["binary"]
+
+def test_slink_engine_binary_sorted(tmp_path):
+    # The memory map is traversed in place and sorting is applied as a relabelling.
+    # The matrix has tied distances, so only the partitions are compared
+    matrix = get_path("data/matrix/shuffled.tsv")
+    out = str(tmp_path / "shuffled.gdm")
+    convert({"matrix": matrix, "outfile": out, "sort_matrix": False, "force": False})
+
+    from genomic_address_service.classes.multi_level_clustering import multi_level_clustering
+    expected = multi_level_clustering(matrix, [2, 1, 0], "single", True)
+    actual = multi_level_clustering(out, [2, 1, 0], "single", True, engine="slink")
+    assert actual.labels == expected.labels
+    assert np.array_equal(actual.linkage[:, 2], expected.linkage[:, 2])
+    for level in range(3):
+        groups = {}
+        for label in expected.labels:
+            groups.setdefault(expected.cluster_memberships[label][level], set()).add(actual.cluster_memberships[label][level])
+        assert all(len(ids) == 1 for ids in groups.values())
+        assert len(groups) == len(set(ids[level] for ids in actual.cluster_memberships.values()))
+
+    # the streamed text matrix gives the same cluster IDs as its binary form
+    streamed = multi_level_clustering(matrix, [2, 1, 0], "single", True, engine="slink")
+    assert np.array_equal(streamed.linkage, actual.linkage)
+    assert np.array_equal(streamed.get_memberships(), actual.get_memberships())
+
+def test_convert_dtype_auto(tmp_path):
+    out = str(tmp_path / "basic.gdm")
+    convert({"matrix": get_path("data/matrix/basic.tsv"), "outfile": out, "sort_matrix": False, "force": False,
+             "dtype": "auto"})
+
+    assert read_binary_header(out)['dtype'] == '<u2'
+    expected_labels, expected = matrix_reader(get_path("data/matrix/basic.tsv")).read_data()
+    labels, values = read_binary_matrix(out)
+    assert labels == expected_labels
+    assert np.array_equal(values, expected)
+    assert not path.exists(out + ".uint16.part")
+
+def test_convert_threads(tmp_path):
+    # Workers write straight into the memory map of the output file
+    out = str(tmp_path / "basic.gdm")
+    convert({"matrix": get_path("data/matrix/basic.tsv"), "outfile": out, "sort_matrix": True, "force": False,
+             "dtype": "auto", "threads": 2})
+
+    expected_labels, expected = matrix_reader(get_path("data/matrix/basic.tsv"), sort_matrix=True, dtype='auto').read_data()
+    labels, values = read_binary_matrix(out)
+    assert labels == expected_labels
+    assert values.dtype == expected.dtype
+    assert np.array_equal(values, expected)
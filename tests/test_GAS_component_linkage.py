@@ -0,0 +1,48 @@
+import pytest
+import numpy as np
+import scipy.cluster.hierarchy
+from scipy.spatial.distance import pdist
+from genomic_address_service.classes.component_linkage import component_linkage
+
+def clustered_points(seed, n):
+    # Points around a few distant centres, so that a small threshold splits them into components
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(scale=50, size=(6, 2))
+    return pdist(centres[rng.integers(0, 6, n)] + rng.normal(size=(n, 2)))
+
+@pytest.mark.parametrize("method,engine", [("single", "scipy"), ("average", "scipy"), ("complete", "scipy"),
+                                           ("average", "nnchain"), ("complete", "nnchain")])
+def test_matches_global(method, engine):
+    for seed, n in [(1, 2), (2, 9), (3, 80)]:
+        condensed = clustered_points(seed, n)
+        expected = scipy.cluster.hierarchy.linkage(condensed, method=method)
+        for quantile in [0.0, 0.05, 0.3, 1.0]:
+            threshold = float(np.quantile(condensed, quantile))
+            Z = component_linkage(method, threshold, engine=engine).get_linkage(condensed, n)
+            assert np.allclose(Z, expected)
+            for t in [threshold / 2, threshold]:
+                assert np.array_equal(scipy.cluster.hierarchy.fcluster(Z, t, criterion="distance"),
+                                      scipy.cluster.hierarchy.fcluster(expected, t, criterion="distance"))
+
+def test_get_components():
+    condensed = np.array([1.0, 9.0, 9.0, 9.0, 2.0, 9.0])
+    components = component_linkage("average", 2).get_components(condensed, 4)
+    assert [c.tolist() for c in components] == [[0, 1, 3], [2]]
+
+def test_processes():
+    condensed = clustered_points(5, 60)
+    threshold = float(np.quantile(condensed, 0.1))
+    engine = component_linkage("average", threshold, processes=2)
+    engine.TASK_PAIRS = 1
+    Z = engine.get_linkage(condensed, 60)
+    assert np.array_equal(Z, component_linkage("average", threshold).get_linkage(condensed, 60))
+
+def test_invalid_input():
+    with pytest.raises(ValueError, match="linkage"):
+        component_linkage("ward", 1)
+    with pytest.raises(ValueError, match="engines"):
+        component_linkage("single", 1, engine="slink")
+    with pytest.raises(ValueError, match="only supports"):
+        component_linkage("single", 1, engine="nnchain")
+    with pytest.raises(ValueError, match="expected 3"):
+        component_linkage("single", 1).get_linkage(np.array([1.0, 2.0]), 3)
@@ -0,0 +1,77 @@
+import bz2
+import gzip
+import lzma
+import shutil
+import subprocess
+import pytest
+from genomic_address_service import compression
+from genomic_address_service.compression import compression_type, input_extension, open_input
+from genomic_address_service.utils import get_file_length, get_file_footer, is_file_ok
+
+CONTENT = "dists\ta\tb\na\t0\t1\nb\t1\t0\n" * 3
+
+def compress(tmp_path, name, content=CONTENT):
+    path = tmp_path / name
+    data = content.encode()
+    if name.endswith('.gz'):
+        data = gzip.compress(data)
+    elif name.endswith('.bz2'):
+        data = bz2.compress(data)
+    elif name.endswith('.xz'):
+        data = lzma.compress(data)
+    elif name.endswith('.zst'):
+        path.with_suffix('').write_bytes(data)
+        subprocess.run(['zstd', '-q', '-f', str(path.with_suffix('')), '-o', str(path)], check=True)
+        return str(path)
+    path.write_bytes(data)
+    return str(path)
+
+FORMATS = [('matrix.tsv.gz', 'gzip'), ('matrix.tsv.bz2', 'bz2'), ('matrix.tsv.xz', 'xz'),
+           pytest.param('matrix.tsv.zst', 'zstd', marks=pytest.mark.skipif(shutil.which('zstd') is None,
+                                                                            reason='zstd is not installed'))]
+
+@pytest.mark.parametrize("name,expected", FORMATS)
+def test_open_input(tmp_path, name, expected):
+    path = compress(tmp_path, name)
+    assert compression_type(path) == expected
+    with open_input(path) as fh:
+        assert fh.readline() == "dists\ta\tb\n"
+        assert fh.read() == CONTENT[len("dists\ta\tb\n"):]
+    with open_input(path, 'rb') as fh:
+        assert fh.read() == CONTENT.encode()
+    assert get_file_length(path) == 9
+    assert get_file_footer(path) == "b\t1\t0\n"
+    assert is_file_ok(path)
+
+@pytest.mark.parametrize("name,expected", FORMATS[:3])
+def test_open_input_module(tmp_path, monkeypatch, name, expected):
+    # Without a decompression tool the Python modules are used
+    monkeypatch.setattr(compression, "decompression_command", lambda compression: None)
+    path = compress(tmp_path, name)
+    with open_input(path) as fh:
+        assert fh.read() == CONTENT
+
+def test_open_input_plain(tmp_path):
+    path = compress(tmp_path, "matrix.tsv")
+    assert compression_type(path) is None
+    with open_input(path) as fh:
+        assert fh.read() == CONTENT
+
+def test_open_input_corrupt(tmp_path):
+    path = tmp_path / "matrix.tsv.gz"
+    path.write_bytes(gzip.compress(CONTENT.encode() * 100)[:-40])
+    with pytest.raises((ValueError, EOFError)):
+        with open_input(str(path)) as fh:
+            fh.read()
+
+def test_open_input_early_close(tmp_path):
+    # Closing before the end of the stream is not an error
+    path = compress(tmp_path, "matrix.tsv.gz", CONTENT * 100000)
+    with open_input(path) as fh:
+        assert fh.readline() == "dists\ta\tb\n"
+
+def test_input_extension():
+    assert input_extension("dir/a.tsv.gz") == ".tsv"
+    assert input_extension("a.text.ZST") == ".text"
+    assert input_extension("a.tsv") == ".tsv"
+    assert input_extension("a.gz") == ""
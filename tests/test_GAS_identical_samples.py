@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import scipy.cluster.hierarchy
+from scipy.spatial.distance import pdist
+from genomic_address_service.classes.identical_samples import identical_samples
+from genomic_address_service.classes.multi_level_clustering import multi_level_clustering
+
+THRESHOLDS = [3.0, 2.0, 1.0, 0.5, 0.0]
+
+def duplicated_points(seed, unique=15, n=40):
+    # Points without tied distances, each repeated a random number of times
+    rng = np.random.default_rng(seed)
+    base = rng.random((unique, 6)) * 2
+    picks = rng.integers(0, unique, size=n)
+    return pdist(base[picks], metric='cityblock'), picks
+
+def tied_points(seed, unique=12, n=40):
+    # Integer points with many tied distances, each repeated a random number of times
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 3, size=(unique, 3))
+    picks = rng.integers(0, unique, size=n)
+    return pdist(base[picks], metric='cityblock'), picks
+
+def partitions(memberships):
+    # Clusters at each threshold as sets of samples, independent of the cluster IDs
+    result = []
+    for column in memberships.T:
+        clusters = {}
+        for sample, cluster in enumerate(column):
+            clusters.setdefault(cluster, []).append(sample)
+        result.append(sorted(clusters.values()))
+    return result
+
+def test_groups():
+    condensed, picks = duplicated_points(0)
+    samples = identical_samples(condensed, len(picks))
+    assert len(samples.unique) == len(np.unique(picks))
+    for i, last in enumerate(samples.group):
+        assert picks[i] == picks[last]
+        assert last == np.flatnonzero(picks == picks[i])[-1]
+    assert samples.sizes.sum() == len(picks)
+    np.testing.assert_array_equal(samples.sizes, np.bincount(picks)[picks[samples.unique]])
+
+def test_zero_distance_not_identical():
+    # a and b are at distance 0 but not at the same distance from c
+    samples = identical_samples(np.array([0.0, 1.0, 2.0]), 3)
+    np.testing.assert_array_equal(samples.unique, [0, 1, 2])
+    samples = identical_samples(np.array([0.0, 2.0, 2.0]), 3)
+    np.testing.assert_array_equal(samples.unique, [1, 2])
+
+def test_preserves_clusters():
+    condensed, picks = tied_points(0)
+    samples = identical_samples(condensed, len(picks))
+    reduced = samples.get_condensed(condensed)
+    assert samples.preserves_clusters('single', reduced)
+    assert samples.preserves_clusters('complete', reduced)
+    assert not samples.preserves_clusters('average', reduced)
+    # 0 and 1 are identical, 2 and 3 are at distance 0 without being identical
+    condensed = np.array([0.0, 1.0, 2.0, 1.0, 2.0, 0.0])
+    samples = identical_samples(condensed, 4)
+    np.testing.assert_array_equal(samples.unique, [1, 2, 3])
+    assert not samples.preserves_clusters('complete', samples.get_condensed(condensed))
+
+def test_all_identical():
+    samples = identical_samples(np.zeros(6, dtype=np.uint16), 4)
+    np.testing.assert_array_equal(samples.unique, [3])
+    Z = samples.expand_linkage(np.empty((0, 4)))
+    np.testing.assert_array_equal(Z[:, 2], 0)
+    np.testing.assert_array_equal(Z[-1, 3], 4)
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("method", ["single", "average", "complete"])
+def test_expand_linkage(seed, method):
+    # Clustering the unique samples gives the clusters of all samples at every threshold
+    condensed, picks = duplicated_points(seed)
+    n = len(picks)
+    labels = [str(i) for i in range(n)]
+    expected = multi_level_clustering(None, THRESHOLDS, method, False, distances=(labels, condensed))
+    result = multi_level_clustering(None, THRESHOLDS, method, False, distances=(labels, condensed), deduplicate=True)
+    assert partitions(result.get_memberships()) == partitions(expected.get_memberships())
+    np.testing.assert_allclose(np.sort(result.linkage[:, 2]), np.sort(expected.linkage[:, 2]))
+    scipy.cluster.hierarchy.is_valid_linkage(result.linkage, throw=True)
+
+@pytest.mark.parametrize("engine,method", [("slink", "single"), ("nnchain", "complete"), ("nnchain", "average")])
+def test_engines(engine, method):
+    condensed, picks = duplicated_points(1)
+    labels = [str(i) for i in range(len(picks))]
+    expected = multi_level_clustering(None, THRESHOLDS, method, False, distances=(labels, condensed))
+    result = multi_level_clustering(None, THRESHOLDS, method, False, engine=engine, distances=(labels, condensed),
+                                    deduplicate=True)
+    assert partitions(result.get_memberships()) == partitions(expected.get_memberships())
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("engine,method", [("scipy", "single"), ("slink", "single"), ("scipy", "complete"),
+                                           ("nnchain", "complete"), ("scipy", "average"), ("nnchain", "average")])
+def test_ties(seed, engine, method):
+    # With tied distances the clusters at every height are still those of a run on all the samples
+    condensed, picks = tied_points(seed)
+    labels = [str(i) for i in range(len(picks))]
+    thresholds = sorted(set(condensed.tolist()) | {0.0}, reverse=True)
+    expected = multi_level_clustering(None, thresholds, method, False, engine=engine, distances=(labels, condensed))
+    result = multi_level_clustering(None, thresholds, method, False, engine=engine, distances=(labels, condensed),
+                                    deduplicate=True)
+    assert partitions(result.get_memberships()) == partitions(expected.get_memberships())
+
+def test_components():
+    condensed, picks = duplicated_points(0)
+    labels = [str(i) for i in range(len(picks))]
+    with pytest.raises(ValueError, match='identical samples'):
+        multi_level_clustering(None, THRESHOLDS, 'single', False, distances=(labels, condensed), components=True,
+                               deduplicate=True)
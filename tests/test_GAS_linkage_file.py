@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import scipy
+from genomic_address_service.linkage_file import is_linkage_file, read_linkage_file, write_linkage_file
+
+def make_linkage(n, seed=0):
+    rng = np.random.default_rng(seed)
+    condensed = rng.random(n * (n - 1) // 2)
+    return scipy.cluster.hierarchy.linkage(condensed, method='average')
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "linkage.bin")
+    Z = make_linkage(10)
+    labels = [f's{i}' for i in range(10)]
+    write_linkage_file(path, Z, labels, 'average', tree_distances='cophenetic')
+    assert is_linkage_file(path)
+    read_labels, read_Z, header = read_linkage_file(path)
+    assert read_labels == labels
+    np.testing.assert_array_equal(read_Z, Z)
+    assert read_Z.dtype == np.float64
+    assert header['method'] == 'average'
+    assert header['tree_distances'] == 'cophenetic'
+    assert header['n'] == 10
+
+def test_single_sample(tmp_path):
+    path = str(tmp_path / "linkage.bin")
+    write_linkage_file(path, np.zeros((0, 4)), ['a'], 'single')
+    labels, Z, _ = read_linkage_file(path)
+    assert labels == ['a']
+    assert Z.shape == (0, 4)
+
+def test_not_linkage_file(tmp_path):
+    path = tmp_path / "matrix.tsv"
+    path.write_text("dists\ta\na\t0\n")
+    assert not is_linkage_file(str(path))
+    assert not is_linkage_file(str(tmp_path / "missing.bin"))
+    with pytest.raises(ValueError, match='is not a linkage file'):
+        read_linkage_file(str(path))
+
+def test_corrupt(tmp_path):
+    path = tmp_path / "linkage.bin"
+    write_linkage_file(str(path), make_linkage(6), list('abcdef'), 'complete')
+    data = bytearray(path.read_bytes())
+    data[520] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match='checksum'):
+        read_linkage_file(str(path))
+    read_linkage_file(str(path), verify=False)
+
+def test_truncated(tmp_path):
+    path = tmp_path / "linkage.bin"
+    write_linkage_file(str(path), make_linkage(6), list('abcdef'), 'complete')
+    path.write_bytes(path.read_bytes()[:600])
+    with pytest.raises(ValueError, match='truncated'):
+        read_linkage_file(str(path))
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import scipy.cluster.hierarchy
+from scipy.special import comb
+from scipy.spatial.distance import pdist
+from genomic_address_service.classes.linkage_sweep import linkage_sweep
+
+def pair_indices(a, b):
+    # Adjusted Rand and Fowlkes-Mallows indices from the contingency table
+    table = pd.crosstab(a, b).to_numpy()
+    same = comb(table, 2).sum()
+    same_a = comb(table.sum(axis=1), 2).sum()
+    same_b = comb(table.sum(axis=0), 2).sum()
+    expected = same_a * same_b / comb(len(a), 2)
+    maximum = (same_a + same_b) / 2
+    ari = 1.0 if maximum == expected else (same - expected) / (maximum - expected)
+    fowlkes_mallows = same / np.sqrt(same_a * same_b) if same_a * same_b > 0 else 0.0
+    return ari, fowlkes_mallows
+
+def test_matches_fcluster():
+    # Every distinct height matches a separate fcluster cut
+    rng = np.random.default_rng(23)
+    for method, points in [("single", rng.integers(0, 4, size=(40, 3))), ("average", rng.random((35, 2))),
+                           ("complete", rng.integers(0, 6, size=(30, 2)))]:
+        n = len(points)
+        Z = scipy.cluster.hierarchy.linkage(pdist(points, 'cityblock'), method=method)
+        sweep = linkage_sweep(Z, n)
+        assert np.array_equal(sweep.heights, np.unique(Z[:, 2]))
+        previous = np.arange(n)
+        for h, height in enumerate(sweep.heights):
+            clusters = scipy.cluster.hierarchy.fcluster(Z, height, criterion='distance')
+            sizes = np.bincount(clusters)[1:]
+            assert sweep.clusters[h] == len(sizes)
+            assert sweep.singletons[h] == np.sum(sizes == 1)
+            assert sweep.largest[h] == sizes.max()
+            assert np.isclose(sweep.mean_size[h], sizes.mean())
+            assert sweep.pairs[h] == comb(sizes, 2).sum()
+            ari, fowlkes_mallows = pair_indices(previous, clusters)
+            assert np.isclose(sweep.ari[h], ari)
+            assert np.isclose(sweep.fowlkes_mallows[h], fowlkes_mallows)
+            previous = clusters
+        assert np.array_equal(sweep.persistence[:-1], np.diff(sweep.heights))
+        assert sweep.persistence[-1] == np.inf
+
+def test_small():
+    # a-b at 1, c joins at 2
+    Z = np.array([[0, 1, 1, 2], [2, 3, 2, 3]], dtype=np.float64)
+    sweep = linkage_sweep(Z, 3)
+    table = sweep.get_table()
+    assert table[0] == (1.0, 2, 1, 2, 1.5, 0.0, 0.0, 1.0)
+    assert table[1][:6] == (2.0, 1, 0, 3, 3.0, 0.0) and table[1][7] == np.inf
+    assert np.isclose(table[1][6], np.sqrt(1 / 3))
+
+def test_single_sample():
+    sweep = linkage_sweep(np.empty((0, 4)), 1)
+    assert sweep.get_table() == []
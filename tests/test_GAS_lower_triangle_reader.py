@@ -0,0 +1,68 @@
+import pytest
+import textwrap
+import numpy as np
+from scipy.spatial.distance import squareform
+from genomic_address_service.classes.lower_triangle_reader import lower_triangle_reader
+
+def write_matrix(tmp_path, content, name="matrix.txt"):
+    path = tmp_path / name
+    path.write_text(textwrap.dedent(content))
+    return str(path)
+
+@pytest.mark.parametrize("content", [
+    # PHYLIP
+    """\
+    4
+    C
+    A    2
+    D    7   3
+    B    4   1   5
+    """,
+    # TSV with a header and the diagonal
+    "dists\tC\tA\tD\tB\nC\t0\nA\t2\t0\nD\t7\t3\t0\nB\t4\t1\t5\t0\n",
+    # TSV without a header, with empty trailing fields
+    "C\t\t\t\nA\t2\t\t\nD\t7\t3\t\nB\t4\t1\t5\n",
+])
+def test_read_data(tmp_path, content):
+    path = write_matrix(tmp_path, content)
+    labels, condensed = lower_triangle_reader(path).read_data()
+    assert labels == ["C", "A", "D", "B"]
+    assert condensed.tolist() == [2, 7, 4, 3, 1, 5]
+
+    labels, condensed = lower_triangle_reader(path, sort_matrix=True).read_data()
+    assert labels == ["A", "B", "C", "D"]
+    assert condensed.tolist() == [1, 2, 3, 4, 5, 7]
+
+def test_read_data_matches_square(tmp_path):
+    rng = np.random.default_rng(13)
+    n = 30
+    square = squareform(rng.random(n * (n - 1) // 2))
+    rows = [f"s{i}\t" + "\t".join(repr(x) for x in square[i, :i]) for i in range(n)]
+    path = write_matrix(tmp_path, "\n".join(rows) + "\n")
+    labels, condensed = lower_triangle_reader(path).read_data()
+    assert labels == [f"s{i}" for i in range(n)]
+    assert np.array_equal(condensed, squareform(square))
+
+def test_read_data_dtype(tmp_path):
+    path = write_matrix(tmp_path, "3\nA\nB 1\nC 2 70000\n")
+    _, condensed = lower_triangle_reader(path, dtype="auto").read_data()
+    assert condensed.dtype == np.uint32
+    assert condensed.tolist() == [1, 2, 70000]
+
+@pytest.mark.parametrize("content", [
+    "3\nA\nB 1\n",                                     # too few rows
+    "2\nA\nB 1\nC 2 3\n",                              # too many rows
+    "3\nA\nB 1 2 3\nC 2 3\n",                          # too many values
+    "3\nA\nB 1 5\nC 2 3\n",                            # non-zero diagonal
+    "dists\tA\tB\nA\t0\nC\t1\t0\n",                    # label not in header order
+    "A\nA\t1\n",                                       # repeated label
+])
+def test_read_data_invalid(tmp_path, content):
+    path = write_matrix(tmp_path, content)
+    with pytest.raises(ValueError, match="Lower Triangle Matrix Format"):
+        lower_triangle_reader(path).read_data()
+
+def test_read_data_non_numeric(tmp_path):
+    path = write_matrix(tmp_path, "3\nA\nB 1\nC x 3\n")
+    with pytest.raises(ValueError, match="numerical values"):
+        lower_triangle_reader(path).read_data()
@@ -0,0 +1,200 @@
+import pytest
+import re
+import textwrap
+import numpy as np
+from genomic_address_service.classes.matrix_reader import matrix_reader
+
+def write_matrix(tmp_path, content, name="matrix.tsv"):
+    path = tmp_path / name
+    path.write_text(textwrap.dedent(content))
+    return str(path)
+
+def test_read_data_condensed(tmp_path):
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC\tD
+        A\t0\t1\t2\t3
+        B\t1\t0\t4\t5
+        C\t2\t4\t0\t6
+        D\t3\t5\t6\t0
+        """)
+    labels, condensed = matrix_reader(path).read_data()
+    assert labels == ['A', 'B', 'C', 'D']
+    assert condensed.dtype == np.float64
+    assert condensed.tolist() == [1, 2, 3, 4, 5, 6]
+
+def test_read_data_sorted(tmp_path):
+    # Sorting is applied as a permutation while the rows stream in
+    path = write_matrix(tmp_path, """\
+        dists\tC\tA\tB
+        C\t0\t2\t4
+        A\t2\t0\t1
+        B\t4\t1\t0
+        """)
+    labels, condensed = matrix_reader(path, sort_matrix=True).read_data()
+    assert labels == ['A', 'B', 'C']
+    assert condensed.tolist() == [1, 2, 4]
+
+def test_read_data_too_few_rows(tmp_path):
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC
+        A\t0\t1\t2
+        B\t1\t0\t4
+        """)
+    with pytest.raises(ValueError, match=re.escape(matrix_reader.ERROR_FORMAT)):
+        matrix_reader(path).read_data()
+
+def test_read_data_duplicate_labels(tmp_path):
+    path = write_matrix(tmp_path, """\
+        dists\tA\tA
+        A\t0\t1
+        A\t1\t0
+        """)
+    with pytest.raises(ValueError, match=re.escape(matrix_reader.ERROR_FORMAT)):
+        matrix_reader(path).read_data()
+
+def test_read_data_missing_value(tmp_path):
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB
+        A\t0\tNA
+        B\t1\t0
+        """)
+    with pytest.raises(ValueError, match=re.escape(matrix_reader.ERROR_NAN)):
+        matrix_reader(path).read_data()
+
+def test_read_data_asymmetric_pairs(tmp_path):
+    # The offending pairs are reported with their labels and both values
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC
+        A\t0\t1\t2
+        B\t1.5\t0\t4
+        C\t2\t4\t0
+        """)
+    with pytest.raises(ValueError, match=re.escape("[B, A]=1.5 vs [A, B]=1")):
+        matrix_reader(path, block_size=1).read_data()
+
+def test_read_data_tolerance(tmp_path):
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC
+        A\t0\t1\t2
+        B\t1.001\t0\t4
+        C\t2\t4\t0
+        """)
+    labels, condensed = matrix_reader(path, atol=0.01).read_data()
+    assert condensed.tolist() == [1, 2, 4]
+    with pytest.raises(ValueError, match=re.escape(matrix_reader.ERROR_ASYMMETRIC)):
+        matrix_reader(path, rtol=1e-4).read_data()
+
+def test_read_data_skip_validation(tmp_path):
+    # Only the upper triangle is parsed, so the lower triangle is never checked
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC
+        A\t0\t1\t2
+        B\t9\t0\t4
+        C\tx\t4\t0
+        """)
+    labels, condensed = matrix_reader(path, validate=False).read_data()
+    assert condensed.tolist() == [1, 2, 4]
+
+def test_read_data_dtype_auto(tmp_path):
+    # Integer distances are stored as uint16
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC
+        A\t0\t1\t2
+        B\t1\t0\t4
+        C\t2\t4\t0
+        """)
+    labels, condensed = matrix_reader(path, dtype='auto').read_data()
+    assert condensed.dtype == np.uint16
+    assert condensed.tolist() == [1, 2, 4]
+
+def test_read_data_dtype_widen(tmp_path):
+    # The vector is widened when a later block needs it
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC\tD
+        A\t0\t1\t2\t3
+        B\t1\t0\t70000\t5
+        C\t2\t70000\t0\t0.5
+        D\t3\t5\t0.5\t0
+        """)
+    reader = matrix_reader(path, dtype='auto', block_size=1)
+    labels, condensed = reader.read_data()
+    assert condensed.dtype == np.float64
+    assert condensed.tolist() == [1, 2, 3, 70000, 5, 0.5]
+
+    labels, condensed = matrix_reader(path, dtype='float32').read_data()
+    assert condensed.dtype == np.float32
+
+    with pytest.raises(ValueError, match="cannot be stored exactly as uint32"):
+        matrix_reader(path, dtype='uint32').read_data()
+
+def test_read_data_float32_lossy(tmp_path):
+    # An explicit float32 rounds the values; auto keeps them exact
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC
+        A\t0\t0.1\t2
+        B\t0.1\t0\t4
+        C\t2\t4\t0
+        """)
+    labels, condensed = matrix_reader(path, dtype='float32').read_data()
+    assert condensed.dtype == np.float32
+    assert condensed.tolist() == [np.float32(0.1), 2, 4]
+
+    labels, condensed = matrix_reader(path, dtype='auto').read_data()
+    assert condensed.dtype == np.float64
+    assert condensed.tolist() == [0.1, 2, 4]
+
+def random_matrix(tmp_path, n, seed=0):
+    rng = np.random.default_rng(seed)
+    upper = np.triu(rng.integers(0, 100, size=(n, n)), 1) / 4
+    matrix = upper + upper.T
+    matrix[n // 2, n // 3] = matrix[n // 3, n // 2] = 70000
+    labels = [f"s{i}" for i in rng.permutation(n)]
+    lines = ["dists\t" + "\t".join(labels)]
+    lines += [label + "\t" + "\t".join(map(str, row.tolist())) for label, row in zip(labels, matrix)]
+    return write_matrix(tmp_path, "\n".join(lines) + "\n")
+
+@pytest.mark.parametrize("sort_matrix", [False, True])
+@pytest.mark.parametrize("dtype", ["float64", "auto"])
+def test_read_data_threads(tmp_path, sort_matrix, dtype):
+    # Small chunks spread the rows over many byte ranges (and widen the auto type)
+    path = random_matrix(tmp_path, 60)
+    expected_labels, expected = matrix_reader(path, sort_matrix=sort_matrix, dtype=dtype).read_data()
+    for validate in [True, False]:
+        reader = matrix_reader(path, sort_matrix=sort_matrix, dtype=dtype, validate=validate, threads=3)
+        reader.CHUNK_BYTES = 200
+        labels, condensed = reader.read_data()
+        assert labels == expected_labels
+        assert condensed.dtype == expected.dtype
+        assert np.array_equal(condensed, expected)
+
+def test_read_data_threads_errors(tmp_path):
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC
+        A\t0\t1\t2
+
+        B\t1.5\t0\t4\r
+        C\t2\t4\t0
+        """)
+    for atol in [0, 0.1]:
+        with pytest.raises(ValueError, match=re.escape("[B, A]=1.5 vs [A, B]=1")):
+            matrix_reader(path, atol=atol, threads=2).read_data()
+    labels, condensed = matrix_reader(path, atol=0.5, threads=2).read_data()
+    assert condensed.tolist() == [1, 2, 4]
+
+    path = write_matrix(tmp_path, """\
+        dists\tA\tB\tC
+        B\t1\t0\t4
+        A\t0\t1\t2
+        C\t2\t4\t0
+        """, name="order.tsv")
+    with pytest.raises(ValueError, match=re.escape(matrix_reader.ERROR_FORMAT)):
+        matrix_reader(path, threads=2).read_data()
+
+def test_allocate_shared_fallback(tmp_path, monkeypatch):
+    # Without room in shared memory the vector goes to the temporary directory
+    monkeypatch.setattr(matrix_reader, "SHARED_MEMORY_DIR", str(tmp_path / "missing"))
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    reader = matrix_reader(random_matrix(tmp_path, 10))
+    condensed = reader.allocate_shared([str(i) for i in range(10)], np.float64)
+    assert len(condensed) == 45
+    assert reader.shared_files[0].startswith(str(tmp_path))
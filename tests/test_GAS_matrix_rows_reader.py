@@ -0,0 +1,53 @@
+import pytest
+import numpy as np
+from genomic_address_service.classes.matrix_rows_reader import matrix_rows_reader
+
+def write_rows(tmp_path, content, name="rows.tsv"):
+    path = tmp_path / name
+    path.write_text(content)
+    return str(path)
+
+def test_stream_rows(tmp_path):
+    # Known samples in any column order, new samples in the order of their rows
+    path = write_rows(tmp_path, "dists\tB\tX\tA\tY\n"
+                                "X\t1\t0\t2\t5\n"
+                                "Y\t3\t5\t4\t0\n")
+    reader = matrix_rows_reader(path, ["A", "B"])
+    assert reader.read_labels() == ["X", "Y"]
+    rows = [(k, distances.tolist()) for k, distances in reader.stream_rows()]
+    assert rows == [(0, [2, 1]), (1, [4, 3, 5])]
+
+def test_stream_rows_no_new_samples(tmp_path):
+    path = write_rows(tmp_path, "dists\tB\tA\n")
+    reader = matrix_rows_reader(path, ["A", "B"])
+    assert reader.read_labels() == []
+    assert list(reader.stream_rows()) == []
+
+@pytest.mark.parametrize("content, match", [
+    # a clustered sample has no column
+    ("dists\tA\tX\nX\t1\t0\n", "no column for the clustered samples \\['B'\\]"),
+    # rows out of the order of the columns
+    ("dists\tA\tB\tX\tY\nY\t1\t1\t2\t0\nX\t1\t1\t0\t2\n", "Rows Format"),
+    # a row is missing
+    ("dists\tA\tB\tX\tY\nX\t1\t1\t0\t2\n", "Rows Format"),
+    # a row has a missing value
+    ("dists\tA\tB\tX\nX\t1\t0\n", "Rows Format"),
+    # non-zero diagonal
+    ("dists\tA\tB\tX\nX\t1\t1\t3\n", "0 diagonal"),
+    # asymmetric distances between new samples
+    ("dists\tA\tB\tX\tY\nX\t1\t1\t0\t2\nY\t1\t1\t3\t0\n", "non-symmetrical values: \\[Y, X\\]=3 vs \\[X, Y\\]=2"),
+])
+def test_stream_rows_invalid(tmp_path, content, match):
+    path = write_rows(tmp_path, content)
+    with pytest.raises(ValueError, match=match):
+        list(matrix_rows_reader(path, ["A", "B"]).stream_rows())
+
+def test_stream_rows_tolerance(tmp_path):
+    path = write_rows(tmp_path, "dists\tA\tX\tY\nX\t1\t0\t2\nY\t1\t2.01\t0\n")
+    with pytest.raises(ValueError, match="non-symmetrical"):
+        list(matrix_rows_reader(path, ["A"]).stream_rows())
+    rows = list(matrix_rows_reader(path, ["A"], atol=0.1).stream_rows())
+    assert np.array_equal(rows[1][1], [1, 2])
+    # the upper triangle is kept
+    rows = list(matrix_rows_reader(path, ["A"], validate=False).stream_rows())
+    assert np.array_equal(rows[1][1], [1, 2])
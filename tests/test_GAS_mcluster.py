@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 import os
 import tempfile
-from genomic_address_service.mcluster import write_clusters  # Adjust the import path based on your project structure
+import numpy as np
+from genomic_address_service.mcluster import write_clusters, write_memberships  # Adjust the import path based on your project structure
 
 def test_write_clusters():
     # Create mock cluster data
@@ -30,4 +31,20 @@ def test_write_clusters():
             assert lines[3].strip() == "3\t1.2.3\t1\t2\t3"
     finally:
         # Clean up - delete the temporary file
-        os.remove(temp_file.name)
\ No newline at end of file
+        os.remove(temp_file.name)
+
+def test_write_memberships():
+    # The integer membership array is written in the same format as write_clusters
+    memberships = np.array([[1, 1, 1], [1, 1, 2], [1, 2, 3]], dtype=np.int32)
+    temp_file = tempfile.NamedTemporaryFile(delete=False)
+    try:
+        write_memberships(['1', '2', '3'], memberships, temp_file.name, "/")
+
+        with open(temp_file.name, 'r') as file:
+            lines = file.readlines()
+            assert lines[0].strip() == "id\taddress\tlevel_1\tlevel_2\tlevel_3"
+            assert lines[1].strip() == "1\t1/1/1\t1\t1\t1"
+            assert lines[2].strip() == "2\t1/1/2\t1\t1\t2"
+            assert lines[3].strip() == "3\t1/2/3\t1\t2\t3"
+    finally:
+        os.remove(temp_file.name)
@@ -0,0 +1,50 @@
+import numpy as np
+from genomic_address_service.classes.membership_index import membership_index
+
+def prefix_members(addresses):
+    # Rows of each address prefix, in row order
+    members = {}
+    for row, address in enumerate(addresses):
+        for level in range(len(address)):
+            members.setdefault(tuple(address[:level + 1]), []).append(row)
+    return members
+
+def check_index(index, addresses):
+    assert index.num_rows == len(addresses)
+    for prefix, rows in prefix_members(addresses).items():
+        codes = index.lookup(prefix)
+        assert len(codes) == len(prefix)
+        level = len(prefix) - 1
+        assert index.get_members(level, codes[-1]).tolist() == rows
+        assert all(index.codes[row, level] == codes[-1] for row in rows)
+    for level in range(index.num_levels):
+        assert index.num_clusters(level) == len(set(tuple(address[:level + 1]) for address in addresses))
+
+def test_index():
+    addresses = [[1, 1, 1], [1, 1, 2], [2, 1, 1], [1, 1, 2], [1, 2, 1], [2, 1, 3]]
+    index = membership_index(addresses)
+    check_index(index, addresses)
+    assert index.members[0].dtype == np.int32
+    # the same value under another parent is another cluster
+    assert index.lookup([2, 1]) != index.lookup([1, 1])
+    assert index.lookup([3, 1]) == []
+    assert index.lookup([1, 3, 1]) == index.lookup([1])
+
+def test_append():
+    rng = np.random.default_rng(7)
+    addresses = rng.integers(1, 4, size=(50, 3)).tolist()
+    index = membership_index(addresses)
+    for address in rng.integers(1, 6, size=(2000, 3)).tolist():
+        assert index.append(address) == len(addresses)
+        addresses.append(address)
+        if len(addresses) % 97 == 0:
+            check_index(index, addresses)
+    check_index(index, addresses)
+
+def test_empty():
+    index = membership_index(np.empty((0, 2), dtype=np.int64))
+    assert index.num_clusters(0) == 0
+    assert index.lookup([1]) == []
+    index.append([1, 2])
+    index.append([1, 3])
+    check_index(index, [[1, 2], [1, 3]])
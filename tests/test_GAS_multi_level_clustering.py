@@ -33,7 +33,36 @@ def test_assign_clusters(sample_distance_matrix):
     mlc = multi_level_clustering(dist_mat_file=sample_distance_matrix, thresholds=thresholds, method="single", sort_matrix=False)
     assert all(len(clusters) == 1 for clusters in mlc.cluster_memberships.values())
 
+def test_get_memberships(sample_distance_matrix):
+    thresholds = [0.25, 0.15]
+    mlc = multi_level_clustering(dist_mat_file=sample_distance_matrix, thresholds=thresholds, method="single", sort_matrix=False)
+    memberships = mlc.get_memberships()
+    assert memberships.dtype.name == 'int32'
+    assert memberships.tolist() == [[1, 1], [1, 1], [1, 2]]
+    assert mlc.cluster_memberships == {'Label1': ['1', '1'], 'Label2': ['1', '1'], 'Label3': ['1', '2']}
+
 def test_newick_string(sample_distance_matrix):
     thresholds = [0.15]
     mlc = multi_level_clustering(dist_mat_file=sample_distance_matrix, thresholds=thresholds, method="single",  sort_matrix=False)
     assert mlc.newick.endswith(";")  # Newick strings should end with a semicolon
+
+def test_slink_engine(sample_distance_matrix):
+    thresholds = [0.25, 0.15]
+    expected = multi_level_clustering(dist_mat_file=sample_distance_matrix, thresholds=thresholds, method="single", sort_matrix=False)
+    mlc = multi_level_clustering(dist_mat_file=sample_distance_matrix, thresholds=thresholds, method="single", sort_matrix=False,
+                                 engine="slink")
+    assert (mlc.linkage == expected.linkage).all()
+    assert mlc.cluster_memberships == expected.cluster_memberships
+    assert mlc.newick == expected.newick
+
+def test_slink_engine_method(sample_distance_matrix):
+    with pytest.raises(ValueError, match=re.escape("The slink engine only supports single linkage")):
+        multi_level_clustering(dist_mat_file=sample_distance_matrix, thresholds=[0.15], method="average", sort_matrix=False,
+                               engine="slink")
+
+def test_slink_engine_asymmetric(tmp_path):
+    # The rows are streamed, so symmetry is checked without storing the matrix
+    path = tmp_path / "matrix.tsv"
+    path.write_text("dists\tA\tB\tC\nA\t0\t1\t2\nB\t1\t0\t4\nC\t2\t3\t0\n")
+    with pytest.raises(ValueError, match=re.escape("[C, B]=3 vs [B, C]=4")):
+        multi_level_clustering(dist_mat_file=str(path), thresholds=[1], method="single", sort_matrix=False, engine="slink")
@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist, squareform
+from genomic_address_service.binary_matrix import write_binary_matrix
+from genomic_address_service.classes.multi_level_clustering import multi_level_clustering
+from genomic_address_service.classes.multi_method_clustering import multi_method_clustering
+
+THRESHOLDS = [6, 4, 2, 0]
+
+def random_matrix(tmp_path, n=30, seed=0):
+    # Integer distances, with ties, as a TSV matrix and its labels and condensed vector
+    rng = np.random.default_rng(seed)
+    condensed = pdist(rng.integers(0, 3, size=(n, 6)), metric='cityblock')
+    labels = [f's{i}' for i in rng.permutation(n)]
+    path = str(tmp_path / "matrix.tsv")
+    with open(path, 'w') as fh:
+        fh.write("dists\t" + "\t".join(labels) + "\n")
+        for label, row in zip(labels, squareform(condensed)):
+            fh.write(label + "\t" + "\t".join(str(int(x)) for x in row) + "\n")
+    return path, labels, condensed
+
+def assert_same(mm, path, methods, **options):
+    for method in methods:
+        expected = multi_level_clustering(path, THRESHOLDS, method, options.get('sort_matrix', False),
+                                          engine=options.get('engine', 'scipy'))
+        result = mm.results[method]
+        assert result.labels == expected.labels
+        np.testing.assert_array_equal(result.linkage, expected.linkage)
+        np.testing.assert_array_equal(mm.get_memberships(method), expected.get_memberships())
+
+@pytest.mark.parametrize("threads", [1, 2])
+@pytest.mark.parametrize("engine,methods", [("scipy", ["single", "average", "complete"]),
+                                            ("nnchain", ["complete", "average"])])
+def test_methods(tmp_path, threads, engine, methods):
+    # Every method gives the clusters of its own run, with the matrix read once
+    path, _, _ = random_matrix(tmp_path)
+    mm = multi_method_clustering(path, THRESHOLDS, methods, False, engine=engine, threads=threads, dtype='auto')
+    assert list(mm.results) == methods
+    assert_same(mm, path, methods, engine=engine)
+
+@pytest.mark.parametrize("threads", [1, 2])
+@pytest.mark.parametrize("sort_matrix", [False, True])
+def test_binary(tmp_path, threads, sort_matrix):
+    # A binary matrix is shared through its memory map (or a sorted copy)
+    _, labels, condensed = random_matrix(tmp_path)
+    path = str(tmp_path / "matrix.gdm")
+    write_binary_matrix(path, labels, condensed)
+    mm = multi_method_clustering(path, THRESHOLDS, ["single", "average"], sort_matrix, threads=threads)
+    assert_same(mm, path, ["single", "average"], sort_matrix=sort_matrix)
+
+def test_shared_files_removed(tmp_path, monkeypatch):
+    # The temporary copy of the vector is removed once the methods are done
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    monkeypatch.setattr(multi_method_clustering, "SHARED_MEMORY_DIR", str(tmp_path / "missing"))
+    path, _, _ = random_matrix(tmp_path)
+    created = []
+    allocate_shared = multi_method_clustering.allocate_shared
+    def record(self, labels, dtype):
+        condensed = allocate_shared(self, labels, dtype)
+        created.append(condensed.filename)
+        return condensed
+    monkeypatch.setattr(multi_method_clustering, "allocate_shared", record)
+    multi_method_clustering(path, THRESHOLDS, ["single", "complete"], False, threads=2)
+    assert len(created) == 1 and created[0].startswith(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["matrix.tsv"]
+
+def test_input_unchanged(tmp_path):
+    # nnchain works on a copy, so the other methods see the original distances
+    path, _, _ = random_matrix(tmp_path)
+    mm = multi_method_clustering(path, THRESHOLDS, ["complete", "average"], False, engine="nnchain")
+    assert_same(mm, path, ["complete", "average"], engine="nnchain")
@@ -0,0 +1,50 @@
+import io
+import pytest
+import numpy as np
+import scipy.cluster.hierarchy
+import skbio
+from genomic_address_service.newick import branch_lengths, write_newick, format_label
+
+def skbio_newick(Z, labels, tree_distances):
+    # Reference: the scikit-bio based export previously used by mcluster
+    lmat = Z.copy()
+    if tree_distances == 'cophenetic':
+        lmat[:, 2] *= 2
+    tree = skbio.tree.TreeNode.from_linkage_matrix(lmat, id_list=labels)
+    return str(tree).strip().replace("'", "")
+
+def newick(Z, labels, tree_distances):
+    fh = io.StringIO()
+    write_newick(fh, Z, labels, branch_lengths(Z, tree_distances))
+    return fh.getvalue()
+
+@pytest.mark.parametrize("tree_distances", ["patristic", "cophenetic"])
+@pytest.mark.parametrize("method", ["single", "average", "complete"])
+def test_matches_skbio(method, tree_distances):
+    rng = np.random.default_rng(6)
+    for n in [2, 3, 30, 75]:
+        condensed = np.round(rng.random(n * (n - 1) // 2) * 50, 3)
+        Z = scipy.cluster.hierarchy.linkage(condensed, method=method)
+        labels = [f"s{i}" for i in range(n)]
+        assert newick(Z, labels, tree_distances) == skbio_newick(Z, labels, tree_distances)
+
+def test_labels():
+    assert format_label("a b") == "a_b"
+    assert format_label("it's") == "its"
+    assert format_label("a_b c") == "a_b c"
+    assert format_label("x(y)") == "x(y)"
+
+    Z = scipy.cluster.hierarchy.linkage(np.array([1.0, 2.0, 3.0]), method="average")
+    labels = ["a b", "it's", "x,y"]
+    assert newick(Z, labels, "patristic") == skbio_newick(Z, labels, "patristic")
+
+def test_linkage_not_modified():
+    Z = scipy.cluster.hierarchy.linkage(np.array([1.0, 2.0, 3.0]), method="single")
+    expected = Z.copy()
+    branch_lengths(Z, "cophenetic")
+    assert np.array_equal(Z, expected)
+
+def test_invalid_tree_distances():
+    Z = scipy.cluster.hierarchy.linkage(np.array([1.0, 2.0, 3.0]), method="single")
+    with pytest.raises(ValueError, match=r"Invalid tree_distances value \[nope\]"):
+        branch_lengths(Z, "nope")
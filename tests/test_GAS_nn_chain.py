@@ -0,0 +1,44 @@
+import pytest
+import numpy as np
+import scipy.cluster.hierarchy
+from genomic_address_service.classes.nn_chain import nn_chain
+
+@pytest.mark.parametrize("method", ["average", "complete"])
+def test_matches_scipy(method):
+    rng = np.random.default_rng(3)
+    for n in [2, 3, 17, 60]:
+        condensed = rng.random(n * (n - 1) // 2)
+        expected = scipy.cluster.hierarchy.linkage(condensed, method=method)
+        assert np.array_equal(nn_chain(method).get_linkage(condensed.copy(), n), expected)
+
+@pytest.mark.parametrize("method", ["average", "complete"])
+def test_matches_scipy_ties(method):
+    # Integer distances have many ties; the chain must break them like SciPy
+    rng = np.random.default_rng(4)
+    for n in [5, 23, 48]:
+        condensed = rng.integers(0, 4, n * (n - 1) // 2).astype(np.float64)
+        expected = scipy.cluster.hierarchy.linkage(condensed, method=method)
+        assert np.array_equal(nn_chain(method).get_linkage(condensed.copy(), n), expected)
+
+def test_in_place_and_copy():
+    condensed = np.array([1.0, 4.0, 2.0])
+    nn_chain("average").get_linkage(condensed, 3, overwrite=False)
+    assert condensed.tolist() == [1.0, 4.0, 2.0]
+
+    read_only = np.array([1.0, 4.0, 2.0])
+    read_only.flags.writeable = False
+    Z = nn_chain("average").get_linkage(read_only, 3)
+    assert Z.tolist() == [[0.0, 1.0, 1.0, 2.0], [2.0, 3.0, 3.0, 3.0]]
+
+def test_float32_complete():
+    rng = np.random.default_rng(8)
+    n = 30
+    condensed = rng.random(n * (n - 1) // 2).astype(np.float32)
+    expected = scipy.cluster.hierarchy.linkage(condensed, method="complete")
+    assert np.array_equal(nn_chain("complete").get_linkage(condensed, n), expected)
+
+def test_invalid_input():
+    with pytest.raises(ValueError, match="only supports"):
+        nn_chain("single")
+    with pytest.raises(ValueError, match="finite values"):
+        nn_chain("complete").get_linkage(np.array([1.0, np.inf, 2.0]), 3)
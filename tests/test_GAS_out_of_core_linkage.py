@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pytest
+import tables
+from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import pdist, squareform
+from genomic_address_service.binary_matrix import write_binary_matrix
+from genomic_address_service.classes.matrix_reader import matrix_reader
+from genomic_address_service.classes.out_of_core_linkage import out_of_core_linkage
+from genomic_address_service.utils import permute_condensed
+
+def clustered_matrix(tmp_path, seed=0, n=45, integer=False):
+    # Three well separated groups of points, written as a TSV matrix in a random label order
+    rng = np.random.default_rng(seed)
+    points = np.concatenate([rng.random((n // 3, 3)) + 5 * c for c in range(3)])
+    if integer:
+        points = np.round(points * 10)
+    condensed = pdist(points, metric='cityblock')
+    labels = [f's{i}' for i in rng.permutation(n)]
+    path = str(tmp_path / "matrix.tsv")
+    with open(path, 'w') as fh:
+        fh.write("dists\t" + "\t".join(labels) + "\n")
+        for label, row in zip(labels, squareform(condensed)):
+            fh.write(label + "\t" + "\t".join(repr(float(x)) for x in row) + "\n")
+    return path, labels, condensed
+
+@pytest.mark.parametrize("method", ["single", "average", "complete"])
+@pytest.mark.parametrize("integer", [False, True])
+def test_text(tmp_path, method, integer):
+    # Reading one row at a time gives SciPy's linkage matrix, tied distances included
+    path, labels, condensed = clustered_matrix(tmp_path, integer=integer)
+    result_labels, Z = out_of_core_linkage(method, directory=str(tmp_path)).cluster_file(path)
+    assert result_labels == labels
+    np.testing.assert_array_equal(Z, linkage(condensed, method=method))
+    assert sorted(os.listdir(tmp_path)) == ["matrix.tsv"]
+
+@pytest.mark.parametrize("method", ["single", "average", "complete"])
+def test_ties(tmp_path, method):
+    # Few distinct distances, so most merges are tied
+    rng = np.random.default_rng(3)
+    for n in [2, 3, 17, 40]:
+        condensed = rng.integers(0, 3, size=n * (n - 1) // 2).astype(np.float64)
+        labels = [f's{i}' for i in range(n)]
+        path = str(tmp_path / f"ties_{n}.gdm")
+        write_binary_matrix(path, labels, condensed)
+        _, Z = out_of_core_linkage(method).cluster_file(path)
+        np.testing.assert_array_equal(Z, linkage(condensed, method=method))
+
+@pytest.mark.parametrize("method", ["single", "average", "complete"])
+def test_sorted(tmp_path, method):
+    # The samples are clustered in sorted order, as the sorted matrix is in memory
+    path, labels, condensed = clustered_matrix(tmp_path, seed=1, integer=True)
+    order = sorted(range(len(labels)), key=labels.__getitem__)
+    expected = linkage(permute_condensed(condensed, len(labels), np.array(order)), method=method)
+    result_labels, Z = out_of_core_linkage(method).cluster_file(path, sort_matrix=True)
+    assert result_labels == sorted(labels)
+    np.testing.assert_array_equal(Z, expected)
+
+@pytest.mark.parametrize("sort_matrix", [False, True])
+def test_binary(tmp_path, sort_matrix):
+    # The rows of a binary matrix are gathered from its memory map
+    path, labels, condensed = clustered_matrix(tmp_path, seed=2, integer=True)
+    binary = str(tmp_path / "matrix.gdm")
+    write_binary_matrix(binary, labels, condensed)
+    expected = out_of_core_linkage("average").cluster_file(path, sort_matrix=sort_matrix)
+    result = out_of_core_linkage("average").cluster_file(binary, sort_matrix=sort_matrix)
+    assert result[0] == expected[0]
+    np.testing.assert_array_equal(result[1], expected[1])
+
+def test_write_rows(tmp_path):
+    # The HDF5 dataset holds the square matrix, one compressed chunk per row
+    path, labels, condensed = clustered_matrix(tmp_path, integer=True)
+    with tables.open_file(str(tmp_path / "rows.h5"), 'w') as h5:
+        node = out_of_core_linkage("average").write_rows(h5, matrix_reader(path, sort_matrix=True, dtype='uint16'))
+        assert node.chunkshape == (1, len(labels))
+        assert node.filters.complevel > 0
+        order = np.array(sorted(range(len(labels)), key=labels.__getitem__))
+        np.testing.assert_array_equal(node.read(), squareform(condensed)[np.ix_(order, order)])
+
+def test_dtype_error(tmp_path):
+    path, _, _ = clustered_matrix(tmp_path)
+    with pytest.raises(ValueError, match='uint16'):
+        out_of_core_linkage("average").cluster_file(path, dtype='uint16')
+
+def test_asymmetric(tmp_path):
+    path = tmp_path / "asymmetric.tsv"
+    path.write_text("dists\ta\tb\tc\na\t0\t1\t2\nb\t1\t0\t3\nc\t2\t4\t0\n")
+    with pytest.raises(ValueError, match='non-symmetrical'):
+        out_of_core_linkage("complete").cluster_file(str(path))
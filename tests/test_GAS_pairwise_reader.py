@@ -0,0 +1,60 @@
+import pytest
+import numpy as np
+from scipy.spatial.distance import squareform
+from genomic_address_service.classes.pairwise_reader import pairwise_reader
+
+def write_pairs(tmp_path, rows, name="pairs.tsv"):
+    path = tmp_path / name
+    path.write_text("query_id\tref_id\tdist\n" + "".join("\t".join(map(str, row)) + "\n" for row in rows))
+    return str(path)
+
+@pytest.mark.parametrize("both_directions", [True, False])
+def test_read_data_matches_square(tmp_path, both_directions):
+    rng = np.random.default_rng(12)
+    n = 40
+    square = squareform(rng.integers(0, 500, n * (n - 1) // 2).astype(np.float64))
+    labels = [f"s{i:02d}" for i in range(n)]
+    rows = [(labels[i], labels[j], int(square[i, j])) for i in range(n) for j in range(n)
+            if both_directions or i <= j]
+    order = rng.permutation(len(rows))
+    path = write_pairs(tmp_path, [rows[k] for k in order])
+
+    reader = pairwise_reader(path, sort_matrix=True, batch_size=97)
+    read_labels, condensed = reader.read_data()
+    assert read_labels == labels
+    assert np.array_equal(condensed, squareform(square))
+
+def test_read_data_first_appearance(tmp_path):
+    path = write_pairs(tmp_path, [("C", "A", 2), ("A", "B", 1), ("B", "C", 4)])
+    labels, condensed = pairwise_reader(path).read_data()
+    assert labels == ["C", "A", "B"]
+    assert condensed.tolist() == [2, 4, 1]
+
+def test_read_data_dtype(tmp_path):
+    path = write_pairs(tmp_path, [("A", "B", 1), ("A", "C", 2), ("B", "C", 70000)])
+    _, condensed = pairwise_reader(path, dtype="auto", batch_size=1).read_data()
+    assert condensed.dtype == np.uint32
+    assert condensed.tolist() == [1, 2, 70000]
+    with pytest.raises(ValueError, match="cannot be stored exactly as uint16"):
+        pairwise_reader(path, dtype="uint16").read_data()
+
+def test_read_data_tolerance(tmp_path):
+    path = write_pairs(tmp_path, [("A", "B", 1), ("B", "A", 1.05)])
+    with pytest.raises(ValueError, match=r"line 3 \[B, A\]=1.05 differs"):
+        pairwise_reader(path).read_data()
+    assert pairwise_reader(path, atol=0.1).read_data()[1].tolist() == [1]
+    assert pairwise_reader(path, validate=False).read_data()[1].tolist() == [1]
+
+@pytest.mark.parametrize("rows,match", [
+    ([("A", "B", 1), ("A", "C", 2)], r"1 pairs are missing, e.g. \[B, C\]"),
+    ([("A", "A", 1), ("A", "B", 1)], "non-zero distance to itself"),
+    ([("A", "B", "x")], "only contain numerical values"),
+    ([("A", "B", "NA")], "NaN, null or NA"),
+    ([("A", "B")], "every line must have the 3 columns"),
+    ([("A", "B", 1), ("A", "C", 1, 5)], "every line must have the 3 columns"),
+    ([], "do not list any samples"),
+])
+def test_read_data_invalid(tmp_path, rows, match):
+    path = write_pairs(tmp_path, rows)
+    with pytest.raises(ValueError, match=match):
+        pairwise_reader(path).read_data()
@@ -0,0 +1,97 @@
+import pytest
+import numpy as np
+import scipy.cluster.hierarchy
+from scipy.spatial.distance import pdist, squareform
+from genomic_address_service.classes.slink import slink
+
+def test_matches_scipy_condensed():
+    rng = np.random.default_rng(7)
+    for n in [2, 3, 10, 57]:
+        condensed = pdist(rng.random((n, 3)))
+        engine = slink(n)
+        engine.insert_condensed(condensed)
+        expected = scipy.cluster.hierarchy.linkage(condensed, method='single')
+        assert np.array_equal(engine.get_linkage(), expected)
+
+def test_matches_scipy_rows():
+    # Samples inserted row by row with their distances to the previous rows
+    rng = np.random.default_rng(11)
+    n = 40
+    condensed = pdist(rng.random((n, 2)))
+    square = squareform(condensed)
+    engine = slink(n)
+    for i in range(n):
+        engine.insert(i, square[i, :i])
+    expected = scipy.cluster.hierarchy.linkage(condensed, method='single')
+    assert np.array_equal(engine.get_linkage(), expected)
+
+def test_insert_with_ids():
+    # Inserting a permuted matrix with its original positions gives the same linkage
+    rng = np.random.default_rng(5)
+    n = 25
+    square = squareform(pdist(rng.random((n, 2))))
+    order = rng.permutation(n)
+    engine = slink(n)
+    for k, i in enumerate(order):
+        engine.insert(i, square[i, order[:k]])
+    expected = scipy.cluster.hierarchy.linkage(squareform(square), method='single')
+    assert np.array_equal(engine.get_linkage(), expected)
+
+def test_incomplete_insert():
+    engine = slink(3)
+    engine.insert(0, np.array([]))
+    with pytest.raises(ValueError, match="expected 1 distances"):
+        engine.insert(1, np.array([1.0, 2.0]))
+    with pytest.raises(ValueError, match="only 1 of 3 samples"):
+        engine.get_linkage()
+
+def test_tied_distances_canonical():
+    # With tied distances the linkage does not depend on the insertion order and the
+    # clusters match SciPy's at every height
+    rng = np.random.default_rng(3)
+    for _ in range(50):
+        n = int(rng.integers(2, 30))
+        upper = np.triu(rng.integers(0, 5, size=(n, n)), 1).astype(np.float64)
+        square = upper + upper.T
+        condensed = squareform(square)
+        rows = slink(n)
+        for i in range(n):
+            rows.insert(i, square[i, :i])
+        reverse = slink(n)
+        reverse.insert_condensed(condensed)
+        Z = rows.get_linkage()
+        assert np.array_equal(Z, reverse.get_linkage())
+
+        expected = scipy.cluster.hierarchy.linkage(condensed, method='single')
+        assert np.array_equal(Z[:, 2], expected[:, 2])
+        for t in range(5):
+            clusters = scipy.cluster.hierarchy.fcluster(Z, t, criterion='distance')
+            expected_clusters = scipy.cluster.hierarchy.fcluster(expected, t, criterion='distance')
+            assert len(set(zip(clusters, expected_clusters))) == len(set(expected_clusters))
+
+def test_from_linkage():
+    # Resuming from the linkage of the first samples gives the linkage of all of them
+    rng = np.random.default_rng(17)
+    for _ in range(50):
+        n = int(rng.integers(2, 30))
+        m = int(rng.integers(1, n + 1))
+        upper = np.triu(rng.integers(0, 5, size=(n, n)), 1).astype(np.float64)
+        square = upper + upper.T
+        full = slink(n)
+        first = slink(m)
+        for i in range(n):
+            full.insert(i, square[i, :i])
+            if i < m:
+                first.insert(i, square[i, :i])
+        engine = slink.from_linkage(first.get_linkage(), n)
+        assert np.array_equal(engine.pi[:m], first.pi) and np.array_equal(engine.lam[:m], first.lam)
+        for i in range(m, n):
+            engine.insert(i, square[i, :i])
+        assert np.array_equal(engine.get_linkage(), full.get_linkage())
+
+def test_from_linkage_too_many_samples():
+    engine = slink(3)
+    for i in range(3):
+        engine.insert(i, np.ones(i))
+    with pytest.raises(ValueError, match="more than 2"):
+        slink.from_linkage(engine.get_linkage(), 2)
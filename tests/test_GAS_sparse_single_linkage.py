@@ -0,0 +1,57 @@
+import pytest
+import numpy as np
+import scipy.cluster.hierarchy
+from scipy.spatial.distance import squareform
+from genomic_address_service.classes.sparse_single_linkage import sparse_single_linkage
+
+def same_partition(a, b):
+    # Cluster numbers may differ; the pairs of samples sharing a cluster may not
+    return np.array_equal(a[:, None] == a[None, :], b[:, None] == b[None, :])
+
+def write_edges(file_path, labels, square, max_threshold):
+    with open(file_path, 'w') as fh:
+        fh.write("query_id\tref_id\tdist\n")
+        for i, query in enumerate(labels):
+            for j, ref in enumerate(labels):
+                if square[i, j] <= max_threshold:
+                    fh.write(f"{query}\t{ref}\t{square[i, j]}\n")
+
+def test_matches_dense(tmp_path):
+    rng = np.random.default_rng(11)
+    n = 70
+    condensed = rng.integers(0, 60, n * (n - 1) // 2).astype(np.float64)
+    labels = [f"s{i:03d}" for i in range(n)]
+    thresholds = [12.0, 5.0, 2.0, 0.0]
+    file_path = str(tmp_path / "edges.tsv")
+    write_edges(file_path, labels, squareform(condensed), max(thresholds))
+
+    sl = sparse_single_linkage(file_path, thresholds, sort_matrix=True)
+    assert sl.labels == labels
+    Z = scipy.cluster.hierarchy.linkage(condensed, method="single")
+    memberships = sl.get_memberships()
+    for level, t in enumerate(thresholds):
+        expected = scipy.cluster.hierarchy.fcluster(Z, t, criterion="distance")
+        assert same_partition(memberships[:, level], expected)
+        # clusters are numbered in order of the samples
+        first = [memberships[:, level].tolist().index(c) for c in range(1, memberships[:, level].max() + 1)]
+        assert first == sorted(first)
+
+def test_missing_pairs_and_sort(tmp_path):
+    file_path = tmp_path / "edges.tsv"
+    file_path.write_text("query_id\tref_id\tdist\nc\tb\t1\nb\tc\t1\nd\td\t0\na\tc\t3\n")
+    sl = sparse_single_linkage(str(file_path), [3.0, 1.0], sort_matrix=True)
+    assert sl.labels == ["a", "b", "c", "d"]
+    assert sl.get_memberships().tolist() == [[1, 1], [1, 2], [1, 2], [2, 3]]
+
+@pytest.mark.parametrize("content,match", [
+    ("query_id\tref_id\n", "header"),
+    ("query_id\tref_id\tdist\na\tb\n", "line 2 has 2 columns"),
+    ("query_id\tref_id\tdist\na\tb\tx\n", "not a number"),
+    ("query_id\tref_id\tdist\na\tb\t-1\n", "non-negative"),
+    ("query_id\tref_id\tdist\n", "does not list any samples"),
+])
+def test_invalid_input(tmp_path, content, match):
+    file_path = tmp_path / "edges.tsv"
+    file_path.write_text(content)
+    with pytest.raises(ValueError, match=match):
+        sparse_single_linkage(str(file_path), [1.0])
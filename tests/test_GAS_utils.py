@@ -7,8 +7,10 @@ from genomic_address_service.utils import (
     get_file_length, get_file_header, get_file_footer,
     is_matrix_valid, is_file_ok, format_threshold_map,
     write_threshold_map, write_cluster_assignments,
-    init_threshold_map
+    init_threshold_map, cut_linkage
 )
+import numpy as np
+import scipy.cluster.hierarchy
 
 def test_get_file_length():
     with tempfile.NamedTemporaryFile(mode='w+', delete=False) as tmpfile:
@@ -73,4 +75,31 @@ def test_init_threshold_map():
     result = init_threshold_map(thresholds)
     expected_result = {0: 0.1, 1: 0.2, 2: 0.3}
     assert result == expected_result
-    
\ No newline at end of file
+    
+
+def test_cut_linkage():
+    # One pass over the tree gives the same ids as fcluster at every threshold
+    rng = np.random.default_rng(2)
+    thresholds = np.array([6.0, 4.5, 3.0, 1.0, 0.0])
+    for method in ['single', 'average', 'complete']:
+        for n in [2, 9, 40]:
+            condensed = rng.integers(0, 8, n * (n - 1) // 2).astype(np.float64)
+            Z = scipy.cluster.hierarchy.linkage(condensed, method=method)
+            memberships = cut_linkage(Z, thresholds)
+            assert memberships.dtype == np.int32
+            assert memberships.shape == (n, len(thresholds))
+            for level, t in enumerate(thresholds):
+                expected = scipy.cluster.hierarchy.fcluster(Z, t, criterion="distance")
+                assert memberships[:, level].tolist() == expected.tolist()
+
+def test_fits_dtype():
+    from genomic_address_service.utils import fits_dtype, narrowest_dtype
+    values = np.array([0.0, 3.0, 65535.0])
+    assert fits_dtype(values, np.uint16)
+    assert not fits_dtype(values + 1, np.uint16)
+    assert fits_dtype(values + 1, np.uint32)
+    assert not fits_dtype(np.array([-1.0]), np.uint32)
+    assert fits_dtype(np.array([0.5]), np.float32)
+    assert not fits_dtype(np.array([0.1]), np.float32)
+    assert narrowest_dtype(np.array([0.5, 2.0]), [np.uint16, np.uint32, np.float32]) == np.float32
+    assert narrowest_dtype(np.array([0.1]), [np.uint16, np.float32]) == np.float64
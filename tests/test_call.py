@@ -8,6 +8,7 @@ import pathlib as p
 from os import path
 import csv
 import json
+import gzip
 
 from genomic_address_service.call import call
 from genomic_address_service.constants import CLUSTER_METHODS
@@ -1848,3 +1849,25 @@ def test_batch_double_digit(tmp_path):
         assert thresholds_json["0"] == 5.0
         assert thresholds_json["1"] == 3.0
         assert thresholds_json["2"] == 0.0
+
+def test_compressed(tmp_path):
+    # Compressed distances and clusters give the same results
+    outputs = []
+    for compressed in [False, True]:
+        dists = get_path("data/pairwise_distances/basic.tsv")
+        clusters = get_path("data/clusters/basic.tsv")
+        if compressed:
+            for name in ["dists", "clusters"]:
+                source = dists if name == "dists" else clusters
+                target = path.join(tmp_path, f"{name}.tsv.gz")
+                with open(source, 'rb') as fh, gzip.open(target, 'wb') as out:
+                    out.write(fh.read())
+            dists = path.join(tmp_path, "dists.tsv.gz")
+            clusters = path.join(tmp_path, "clusters.tsv.gz")
+        config = {"dists": dists, "rclusters": clusters, "outdir": path.join(tmp_path, str(compressed)),
+                  "force": False, "thresholds": "5,3,0", "thresh_map": None, "method": "single",
+                  "sample_col": "id", "address_col": "address", "delimiter": ".", "batch_size": 100}
+        call(config)
+        with open(path.join(config["outdir"], "results.text")) as fh:
+            outputs.append(fh.read())
+    assert outputs[0] == outputs[1]
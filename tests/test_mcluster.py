@@ -2,11 +2,13 @@ import pytest
 import pathlib
 import csv
 import json
+import gzip
 import skbio
 from skbio.tree import TreeNode
 from os import path
 from io import StringIO
 import pandas as pd
+import numpy as np
 
 from genomic_address_service.mcluster import mcluster
 
@@ -1736,4 +1738,325 @@ def test_sort_matrix(tmp_path):
     cluster_shuffled = path.join(args_shuffled["outdir"], "clusters.text")
     cluster_shuffled_output = pd.read_csv(cluster_shuffled, sep='\t')
 
-    assert cluster_sorted_output.equals(cluster_shuffled_output)
\ No newline at end of file
+    assert cluster_sorted_output.equals(cluster_shuffled_output)
+
+def run_outputs(tmp_path, name, **options):
+    # Run mcluster and return the contents of clusters.text and tree.nwk
+    args = {"matrix": get_path("data/matrix/wikipedia-single.tsv"),
+            "outdir": path.join(tmp_path, name),
+            "method": "average",
+            "thresholds": "20,15,10",
+            "sort_matrix": False,
+            "delimiter": ".",
+            "force": False,
+            "tree_distances": 'patristic'}
+    args.update(options)
+    mcluster(args)
+    with open(path.join(args["outdir"], "clusters.text")) as clusters_file, \
+         open(path.join(args["outdir"], "tree.nwk")) as tree_file:
+        return clusters_file.read(), tree_file.read()
+
+def test_engine_slink(tmp_path):
+    # The slink engine streams the matrix and must give the same
+    # clusters and tree as scipy on "data/matrix/basic.tsv"
+    outputs = [run_outputs(tmp_path, engine, matrix=get_path("data/matrix/basic.tsv"), method="single",
+                           thresholds="2,1,0", tree_distances='cophenetic', engine=engine)
+               for engine in ["scipy", "slink"]]
+    assert outputs[0] == outputs[1]
+
+def test_engine_slink_method(tmp_path):
+    args = {"matrix": get_path("data/matrix/basic.tsv"),
+            "outdir": path.join(tmp_path, "test_out"),
+            "method": "average",
+            "thresholds": "2,1,0",
+            "sort_matrix": False,
+            "delimiter": ".",
+            "force": False,
+            "tree_distances": 'cophenetic',
+            "engine": "slink"}
+
+    with pytest.raises(Exception) as exception:
+        mcluster(args)
+
+    assert exception.type == Exception
+    assert str(exception.value) == "the slink engine only supports the single method, not average"
+
+def test_engine_nnchain(tmp_path):
+    # The nnchain engine must reproduce scipy's linkage exactly
+    for method in ["average", "complete"]:
+        outputs = [run_outputs(tmp_path, path.join(method, engine), method=method, engine=engine)
+                   for engine in ["scipy", "nnchain"]]
+        assert outputs[0] == outputs[1]
+
+def test_dtype_auto(tmp_path):
+    # Storing integer distances as uint16 must not change the results
+    for engine, method in [("scipy", "average"), ("nnchain", "complete"), ("slink", "single")]:
+        outputs = [run_outputs(tmp_path, path.join(engine, dtype), method=method, sort_matrix=True, engine=engine,
+                               dtype=dtype)
+                   for dtype in ["float64", "auto"]]
+        assert outputs[0] == outputs[1]
+
+def test_threads(tmp_path):
+    # Parsing the matrix with several workers must not change the results
+    for engine, method in [("scipy", "average"), ("nnchain", "complete")]:
+        outputs = [run_outputs(tmp_path, path.join(engine, str(threads)), method=method, sort_matrix=True,
+                               engine=engine, threads=threads)
+                   for threads in [1, 2]]
+        assert outputs[0] == outputs[1]
+
+def test_components(tmp_path):
+    # Clustering the connected components at the largest threshold separately must
+    # give the same clusters and tree
+    for engine, method in [("scipy", "single"), ("scipy", "average"), ("nnchain", "complete")]:
+        outputs = [run_outputs(tmp_path, path.join(engine, method, str(components)), method=method,
+                               engine=engine, components=components, threads=2)
+                   for components in [False, True]]
+        assert outputs[0] == outputs[1]
+
+def test_components_engine(tmp_path):
+    with pytest.raises(Exception, match="--components"):
+        run_outputs(tmp_path, "slink", method="single", engine="slink", components=True)
+
+def test_sparse(tmp_path):
+    # Single linkage from a list of the pairs within the largest threshold, numbered
+    # in sample order; no tree is written
+    edges = path.join(tmp_path, "edges.tsv")
+    with open(get_path("data/matrix/wikipedia-single.tsv")) as fh, open(edges, 'w') as out:
+        labels = next(fh).rstrip().split("\t")[1:]
+        out.write("query_id\tref_id\tdist\n")
+        for line in fh:
+            row = line.rstrip().split("\t")
+            for ref, dist in zip(labels, row[1:]):
+                if float(dist) <= 25:
+                    out.write(f"{row[0]}\t{ref}\t{dist}\n")
+    args = {"matrix": edges,
+            "outdir": path.join(tmp_path, "sparse"),
+            "method": "single",
+            "thresholds": "25,20,0",
+            "sort_matrix": False,
+            "delimiter": ".",
+            "force": False,
+            "tree_distances": 'patristic',
+            "sparse": True}
+    mcluster(args)
+    with open(path.join(args["outdir"], "clusters.text")) as fh:
+        assert fh.read() == ("id\taddress\tlevel_1\tlevel_2\tlevel_3\n"
+                             "a\t1.1.1\t1\t1\t1\n"
+                             "b\t1.1.2\t1\t1\t2\n"
+                             "c\t1.2.3\t1\t2\t3\n"
+                             "e\t1.3.4\t1\t3\t4\n"
+                             "d\t2.4.5\t2\t4\t5\n")
+    assert not path.exists(path.join(args["outdir"], "tree.nwk"))
+
+    args["method"] = "average"
+    args["force"] = True
+    with pytest.raises(Exception, match="--sparse only supports the single method"):
+        mcluster(args)
+
+def test_pairwise(tmp_path):
+    # The long format of a matrix gives the same clusters and tree as the matrix
+    pairs = path.join(tmp_path, "pairs.tsv")
+    with open(get_path("data/matrix/wikipedia-single.tsv")) as fh, open(pairs, 'w') as out:
+        labels = next(fh).rstrip().split("\t")[1:]
+        out.write("query_id\tref_id\tdist\n")
+        for line in fh:
+            row = line.rstrip().split("\t")
+            for ref, dist in zip(labels, row[1:]):
+                out.write(f"{row[0]}\t{ref}\t{dist}\n")
+    for engine, method in [("scipy", "average"), ("slink", "single"), ("nnchain", "complete")]:
+        outputs = [run_outputs(tmp_path, path.join(engine, str(pairwise)), method=method, engine=engine,
+                               matrix=pairs if pairwise else get_path("data/matrix/wikipedia-single.tsv"),
+                               pairwise=pairwise)
+                   for pairwise in [False, True]]
+        assert outputs[0] == outputs[1]
+
+def test_lower_triangle(tmp_path):
+    # The lower triangle of a matrix gives the same clusters and tree as the matrix
+    lower = path.join(tmp_path, "lower.phy")
+    with open(get_path("data/matrix/wikipedia-single.tsv")) as fh, open(lower, 'w') as out:
+        labels = next(fh).rstrip().split("\t")[1:]
+        out.write(f"{len(labels)}\n")
+        for i, line in enumerate(fh):
+            row = line.rstrip().split("\t")
+            out.write(" ".join(row[:i + 1]) + "\n")
+    for engine, method in [("scipy", "average"), ("slink", "single")]:
+        outputs = [run_outputs(tmp_path, path.join(engine, str(lower_triangle)), method=method, engine=engine,
+                               matrix=lower if lower_triangle else get_path("data/matrix/wikipedia-single.tsv"),
+                               lower_triangle=lower_triangle, sort_matrix=True)
+                   for lower_triangle in [False, True]]
+        assert outputs[0] == outputs[1]
+
+def test_compressed(tmp_path):
+    # A gzip compressed matrix gives the same clusters and tree, also with several threads
+    matrix = get_path("data/matrix/wikipedia-single.tsv")
+    compressed = path.join(tmp_path, "matrix.tsv.gz")
+    with open(matrix, 'rb') as fh, gzip.open(compressed, 'wb') as out:
+        out.write(fh.read())
+    outputs = [run_outputs(tmp_path, "plain", matrix=matrix),
+               run_outputs(tmp_path, "gzip", matrix=compressed, threads=2)]
+    assert outputs[0] == outputs[1]
+
+def test_methods(tmp_path):
+    # Several methods read the matrix once and give the outputs of separate runs in subdirectories
+    methods = ["single", "average", "complete"]
+    expected = [run_outputs(tmp_path, method, method=method) for method in methods]
+    for threads in [1, 2]:
+        outdir = path.join(tmp_path, f"methods_{threads}")
+        args = {"matrix": get_path("data/matrix/wikipedia-single.tsv"),
+                "outdir": outdir,
+                "method": ",".join(methods),
+                "thresholds": "20,15,10",
+                "sort_matrix": False,
+                "delimiter": ".",
+                "force": False,
+                "tree_distances": 'patristic',
+                "threads": threads}
+        mcluster(args)
+        for method, outputs in zip(methods, expected):
+            with open(path.join(outdir, method, "clusters.text")) as clusters_file, \
+                 open(path.join(outdir, method, "tree.nwk")) as tree_file:
+                assert (clusters_file.read(), tree_file.read()) == outputs
+            assert path.isfile(path.join(outdir, method, "linkage.bin"))
+        with open(path.join(outdir, "run.json")) as fh:
+            assert list(json.load(fh)["result_file"]) == methods
+
+def test_methods_invalid(tmp_path):
+    args = {"matrix": get_path("data/matrix/basic.tsv"),
+            "outdir": path.join(tmp_path, "test_out"),
+            "method": "single,single",
+            "thresholds": "1",
+            "sort_matrix": False,
+            "delimiter": ".",
+            "force": False,
+            "tree_distances": 'patristic'}
+    with pytest.raises(Exception, match='only be given once'):
+        mcluster(args)
+    args["method"] = "single,average"
+    args["engine"] = "slink"
+    with pytest.raises(Exception, match='slink engine only supports'):
+        mcluster(args)
+
+def test_deduplicate(tmp_path):
+    # Identical samples are clustered once and give the same clusters as a full run
+    matrix = path.join(tmp_path, "duplicates.tsv")
+    with open(get_path("data/matrix/wikipedia-single.tsv")) as fh:
+        rows = [line.rstrip("\n").split("\t") for line in fh]
+    copies = {"a": ["a2", "a3"], "d": ["d2"]}
+    order = [label for label in rows[0][1:] for label in [label] + copies.get(label, [])]
+    source = {label: row for row in rows[1:] for label in [row[0]] + copies.get(row[0], [])}
+    position = {label: i for i, label in enumerate(rows[0])}
+    with open(matrix, 'w') as out:
+        out.write("dists\t" + "\t".join(order) + "\n")
+        for label in order:
+            values = [source[label][position[other.rstrip("23")]] for other in order]
+            out.write(label + "\t" + "\t".join(values) + "\n")
+    for method in ["single", "average", "complete"]:
+        outputs = [run_outputs(tmp_path, path.join(method, str(deduplicate)), matrix=matrix, method=method,
+                               thresholds="20,15,10,0", deduplicate=deduplicate)
+                   for deduplicate in [False, True]]
+        clusters = [pd.read_csv(StringIO(text), sep="\t").drop(columns="address") for text, _ in outputs]
+        for level in clusters[0].columns[1:]:
+            expected = clusters[0].groupby(level)["id"].apply(frozenset)
+            result = clusters[1].groupby(level)["id"].apply(frozenset)
+            assert set(expected) == set(result)
+        tree = TreeNode.read(StringIO(outputs[1][1]))
+        assert sorted(tip.name for tip in tree.tips()) == sorted(order)
+        assert distance_patristic_from_tree(tree, "a", "a3") == 0
+
+def test_out_of_core(tmp_path):
+    # Out-of-core clustering gives the clusters and tree of the in-memory run, tied distances included
+    rng = np.random.default_rng(23)
+    points = rng.integers(0, 4, size=(30, 2))
+    square = np.abs(points[:, None, :] - points[None, :, :]).sum(axis=2)
+    labels = [f"s{i:02d}" for i in rng.permutation(len(points))]
+    matrix = path.join(tmp_path, "ties.tsv")
+    with open(matrix, 'w') as fh:
+        fh.write("dists\t" + "\t".join(labels) + "\n")
+        for label, row in zip(labels, square):
+            fh.write(label + "\t" + "\t".join(str(x) for x in row) + "\n")
+    for engine, method in [("scipy", "single"), ("slink", "single"), ("scipy", "average"), ("nnchain", "complete")]:
+        for sort_matrix in [False, True]:
+            outputs = [run_outputs(tmp_path, path.join(engine, method, str(sort_matrix), mode), matrix=matrix,
+                                   method=method, engine=engine, thresholds="4,2,1,0", sort_matrix=sort_matrix,
+                                   out_of_core=mode)
+                       for mode in ["never", "always"]]
+            assert outputs[0] == outputs[1]
+
+def test_out_of_core_auto(tmp_path, monkeypatch):
+    # auto only switches when the matrix would not fit in memory
+    outputs = [run_outputs(tmp_path, "memory", out_of_core="auto")]
+    with open(path.join(tmp_path, "memory", "run.json")) as fh:
+        assert json.load(fh)["out_of_core"] is False
+    monkeypatch.setattr("genomic_address_service.mcluster.fits_in_memory", lambda nbytes: False)
+    outdir = path.join(tmp_path, "disk")
+    mcluster({"matrix": get_path("data/matrix/wikipedia-single.tsv"),
+              "outdir": outdir,
+              "method": "average,complete",
+              "thresholds": "20,15,10",
+              "sort_matrix": False,
+              "delimiter": ".",
+              "force": False,
+              "tree_distances": 'patristic',
+              "out_of_core": "auto"})
+    with open(path.join(outdir, "run.json")) as fh:
+        assert json.load(fh)["out_of_core"] is True
+    with open(path.join(outdir, "average", "clusters.text")) as clusters_file, \
+         open(path.join(outdir, "average", "tree.nwk")) as tree_file:
+        assert (clusters_file.read(), tree_file.read()) == outputs[0]
+
+def test_out_of_core_invalid(tmp_path):
+    with pytest.raises(Exception, match="--out-of-core"):
+        run_outputs(tmp_path, "lower", out_of_core="always", lower_triangle=True)
+    with pytest.raises(Exception, match="--out-of-core"):
+        run_outputs(tmp_path, "atol", out_of_core="always", atol=0.1)
+
+def test_update(tmp_path):
+    # Adding the rows of new samples to a saved single linkage gives the outputs of a full slink run
+    rng = np.random.default_rng(19)
+    n, m = 40, 12
+    points = rng.integers(0, 6, size=(n, 3))
+    square = np.abs(points[:, None, :] - points[None, :, :]).sum(axis=2)
+    labels = [f"s{i:02d}" for i in rng.permutation(n)]
+
+    def write_matrix(name, rows, columns):
+        file = path.join(tmp_path, name)
+        with open(file, 'w') as fh:
+            fh.write("dists\t" + "\t".join(labels[j] for j in columns) + "\n")
+            for i in rows:
+                fh.write(labels[i] + "\t" + "\t".join(str(square[i, j]) for j in columns) + "\n")
+        return file
+
+    full = write_matrix("full.tsv", range(n), range(n))
+    first = write_matrix("first.tsv", range(n - m), range(n - m))
+    # the clustered samples can be listed in any order
+    new_rows = write_matrix("new.tsv", range(n - m, n), list(reversed(range(n - m))) + list(range(n - m, n)))
+    for sort_matrix in [False, True]:
+        options = {"method": "single", "thresholds": "6,3,1,0", "sort_matrix": sort_matrix}
+        expected = run_outputs(tmp_path, f"full_{sort_matrix}", matrix=full, engine="slink", **options)
+        run_outputs(tmp_path, f"first_{sort_matrix}", matrix=first, **options)
+        outputs = run_outputs(tmp_path, f"update_{sort_matrix}", matrix=new_rows,
+                              update=path.join(tmp_path, f"first_{sort_matrix}"), **options)
+        assert outputs == expected
+        # the updated linkage can itself be updated
+        assert path.isfile(path.join(tmp_path, f"update_{sort_matrix}", "linkage.bin"))
+
+def test_update_invalid(tmp_path):
+    run_outputs(tmp_path, "average")
+    run_outputs(tmp_path, "single", method="single")
+    new_rows = path.join(tmp_path, "new.tsv")
+    with open(new_rows, 'w') as fh:
+        fh.write("dists\ta\tb\tc\td\te\tx\n")
+        fh.write("x\t1\t1\t1\t1\t1\t0\n")
+    with pytest.raises(Exception, match="only single linkage can be updated"):
+        run_outputs(tmp_path, "update_average", matrix=new_rows, method="single",
+                    update=path.join(tmp_path, "average", "linkage.bin"))
+    with pytest.raises(Exception, match="only supports the single method"):
+        run_outputs(tmp_path, "update_method", matrix=new_rows, update=path.join(tmp_path, "single"))
+    with pytest.raises(Exception, match="not a linkage file"):
+        run_outputs(tmp_path, "update_missing", matrix=new_rows, method="single", update=path.join(tmp_path, "none"))
+    with pytest.raises(Exception, match="--update"):
+        run_outputs(tmp_path, "update_components", matrix=new_rows, method="single", components=True,
+                    update=path.join(tmp_path, "single"))
+    with pytest.raises(Exception, match="--out-of-core"):
+        run_outputs(tmp_path, "update_out_of_core", matrix=new_rows, method="single", out_of_core="always",
+                    update=path.join(tmp_path, "single"))
@@ -176,3 +176,44 @@ def test_reader_chunk_size_smaller():
             'E': 5.0,
             'C': 6.0}
         }
+
+def batches_to_dicts(batches):
+    # Query -> {ref: dist} in batch order, as returned by read_data
+    chunks = []
+    for batch in batches:
+        chunk = {}
+        for i, query in enumerate(batch.queries):
+            start, end = batch.offsets[i], batch.offsets[i + 1]
+            chunk[batch.labels[query]] = {batch.labels[ref]: dist for ref, dist in
+                                          zip(batch.refs[start:end].tolist(), batch.dists[start:end].tolist())}
+        chunks.append(chunk)
+    return chunks
+
+@pytest.mark.parametrize("n_records", [1, 2, 5])
+@pytest.mark.parametrize("chunk_rows", [1, 4, 1 << 20])
+def test_read_batches(n_records, chunk_rows):
+    # The batches hold the distances of read_data in the same order, also when a query
+    # continues in the next chunk of rows
+    pairwise_distances_path = get_path("data/pairwise_distances/wikipedia-single.tsv")
+    expected = {}
+    for chunk in dist_reader(pairwise_distances_path, n_records=n_records).read_data():
+        expected.update(chunk)
+    reader = dist_reader(pairwise_distances_path, n_records=n_records)
+    reader.CHUNK_ROWS = chunk_rows
+    batches = list(reader.read_batches())
+    assert all(len(batch) <= n_records for batch in batches)
+    result = {}
+    for chunk in batches_to_dicts(batches):
+        result.update(chunk)
+    assert list(result) == list(expected)
+    for query in expected:
+        assert list(result[query].items()) == list(expected[query].items())
+
+def test_read_batches_repeated_pairs(tmp_path):
+    # A repeated pair keeps its last distance at the position of its first line; rows
+    # without a distance are skipped and extra fields are ignored
+    dist_file = tmp_path / "dists.tsv"
+    dist_file.write_text("query_id\tref_id\tdist\nA\tB\t1\nA\tC\nA\tC\t2\t9\nA\tB\t3\nB\tA\t3\n\nB\tB\t0\n")
+    batches = list(dist_reader(str(dist_file)).read_batches())
+    assert batches_to_dicts(batches) == [{'A': {'C': 2.0, 'B': 3.0}}, {'B': {'B': 0.0, 'A': 3.0}}]
+    assert list(batches[0].offsets) == [0, 2]
@@ -0,0 +1,77 @@
+import json
+import pytest
+from os import path
+
+from genomic_address_service.mcluster import mcluster
+from genomic_address_service.recut import recut
+
+def get_path(location):
+    directory = path.dirname(path.abspath(__file__))
+    return path.join(directory, location)
+
+def mcluster_args(outdir, thresholds, **options):
+    args = {"matrix": get_path("data/matrix/wikipedia-single.tsv"),
+            "outdir": outdir,
+            "method": "average",
+            "thresholds": thresholds,
+            "sort_matrix": False,
+            "delimiter": ".",
+            "force": False,
+            "tree_distances": 'patristic'}
+    args.update(options)
+    return args
+
+def recut_args(linkage, outdir, thresholds, **options):
+    args = {"linkage": linkage,
+            "outdir": outdir,
+            "thresholds": thresholds,
+            "delimiter": ".",
+            "force": False,
+            "tree": True,
+            "tree_distances": None}
+    args.update(options)
+    return args
+
+def read_outputs(outdir):
+    with open(path.join(outdir, "clusters.text")) as clusters_file, \
+         open(path.join(outdir, "thresholds.json")) as thresholds_file, \
+         open(path.join(outdir, "tree.nwk")) as tree_file:
+        return clusters_file.read(), json.load(thresholds_file), tree_file.read()
+
+@pytest.mark.parametrize("method,tree_distances", [("average", "patristic"), ("single", "cophenetic"),
+                                                   ("complete", "patristic")])
+def test_recut(tmp_path, method, tree_distances):
+    # Cutting the saved linkage at new thresholds gives the same output as clustering again
+    mcluster(mcluster_args(path.join(tmp_path, "first"), "20,15,10", method=method, tree_distances=tree_distances))
+    mcluster(mcluster_args(path.join(tmp_path, "second"), "25,17,12,5,0", method=method, tree_distances=tree_distances))
+    recut(recut_args(path.join(tmp_path, "first"), path.join(tmp_path, "recut"), "25,17,12,5,0"))
+    assert read_outputs(path.join(tmp_path, "recut")) == read_outputs(path.join(tmp_path, "second"))
+
+    with open(path.join(tmp_path, "recut", "run.json")) as fh:
+        run_data = json.load(fh)
+    assert run_data['linkage']['method'] == method
+
+def test_recut_linkage_file(tmp_path):
+    # The linkage file can be given directly, and the tree is optional
+    mcluster(mcluster_args(path.join(tmp_path, "first"), "20,15,10"))
+    recut(recut_args(path.join(tmp_path, "first", "linkage.bin"), path.join(tmp_path, "recut"), "20,15,10",
+                     tree=False))
+    with open(path.join(tmp_path, "first", "clusters.text")) as first, \
+         open(path.join(tmp_path, "recut", "clusters.text")) as second:
+        assert first.read() == second.read()
+    assert not path.exists(path.join(tmp_path, "recut", "tree.nwk"))
+
+def test_recut_tree_distances(tmp_path):
+    # The tree distances can be changed when recutting
+    mcluster(mcluster_args(path.join(tmp_path, "first"), "20,15,10"))
+    mcluster(mcluster_args(path.join(tmp_path, "second"), "20,15,10", tree_distances='cophenetic'))
+    recut(recut_args(path.join(tmp_path, "first"), path.join(tmp_path, "recut"), "20,15,10",
+                     tree_distances='cophenetic'))
+    assert read_outputs(path.join(tmp_path, "recut")) == read_outputs(path.join(tmp_path, "second"))
+
+def test_recut_errors(tmp_path):
+    with pytest.raises(Exception, match='is not a linkage file'):
+        recut(recut_args(get_path("data/matrix/basic.tsv"), path.join(tmp_path, "recut"), "1"))
+    mcluster(mcluster_args(path.join(tmp_path, "first"), "20,15,10"))
+    with pytest.raises(Exception, match='exists'):
+        recut(recut_args(path.join(tmp_path, "first"), path.join(tmp_path, "first"), "1"))
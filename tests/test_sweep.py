@@ -0,0 +1,53 @@
+import json
+import pytest
+import pandas as pd
+from os import path
+
+from genomic_address_service.mcluster import mcluster
+from genomic_address_service.sweep import sweep
+
+def get_path(location):
+    directory = path.dirname(path.abspath(__file__))
+    return path.join(directory, location)
+
+def mcluster_args(outdir, thresholds, **options):
+    args = {"matrix": get_path("data/matrix/wikipedia-single.tsv"),
+            "outdir": outdir,
+            "method": "single",
+            "thresholds": thresholds,
+            "sort_matrix": False,
+            "delimiter": ".",
+            "force": False,
+            "tree_distances": 'patristic'}
+    args.update(options)
+    return args
+
+def test_sweep(tmp_path):
+    # One row per merge height, whose clusters are those of mcluster at that threshold
+    mcluster(mcluster_args(path.join(tmp_path, "mcluster"), "1"))
+    outdir = path.join(tmp_path, "sweep")
+    sweep({"linkage": path.join(tmp_path, "mcluster"), "outdir": outdir, "force": False})
+    table = pd.read_csv(path.join(outdir, "sweep.tsv"), sep="\t")
+    assert list(table.columns) == ["height", "clusters", "singletons", "largest", "mean_size", "ari",
+                                   "fowlkes_mallows", "persistence"]
+    assert table["height"].tolist() == [17, 21, 28]
+    assert table["clusters"].tolist() == [4, 2, 1]
+
+    thresholds = ",".join(str(h) for h in reversed(table["height"].tolist()))
+    mcluster(mcluster_args(path.join(tmp_path, "cut"), thresholds))
+    clusters = pd.read_csv(path.join(tmp_path, "cut", "clusters.text"), sep="\t")
+    for level, expected in zip(reversed(clusters.columns[2:]), table["clusters"]):
+        assert clusters[level].nunique() == expected
+
+    with open(path.join(outdir, "run.json")) as fh:
+        run_data = json.load(fh)
+    assert run_data["linkage"]["method"] == "single"
+    assert run_data["result_file"] == path.join(outdir, "sweep.tsv")
+
+def test_sweep_invalid(tmp_path):
+    with pytest.raises(Exception, match="not a linkage file"):
+        sweep({"linkage": get_path("data/matrix/wikipedia-single.tsv"), "outdir": path.join(tmp_path, "out"),
+               "force": False})
+    mcluster(mcluster_args(path.join(tmp_path, "mcluster"), "1"))
+    with pytest.raises(Exception, match="exists"):
+        sweep({"linkage": path.join(tmp_path, "mcluster"), "outdir": path.join(tmp_path, "mcluster"), "force": False})